@@ -0,0 +1,418 @@
+############################################################################
+#
+#  File: adif.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import re
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import NamedTuple
+from .submodules.flconfig_manager import FlConfigManager
+
+DEFAULT_CHUNK_BYTES = 1 << 20
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_QUERY_LIMIT = 1000
+INDEX_SUFFIX = '.idx.sqlite'
+# the start of the file is hashed to notice when the logbook has been replaced rather than appended to
+SIGNATURE_BYTES = 4096
+# <NAME>, <NAME:LENGTH> or <NAME:LENGTH:TYPE>
+TAG_PATTERN = re.compile(rb'<([A-Za-z0-9_]+)(?::(\d+)(?::[A-Za-z])?)?>')
+# longest possible tag, used to tell a tag cut off by the end of a chunk from text that only looks like one
+MAX_TAG_BYTES = 128
+EOR_TAG = b'<EOR>'
+# Fldigi modem name prefix: (ADIF MODE, ADIF SUBMODE, True if the SUBMODE is followed by the rest of the modem
+# name, e.g. BPSK31 -> PSK31). The longest matching prefix applies
+ADIF_MODE_PREFIXES = {
+    'BPSK': ('PSK', 'PSK', True),
+    'QPSK': ('PSK', 'QPSK', True),
+    '8PSK': ('PSK', '8PSK', True),
+    'PSK': ('PSK', 'PSK', True),
+    'MFSK': ('MFSK', 'MFSK', True),
+    'OLIVIA': ('OLIVIA', 'OLIVIA', True),
+    'THRBX': ('THRB', 'THRBX', True),
+    'CONTESTIA': ('CONTESTI', '', False),
+    'CTSTIA': ('CONTESTI', '', False),
+    'DOMINOEX': ('DOMINO', 'DOMINOEX', False),
+    'DOMX': ('DOMINO', 'DOMINOEX', False),
+    'THOR': ('THOR', '', False),
+    'THROB': ('THRB', '', False),
+    'MT63': ('MT63', '', False),
+    'FELDHELL': ('HELL', '', False),
+    'HELL': ('HELL', '', False),
+    'RTTY': ('RTTY', '', False),
+    'CW': ('CW', '', False),
+}
+# the ADIF modes above, which map to themselves
+ADIF_MODES = sorted({mode for mode, _, _ in ADIF_MODE_PREFIXES.values()})
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS qsos (
+        offset INTEGER PRIMARY KEY,
+        call TEXT,
+        band TEXT,
+        mode TEXT,
+        qso_date TEXT,
+        time_on TEXT,
+        freq TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_qsos_call ON qsos (call, qso_date)',
+    'CREATE INDEX IF NOT EXISTS idx_qsos_band ON qsos (band, mode, qso_date)',
+    'CREATE INDEX IF NOT EXISTS idx_qsos_mode ON qsos (mode, qso_date)',
+    'CREATE INDEX IF NOT EXISTS idx_qsos_date ON qsos (qso_date, time_on)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+]
+COLUMNS = 'offset, call, band, mode, qso_date, time_on, freq'
+
+class AdifRecord(NamedTuple):
+    '''A record read from an ADIF file. offset and end are the byte positions of the record in the file,
+    fields are keyed by upper case field name'''
+    offset: int
+    end: int
+    fields: dict
+
+class QsoEntry(NamedTuple):
+    '''An indexed QSO, as returned by AdifIndex.query()'''
+    offset: int
+    call: str
+    band: str
+    mode: str
+    qso_date: str
+    time_on: str
+    freq: str
+
+def iter_adif(file_path: str, start: int = 0, encoding: str = 'utf-8', chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    '''Reads the records of an ADIF file one at a time, holding only one chunk of the file in memory.
+    Header fields (before <EOH>) are skipped, and a record at the end of the file without its <EOR> yet
+    (for example while Fldigi is writing it) is not returned
+
+    @param file_path(str): the path to the ADIF file
+    @param start(int): the byte offset to start reading at, e.g. the end of the last record read earlier
+    @param encoding(str): the text encoding of the field values
+    @param chunk_bytes(int): how much of the file to read at a time
+    @return (generator[AdifRecord]): the records, in file order
+    '''
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        buffer = b''
+        base = start
+        pos = 0
+        eof = False
+        record_start = None
+        fields = {}
+        while True:
+            match = TAG_PATTERN.search(buffer, pos)
+            if match is not None:
+                name, length = match.group(1, 2)
+                tag_end = match.end()
+                complete = length is None or tag_end + int(length) <= len(buffer)
+                keep = match.start()
+            else:
+                complete = False
+                # a tag may have been cut off by the end of the buffer
+                keep = buffer.rfind(b'<', max(pos, len(buffer) - MAX_TAG_BYTES))
+                keep = len(buffer) if keep == -1 else keep
+            if not complete:
+                if eof:
+                    return
+                chunk = f.read(chunk_bytes)
+                eof = not chunk
+                buffer = buffer[keep:] + chunk
+                base += keep
+                pos = 0
+                continue
+            name = name.upper()
+            pos = tag_end
+            if name == b'EOH':
+                fields = {}
+                record_start = None
+            elif name == b'EOR':
+                if record_start is not None:
+                    yield AdifRecord(record_start, base + pos, fields)
+                fields = {}
+                record_start = None
+            elif length is not None:
+                if record_start is None:
+                    record_start = base + match.start()
+                length = int(length)
+                fields[name.decode('ascii')] = buffer[pos:pos + length].decode(encoding, errors='replace')
+                pos += length
+
+def read_record(file_path: str, offset: int, encoding: str = 'utf-8') -> AdifRecord:
+    '''Reads the single record starting at a byte offset, e.g. one found with AdifIndex.query()
+
+    @param file_path(str): the path to the ADIF file
+    @param offset(int): the byte offset of the record
+    @param encoding(str): the text encoding of the field values
+    @return (AdifRecord): the record, None if there is no complete record at the offset
+    '''
+    for record in iter_adif(file_path, offset, encoding, chunk_bytes=4096):
+        return record
+    return None
+
+def adif_mode(modem: str) -> tuple:
+    '''Converts a Fldigi modem name (from modem.get_name()) to the ADIF MODE and SUBMODE Fldigi logs it as, so live
+    modem names can be compared with logbook records. ADIF modes and submodes are accepted too, e.g. from older
+    logs that have the modem name in the MODE field
+
+    @param modem(str): the modem name, e.g. 'BPSK31', 'OLIVIA-8-250' or 'PSK'
+    @return (tuple[str, str]): the ADIF MODE and SUBMODE, e.g. ('PSK', 'PSK31'), SUBMODE '' if the mode has none
+    '''
+    name = (modem or '').strip().upper()
+    if name in ADIF_MODES:
+        return name, ''
+    for prefix in sorted(ADIF_MODE_PREFIXES, key=len, reverse=True):
+        if name.startswith(prefix):
+            mode, submode, with_suffix = ADIF_MODE_PREFIXES[prefix]
+            suffix = name[len(prefix):] if with_suffix else ''
+            if mode == 'OLIVIA' and suffix:
+                # OLIVIA-8-250 is logged as OLIVIA 8/250
+                suffix = ' ' + suffix.strip('-').replace('-', '/')
+            return mode, submode + suffix
+    # not a modem Fldigi maps, log it as is
+    return name, ''
+
+def at_record_end(file_path: str, offset: int) -> bool:
+    '''Checks that a byte offset is just after an <EOR> tag, i.e. a place where reading can resume. An offset saved
+    earlier that is no longer at a record end means the file has been rewritten since
+
+    @param file_path(str): the path to the ADIF file
+    @param offset(int): the byte offset, e.g. AdifRecord.end of the last record read
+    @return (bool): True if the file has <EOR> (in any case) just before the offset, or the offset is 0
+    '''
+    if offset == 0:
+        return True
+    if offset < len(EOR_TAG):
+        return False
+    with open(file_path, 'rb') as f:
+        f.seek(offset - len(EOR_TAG))
+        return f.read(len(EOR_TAG)).upper() == EOR_TAG
+
+def file_signature(file_path: str, offset: int) -> str:
+    '''Hashes the start of a file (up to SIGNATURE_BYTES, and not past offset), to tell later whether it was rewritten
+
+    @param file_path(str): the path to the file
+    @param offset(int): the byte offset read up to
+    @return (str): the hex digest
+    '''
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read(min(offset, SIGNATURE_BYTES))).hexdigest()
+
+def can_resume(file_path: str, offset: int, signature: str) -> bool:
+    '''Checks that a file has only been appended to since it was read up to offset, so reading can resume there.
+    It has not if it is now shorter, its start changed, or the offset is no longer the end of a record
+
+    @param file_path(str): the path to the ADIF file
+    @param offset(int): the byte offset read up to, e.g. AdifRecord.end of the last record read
+    @param signature(str): the file_signature(file_path, offset) taken when it was read up to offset
+    @return (bool): True if reading can resume at offset, always True for offset 0
+    '''
+    if offset == 0:
+        return True
+    return (os.path.getsize(file_path) >= offset
+            and signature == file_signature(file_path, offset)
+            and at_record_end(file_path, offset))
+
+def _normalize(fields: dict) -> tuple:
+    return (
+        fields.get('CALL', '').strip().upper(),
+        fields.get('BAND', '').strip().lower(),
+        fields.get('MODE', '').strip().upper(),
+        fields.get('QSO_DATE', '').strip(),
+        fields.get('TIME_ON', '').strip(),
+        fields.get('FREQ', '').strip(),
+    )
+
+class AdifIndex:
+    '''A persistent index of an ADIF logbook by call, band, mode and date, kept in an SQLite file next to the log.
+    The first update() streams the whole log into the index; later updates only read the records appended since,
+    so they are cheap enough to run before every lookup. If the log is rewritten rather than appended to (it got
+    shorter, its start changed, or the last indexed position is no longer the end of a record, as when Fldigi
+    rewrites the log after a record is edited or deleted) the index is rebuilt. Only the indexed fields are stored, the full record is
+    read from the log on request.
+
+    @param adif_path(str): the path to the ADIF logbook
+    @param index_path(str): [OPTIONAL] the path of the index database, defaults to the log path + '.idx.sqlite'
+    @param encoding(str): the text encoding of the log
+    @param batch_size(int): the number of records written to the index per transaction
+
+    Example use:
+    >>> from pyfldm.adif import AdifIndex
+    >>> index = AdifIndex.from_config()    # the logbook Fldigi is configured to use
+    >>> index.update()
+    182344
+    >>> index.query(call='W1AW', band='20m')
+    [QsoEntry(offset=10488230, call='W1AW', band='20m', mode='RTTY', qso_date='20230114', time_on='1802', freq='14.085000')]
+    >>> index.record(10488230).fields['NAME']
+    'Hiram'
+    '''
+    def __init__(self,
+                 adif_path: str,
+                 index_path: str = None,
+                 encoding: str = 'utf-8',
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.adif_path = adif_path
+        self.index_path = index_path or adif_path + INDEX_SUFFIX
+        self._encoding = encoding
+        self._batch_size = int(batch_size)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    @classmethod
+    def from_config(cls, config: FlConfigManager = None, **kwargs) -> 'AdifIndex':
+        '''Creates an index of the logbook Fldigi is configured to use (LOGBOOKFILENAME)
+
+        @param config(FlConfigManager): [OPTIONAL] the config manager to read the logbook path from, the default Fldigi config if not given
+        @return (AdifIndex): the (not yet updated) index
+        '''
+        config = config if config is not None else FlConfigManager()
+        return cls(config.get_log_file_name(), **kwargs)
+
+    def _meta(self, key: str) -> str:
+        row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def indexed_to(self) -> int:
+        '''The byte offset in the log up to which records are indexed'''
+        with self._lock:
+            return int(self._meta('indexed_to') or 0)
+
+    def rebuild(self) -> int:
+        '''Drops the index and indexes the whole log again
+
+        @return (int): the number of records indexed
+        '''
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM qsos')
+            self._connection.execute('DELETE FROM meta')
+        return self.update()
+
+    def update(self) -> int:
+        '''Indexes the records added to the log since the last update
+
+        @return (int): the number of records indexed
+        '''
+        size = os.path.getsize(self.adif_path)
+        with self._lock:
+            indexed_to = int(self._meta('indexed_to') or 0)
+            signature = self._meta('signature')
+            if not can_resume(self.adif_path, indexed_to, signature):
+                self.logger.info(f"{self.adif_path} was rewritten, rebuilding the index")
+                with self._connection:
+                    self._connection.execute('DELETE FROM qsos')
+                    self._connection.execute('DELETE FROM meta')
+                indexed_to = 0
+            if size == indexed_to:
+                return 0
+            count = 0
+            rows = []
+            for record in iter_adif(self.adif_path, indexed_to, self._encoding):
+                rows.append((record.offset,) + _normalize(record.fields))
+                indexed_to = record.end
+                if len(rows) >= self._batch_size:
+                    count += self._write(rows, indexed_to)
+                    rows = []
+            count += self._write(rows, indexed_to)
+        if count:
+            self.logger.debug(f"Indexed {count} QSOs from {self.adif_path}")
+        return count
+
+    def _write(self, rows: list, indexed_to: int) -> int:
+        with self._connection:
+            self._connection.executemany(f'INSERT OR REPLACE INTO qsos ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('indexed_to', ?)", (str(indexed_to),))
+            if indexed_to:
+                self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)",
+                                         (file_signature(self.adif_path, indexed_to),))
+        return len(rows)
+
+    def _where(self, call, band, mode, date_from, date_to) -> tuple:
+        clauses = []
+        params = []
+        for column, value in (('call', call and call.upper()), ('band', band and band.lower()), ('mode', mode and mode.upper())):
+            if value:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if date_from:
+            clauses.append('qso_date >= ?')
+            params.append(date_from)
+        if date_to:
+            clauses.append('qso_date <= ?')
+            params.append(date_to)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self,
+              call: str = None,
+              band: str = None,
+              mode: str = None,
+              date_from: str = None,
+              date_to: str = None,
+              limit: int = DEFAULT_QUERY_LIMIT) -> list:
+        '''Finds QSOs in the index. Call and mode are matched case-insensitively, dates are ADIF YYYYMMDD strings
+
+        @param call(str): [OPTIONAL] the callsign
+        @param band(str): [OPTIONAL] the band, e.g. '20m'
+        @param mode(str): [OPTIONAL] the mode, e.g. 'RTTY'
+        @param date_from(str): [OPTIONAL] the earliest QSO date, inclusive
+        @param date_to(str): [OPTIONAL] the latest QSO date, inclusive
+        @param limit(int): the max number of QSOs returned, None for no limit
+        @return (list[QsoEntry]): the matching QSOs, newest first
+        '''
+        where, params = self._where(call, band, mode, date_from, date_to)
+        sql = f'SELECT {COLUMNS} FROM qsos{where} ORDER BY qso_date DESC, time_on DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        with self._lock:
+            return [QsoEntry(*row) for row in self._connection.execute(sql, params)]
+
+    def count(self, call: str = None, band: str = None, mode: str = None, date_from: str = None, date_to: str = None) -> int:
+        '''Counts QSOs in the index, see query() for the filters
+
+        @return (int): the number of matching QSOs
+        '''
+        where, params = self._where(call, band, mode, date_from, date_to)
+        with self._lock:
+            return self._connection.execute(f'SELECT COUNT(*) FROM qsos{where}', params).fetchone()[0]
+
+    def record(self, offset: int) -> AdifRecord:
+        '''Reads the full record of an indexed QSO from the log
+
+        @param offset(int): the QSO's offset, from QsoEntry.offset
+        @return (AdifRecord): the record
+        '''
+        return read_record(self.adif_path, offset, self._encoding)
+
+    def close(self) -> None:
+        '''Closes the index database'''
+        with self._lock:
+            self._connection.close()
@@ -22,9 +22,13 @@
 
 import os, sys
 import psutil
+import socket
 import subprocess
 import logging
-from time import time, sleep
+import threading
+from time import sleep, monotonic
+from typing import NamedTuple
+from xmlrpc.client import Error
 from .client import Client
 from .submodules.flconfig_manager import FlConfigManager
 if sys.platform not in ['darwin', 'win32']:
@@ -32,6 +36,32 @@ if sys.platform not in ['darwin', 'win32']:
 
 MAX_STARTUP_DELAY_SECS = 10
 MAX_SHUTDOWN_DELAY_SECS = 10
+# how often the reaper of a Fldigi process we did not launch checks whether it has become a zombie
+ZOMBIE_CHECK_SECS = .25
+EXITED_STATUSES = [psutil.STATUS_ZOMBIE, psutil.STATUS_DEAD]
+# startup readiness probing: the first retry delay, doubling up to the max, and the timeout of each port probe
+STARTUP_PROBE_MIN_SECS = .01
+STARTUP_PROBE_MAX_SECS = .2
+PORT_PROBE_TIMEOUT_SECS = .2
+# the default max time to wait for Fldigi to exit after each forced stop signal
+SIGTERM_DELAY_SECS = 5
+SIGKILL_DELAY_SECS = 5
+
+class StartupTimings(NamedTuple):
+    '''The time from calling AppMonitor.start() to the end of each startup phase, in seconds. None if not reached'''
+    spawn_secs: float
+    port_open_secs: float
+    rpc_ready_secs: float
+
+class StopTimings(NamedTuple):
+    '''The time each stage of AppMonitor.stop() or kill() took in seconds, None for stages not reached. stopped_by is
+    the stage that stopped Fldigi ('xmlrpc', 'sigterm' or 'sigkill'), None if it could not be stopped'''
+    request_secs: float
+    graceful_secs: float
+    sigterm_secs: float
+    sigkill_secs: float
+    total_secs: float
+    stopped_by: str
 
 class AppMonitor:
 
@@ -76,6 +106,13 @@ class AppMonitor:
         self.headless = headless
         self.multi = multi
         self.vdisplay = None
+        # the Fldigi process being tracked, its Popen handle if we launched it, and the event set when it exits
+        self._process = None
+        self._popen = None
+        self._exited = None
+        self.returncode = None
+        self.startup_timings = None
+        self.stop_timings = None
 
         # log warning on using multi feature
         if self.multi:
@@ -101,38 +138,76 @@ class AppMonitor:
                     self.logger.exception("Cannot find Xvfb. Headless mode will only work with Xvfb installed. Please install it and try again.")
                 
 
-    def _get_process_id(self) -> int:
-        if self.process_id:
-            # check that the process id is still valid and return it, otherwise
-            # set it to none and continue
+    def _track(self, process: psutil.Process, popen: subprocess.Popen = None) -> None:
+        '''Caches a Fldigi process and starts a daemon thread that waits for it to exit and sets the exit event'''
+        exited = threading.Event()
+        self._process = process
+        self._popen = popen
+        self._exited = exited
+        self.process_id = process.pid
+        self.returncode = None
+        reaper = threading.Thread(target=self._reap, args=(process, popen, exited), daemon=True, name=f'fldigi-reaper-{process.pid}')
+        reaper.start()
+
+    def _reap(self, process: psutil.Process, popen: subprocess.Popen, exited: threading.Event) -> None:
+        if popen is not None:
+            # our own child: wait() blocks in waitpid, so the exit is seen at once and the child is reaped (no zombie)
+            returncode = popen.wait()
+        else:
+            returncode = self._wait_not_child(process)
+        if self._exited is exited:
+            self.returncode = returncode
+        exited.set()
+        self.logger.debug(f"Fldigi process {process.pid} exited, return code {returncode}")
+
+    def _wait_not_child(self, process: psutil.Process) -> int:
+        # a process we did not launch cannot be reaped by us, so check in between waits whether it is left as a zombie
+        while True:
             try:
-                process = psutil.Process(self.process_id)
-                if process.status() not in ['dead', 'zombie']:
-                    return self.process_id
-            except psutil.NoSuchProcess:
-                pass
-            # if we got here, the process is either non-existant (NoSuchProcess), dead,
-            # or zombied so just continue on to see if theres any other fldigi processes
-            self.process_id = None
+                return process.wait(ZOMBIE_CHECK_SECS)
+            except psutil.TimeoutExpired:
+                if not self._is_alive(process):
+                    return None
+            except psutil.Error:
+                return None
 
-        # filter processes to find fldigi, if it exists
-        fldigi_processes = [proc for proc in psutil.process_iter(['pid', 'name']) if 'fldigi' in proc.name()]
-        if not fldigi_processes:
-            # no fldigi processes found
-            return 0
-        # filter out any zombie processes (occurs on linux)
-        valid_processes = []
-        for proc in fldigi_processes:
-            if proc.status() != 'zombie':
-                valid_processes.append(proc)
+    @staticmethod
+    def _is_alive(process: psutil.Process) -> bool:
+        try:
+            # is_running() compares the create time too, so a reused pid is not mistaken for Fldigi
+            return process.is_running() and process.status() not in EXITED_STATUSES
+        except psutil.Error:
+            return False
+
+    def _get_process_id(self) -> int:
+        if self._exited is not None and not self._exited.is_set():
+            # the tracked process has not exited. Our own child needs no check at all, since the reaper sets the
+            # event the moment it exits, anything else gets a cheap check of just that process
+            if self._popen is not None or self._is_alive(self._process):
+                return self.process_id
+        self.process_id = None
+
+        # fall back to scanning every process for fldigi, fetching the attributes needed in one pass
+        valid_processes = [proc for proc in psutil.process_iter(['name', 'status', 'create_time'])
+                           if 'fldigi' in (proc.info['name'] or '') and proc.info['status'] not in EXITED_STATUSES]
         if not valid_processes:
             # no fldigi processes found
             return 0
         elif len(valid_processes) > 1:
             self.logger.warning("Multiple valid Fldigi instances running, choosing most recently started instance.")
-            valid_processes.sort(key=lambda x: x.create_time(), reverse=True)
-        return valid_processes[0].pid
+            valid_processes.sort(key=lambda x: x.info['create_time'], reverse=True)
+        self._track(valid_processes[0])
+        return self.process_id
+
+    def wait_for_exit(self, timeout_secs: float = None) -> bool:
+        '''Waits for the tracked Fldigi process to exit, returning as soon as it does
 
+        @param timeout_secs(float): [OPTIONAL] the max time in seconds to wait, forever if not given
+        @return (bool): True if the process has exited (or none was running), False on timeout
+        '''
+        if not self._get_process_id():
+            return True
+        return self._exited.wait(timeout_secs)
 
     def is_running(self) -> bool:
         return True if self._get_process_id() else False
@@ -147,21 +222,60 @@ class AppMonitor:
         except ConnectionRefusedError:
             return False
         
-    def _wait_for_startup(self, timeout_secs = MAX_STARTUP_DELAY_SECS, sleep_secs = .5) -> bool:
-        start = time()
-        while (start + timeout_secs) > time():
-            if self.is_functional():
+    def _port_open(self) -> bool:
+        try:
+            with socket.create_connection((self.hostname, self.port), PORT_PROBE_TIMEOUT_SECS):
                 return True
-            sleep(sleep_secs)
+        except OSError:
+            return False
+
+    def _record_startup(self, **timings) -> None:
+        if self.startup_timings is not None:
+            self.startup_timings = self.startup_timings._replace(**timings)
+
+    def _wait_for_startup(self, timeout_secs = MAX_STARTUP_DELAY_SECS, sleep_secs = STARTUP_PROBE_MAX_SECS, started_at = None) -> bool:
+        # a refused TCP connect costs next to nothing, so probe the port with a short backoff and only make the
+        # xmlrpc call once Fldigi is listening
+        started_at = monotonic() if started_at is None else started_at
+        deadline = monotonic() + timeout_secs
+        port_open = False
+        delay = STARTUP_PROBE_MIN_SECS
+        while monotonic() < deadline:
+            if self._exited is not None and self._exited.is_set():
+                self.logger.error(f"Fldigi exited during startup, return code {self.returncode}")
+                return False
+            if not port_open and self._port_open():
+                port_open = True
+                self._record_startup(port_open_secs=monotonic() - started_at)
+                delay = STARTUP_PROBE_MIN_SECS
+            if port_open:
+                try:
+                    functional = self.is_functional()
+                except (OSError, Error):
+                    # listening but not serving requests yet
+                    functional = False
+                if functional:
+                    self._record_startup(rpc_ready_secs=monotonic() - started_at)
+                    return True
+            wait = max(min(delay, deadline - monotonic()), 0)
+            if self._exited is not None:
+                # wakes at once if Fldigi exits
+                self._exited.wait(wait)
+            else:
+                sleep(wait)
+            delay = min(delay * 2, sleep_secs)
         return False
     
     def _wait_for_shutdown(self, timeout_secs = MAX_SHUTDOWN_DELAY_SECS, sleep_secs = .5) -> bool:
-        start = time()
-        while (start + timeout_secs) > time():
+        deadline = monotonic() + timeout_secs
+        while True:
             if not self.is_running():
                 return True
-            sleep(sleep_secs)
-        return False
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            # wait on the tracked process itself, which returns the moment it exits, then check for any other instance
+            self._exited.wait(min(sleep_secs, remaining))
 
     def start(self) -> int:
         # check if application already running
@@ -169,6 +283,7 @@ class AppMonitor:
             self.logger.warning("Fldigi is already running. Shut down all instances of Fldigi before using AppMonitor.start()")
             return 0
         self.logger.info("Starting Fldigi")
+        started_at = monotonic()
 
         addl_args = ['--xmlrpc-server-address', 
                      self.hostname, 
@@ -208,58 +323,136 @@ class AppMonitor:
         
         # start the process with the gathered command line arguments
         process = subprocess.Popen(startup_args + addl_args)
-        self.process_id = process.pid
+        if self.platform == 'darwin':
+            # open exits as soon as it has launched the app, so the Fldigi process is found on the first check
+            self._exited = None
+            self.process_id = None
+        else:
+            try:
+                self._track(psutil.Process(process.pid), process)
+            except psutil.NoSuchProcess:
+                self._exited = None
+                self.logger.error(f"Fldigi exited immediately with return code {process.wait()}")
+        self.startup_timings = StartupTimings(monotonic() - started_at, None, None)
 
-        if self._wait_for_startup():
-            self.logger.debug("Fldigi fully functional")
+        if self._wait_for_startup(started_at=started_at):
+            timings = self.startup_timings
+            self.logger.debug(f"Fldigi fully functional: spawned in {timings.spawn_secs:.3f} secs, port open at "
+                              f"{timings.port_open_secs:.3f} secs, xmlrpc ready at {timings.rpc_ready_secs:.3f} secs")
             return 0
+        if self._exited is not None and self._exited.is_set():
+            return 1
         self.logger.critical("Fldigi process started but reached max timeout with no connection to xmlrpc. Unconfirmed if Fldigi is functionally running")
         return 1 
     
-    def stop(self, save_options=False, save_log=False, save_macros=False, force_if_unsuccessful=False) -> bool:
+    def stop(self,
+             save_options=False,
+             save_log=False,
+             save_macros=False,
+             force_if_unsuccessful=False,
+             timeout_secs=MAX_SHUTDOWN_DELAY_SECS,
+             sigterm_timeout_secs=SIGTERM_DELAY_SECS,
+             sigkill_timeout_secs=SIGKILL_DELAY_SECS) -> bool:
+        '''Asks Fldigi to shut down over xmlrpc and waits for the process to exit, returning the moment it does. The
+        time each stage took is recorded in stop_timings
+
+        @param timeout_secs(float): the max time in seconds to wait for the graceful shutdown
+        @param sigterm_timeout_secs(float): with force_if_unsuccessful, the max time to wait after SIGTERM
+        @param sigkill_timeout_secs(float): with force_if_unsuccessful, the max time to wait after SIGKILL
+        @return (bool): True if Fldigi is no longer running
+        '''
         # first verify its actually running
         if not self.is_running():
             self.logger.info("No Fldigi instances running, nothing to shut down")
             return True
+        started_at = monotonic()
+        timings = {}
         self.logger.debug("Starting graceful shutdown of Fldigi")
-        self._client.fldigi.terminate(save_options, save_log, save_macros)
+        try:
+            self._client.fldigi.terminate(save_options, save_log, save_macros)
+            requested = True
+        except (OSError, Error):
+            self.logger.warning("Fldigi did not accept the xmlrpc terminate request", exc_info=True)
+            requested = False
+        timings['request_secs'] = monotonic() - started_at
         if self.headless:
             self.vdisplay.stop()
 
         # wait and verify that Fldigi has shut down
-        if self._wait_for_shutdown():
-            self.logger.info("Fldigi successfully shut down")
-            return True
+        if requested:
+            stage_start = monotonic()
+            stopped = self._wait_for_shutdown(timeout_secs)
+            timings['graceful_secs'] = monotonic() - stage_start
+            if stopped:
+                self._record_stop(started_at, timings, 'xmlrpc')
+                self.logger.info(f"Fldigi successfully shut down in {self.stop_timings.total_secs:.3f} secs")
+                return True
         self.logger.critical("Fldigi graceful shutdown unsuccessful")
         if force_if_unsuccessful:
-            return self.kill()
+            return self._force_stop(started_at, timings, sigterm_timeout_secs, sigkill_timeout_secs)
+        self._record_stop(started_at, timings, None)
         return False
     
-    def kill(self) -> bool:
+    def kill(self, sigterm_timeout_secs=SIGTERM_DELAY_SECS, sigkill_timeout_secs=SIGKILL_DELAY_SECS) -> bool:
+        '''Stops Fldigi with SIGTERM, then SIGKILL if it is still running once the SIGTERM deadline has passed. Each
+        stage returns the moment the process exits. The time each stage took is recorded in stop_timings
+
+        @param sigterm_timeout_secs(float): the max time in seconds to wait after SIGTERM
+        @param sigkill_timeout_secs(float): the max time in seconds to wait after SIGKILL
+        @return (bool): True if Fldigi is no longer running
+        '''
         # first verify its actually running
         if not self.is_running():
             self.logger.info("No Fldigi instances running, nothing to shut down")
             return True
-        process_id = self._get_process_id()
-        process = psutil.Process(process_id)
-        self.logger.debug("Starting forced shutdown of Fldigi")
+        return self._force_stop(monotonic(), {}, sigterm_timeout_secs, sigkill_timeout_secs)
 
-        # start with a more graceful system SIGTERM
-        process.terminate()
+    def _force_stop(self, started_at: float, timings: dict, sigterm_timeout_secs: float, sigkill_timeout_secs: float) -> bool:
+        self.logger.debug("Starting forced shutdown of Fldigi")
+        # start with a more graceful system SIGTERM, then try the less graceful SIGKILL
+        for stage, timeout_secs in [('sigterm', sigterm_timeout_secs), ('sigkill', sigkill_timeout_secs)]:
+            process = self._process if self._get_process_id() else None
+            if process is None:
+                self._record_stop(started_at, timings, stage)
+                return True
+            stage_start = monotonic()
+            try:
+                # psutil checks the create time first, so a reused pid is never signalled
+                if stage == 'sigterm':
+                    process.terminate()
+                else:
+                    process.kill()
+            except psutil.NoSuchProcess:
+                pass
+            stopped = self._wait_for_shutdown(timeout_secs)
+            timings[f'{stage}_secs'] = monotonic() - stage_start
+            if stopped:
+                self._record_stop(started_at, timings, stage)
+                self.logger.info(f"Fldigi successfully force killed via {stage.upper()} in {self.stop_timings.total_secs:.3f} secs")
+                return True
+            self.logger.warning(f"Fldigi {stage.upper()} unsuccessful")
+        self._record_stop(started_at, timings, None)
+        self.logger.critical("Fldigi SIGKILL unsuccessful, cannot shut down Fldigi")
+        return False
 
-        if self._wait_for_shutdown():
-            self.logger.info("Fldigi successfully force killed via SIGTERM")
-            return True
-        self.logger.warn("Fldigi SIGTERM unsuccessful")
+    def _record_stop(self, started_at: float, timings: dict, stopped_by: str) -> None:
+        self.stop_timings = StopTimings(timings.get('request_secs'),
+                                        timings.get('graceful_secs'),
+                                        timings.get('sigterm_secs'),
+                                        timings.get('sigkill_secs'),
+                                        monotonic() - started_at,
+                                        stopped_by)
+        self.logger.debug(f"Fldigi stop timings: {self.stop_timings}")
 
-        # now try the less graceful SIGKILL
-        process.kill()
+    def restart(self, force_if_unsuccessful=True) -> int:
+        '''Stops Fldigi and starts it again, e.g. to pick up config changes
 
-        if self._wait_for_shutdown():
-            self.logger.info("Fldigi successfully force killed via SIGKILL")
-            return True
-        self.logger.critical("Fldigi SIGKILL unsuccessful, cannot shut down Fldigi")
-        return False
+        @param force_if_unsuccessful(bool): True to force kill Fldigi if the graceful shutdown fails
+        @return (int): the start() result, 0 if Fldigi is running and functional, 1 otherwise
+        '''
+        if not self.stop(force_if_unsuccessful=force_if_unsuccessful):
+            return 1
+        return self.start()
 
     def _find_fldigi_exe(self):
         # first look in Program Files (x86)
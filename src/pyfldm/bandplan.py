@@ -0,0 +1,251 @@
+############################################################################
+#
+#  File: bandplan.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import json
+from bisect import bisect_right
+from typing import NamedTuple
+from .client import Client
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# amateur band edges in Hz for each IARU region, named as Fldigi names bands in the log
+_COMMON_BANDS = [
+    ('60m', 5351500, 5366500),
+    ('30m', 10100000, 10150000),
+    ('20m', 14000000, 14350000),
+    ('17m', 18068000, 18168000),
+    ('15m', 21000000, 21450000),
+    ('12m', 24890000, 24990000),
+    ('10m', 28000000, 29700000),
+]
+REGION_BANDS = {
+    1: [('160m', 1810000, 2000000), ('80m', 3500000, 3800000), ('40m', 7000000, 7200000)] + _COMMON_BANDS
+       + [('6m', 50000000, 52000000), ('2m', 144000000, 146000000), ('70cm', 430000000, 440000000)],
+    2: [('160m', 1800000, 2000000), ('80m', 3500000, 4000000), ('40m', 7000000, 7300000)] + _COMMON_BANDS
+       + [('6m', 50000000, 54000000), ('2m', 144000000, 148000000), ('70cm', 420000000, 450000000)],
+    3: [('160m', 1800000, 2000000), ('80m', 3500000, 3900000), ('40m', 7000000, 7300000)] + _COMMON_BANDS
+       + [('6m', 50000000, 54000000), ('2m', 144000000, 148000000), ('70cm', 430000000, 440000000)],
+}
+# a simplified version of the IARU HF band plans: the CW, narrow band digital, beacon and phone segments. Band
+# plans change, so load a plan with BandPlan.from_file for anything that needs to be exact
+_COMMON_SEGMENTS = [
+    ('CW', 10100000, 10130000), ('DIGITAL', 10130000, 10150000),
+    ('CW', 14000000, 14070000), ('DIGITAL', 14070000, 14099000), ('BEACON', 14099000, 14101000),
+    ('DIGITAL', 14101000, 14112000), ('PHONE', 14112000, 14350000),
+    ('CW', 18068000, 18095000), ('DIGITAL', 18095000, 18109000), ('BEACON', 18109000, 18111000),
+    ('PHONE', 18111000, 18168000),
+    ('CW', 21000000, 21070000), ('DIGITAL', 21070000, 21149000), ('BEACON', 21149000, 21151000),
+    ('PHONE', 21151000, 21450000),
+    ('CW', 24890000, 24915000), ('DIGITAL', 24915000, 24929000), ('BEACON', 24929000, 24931000),
+    ('PHONE', 24931000, 24990000),
+    ('CW', 28000000, 28070000), ('DIGITAL', 28070000, 28190000), ('BEACON', 28190000, 28225000),
+    ('PHONE', 28225000, 29700000),
+]
+REGION_SEGMENTS = {
+    1: [('CW', 1810000, 1838000), ('DIGITAL', 1838000, 1843000), ('PHONE', 1843000, 2000000),
+        ('CW', 3500000, 3570000), ('DIGITAL', 3570000, 3600000), ('PHONE', 3600000, 3800000),
+        ('CW', 7000000, 7040000), ('DIGITAL', 7040000, 7080000), ('PHONE', 7080000, 7200000)] + _COMMON_SEGMENTS,
+    2: [('CW', 1800000, 1840000), ('DIGITAL', 1840000, 1850000), ('PHONE', 1850000, 2000000),
+        ('CW', 3500000, 3570000), ('DIGITAL', 3570000, 3600000), ('PHONE', 3600000, 4000000),
+        ('CW', 7000000, 7040000), ('DIGITAL', 7040000, 7125000), ('PHONE', 7125000, 7300000)] + _COMMON_SEGMENTS,
+    3: [('CW', 1800000, 1840000), ('DIGITAL', 1840000, 1843000), ('PHONE', 1843000, 2000000),
+        ('CW', 3500000, 3535000), ('DIGITAL', 3535000, 3600000), ('PHONE', 3600000, 3900000),
+        ('CW', 7000000, 7040000), ('DIGITAL', 7040000, 7080000), ('PHONE', 7080000, 7300000)] + _COMMON_SEGMENTS,
+}
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ModuleNotFoundError("Bulk band plan lookups require numpy. Install it with: pip install pyfldm[bandplan]")
+
+class Segment(NamedTuple):
+    '''A frequency range in a band plan, start inclusive and stop exclusive, in Hz'''
+    name: str
+    start: int
+    stop: int
+
+class IntervalIndex:
+    '''Looks up which of a set of non-overlapping frequency ranges a frequency falls in with a binary search over the
+    sorted range starts. Used by BandPlan for both the bands and the segments
+
+    @param intervals(list[tuple[str, int, int]]): (name, start, stop) for each range, start inclusive and stop exclusive
+    @raises ValueError: if a range is empty or two ranges overlap
+    '''
+    def __init__(self, intervals: list) -> None:
+        self.segments = sorted((Segment(str(name), int(start), int(stop)) for name, start, stop in intervals),
+                               key=lambda segment: segment.start)
+        for segment in self.segments:
+            if segment.stop <= segment.start:
+                raise ValueError(f"Empty range {segment}")
+        for previous, segment in zip(self.segments, self.segments[1:]):
+            if segment.start < previous.stop:
+                raise ValueError(f"Overlapping ranges {previous} and {segment}")
+        self._starts = [segment.start for segment in self.segments]
+        self._stops = [segment.stop for segment in self.segments]
+        self._arrays = None
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def find(self, frequency: float) -> Segment:
+        '''Finds the range a frequency is in
+
+        @param frequency(float): the frequency in Hz
+        @return (Segment): the range, None if the frequency is not in any range
+        '''
+        i = bisect_right(self._starts, frequency) - 1
+        if i >= 0 and frequency < self._stops[i]:
+            return self.segments[i]
+        return None
+
+    def find_all(self, frequencies) -> 'np.ndarray':
+        '''Finds the range of many frequencies at once
+
+        @param frequencies(list[float]|np.ndarray): the frequencies in Hz
+        @return (np.ndarray): the index into segments of each frequency's range, -1 if it is not in any range
+        '''
+        _require_numpy()
+        if self._arrays is None:
+            self._arrays = (np.asarray(self._starts, dtype=float), np.asarray(self._stops, dtype=float))
+        starts, stops = self._arrays
+        frequencies = np.asarray(frequencies, dtype=float)
+        indexes = np.searchsorted(starts, frequencies, side='right') - 1
+        inside = (indexes >= 0) & (frequencies < stops[np.maximum(indexes, 0)])
+        return np.where(inside, indexes, -1)
+
+class BandPlan:
+    '''Maps frequencies to amateur bands and band plan segments locally in O(log n), instead of asking Fldigi with
+    log.get_band. A plan is made for an IARU region, or from your own band and segment lists. The bulk lookups
+    classify a whole array of frequencies (e.g. a logbook) in one call and need numpy.
+
+    @param region(int): the IARU region (1, 2 or 3) whose bands and segments to use
+    @param bands(list[tuple[str, int, int]]): [OPTIONAL] (name, start Hz, stop Hz) for each band, instead of the region's
+    @param segments(list[tuple[str, int, int]]): [OPTIONAL] (name, start Hz, stop Hz) for each segment, instead of the region's
+
+    Example use:
+    >>> from pyfldm.client import Client
+    >>> from pyfldm.bandplan import BandPlan
+    >>> client = Client()
+    >>> plan = BandPlan(region=2)
+    >>> plan.band(14070000)
+    '20m'
+    >>> plan.segment(14070000)
+    'DIGITAL'
+    >>> plan.current_band(client)      # one main.get_frequency call, no log.get_band
+    '20m'
+    >>> plan.bands_of([7.074, 14.074, 50.313, 99.1], unit_hz=1e6)     # e.g. the FREQ of every QSO in a logbook
+    array(['40m', '20m', '6m', ''], dtype=object)
+    '''
+    def __init__(self, region: int = 2, bands: list = None, segments: list = None) -> None:
+        if region not in REGION_BANDS:
+            raise ValueError(f"region must be one of: {', '.join(str(r) for r in REGION_BANDS)}")
+        self.region = region
+        self._bands = IntervalIndex(bands if bands is not None else REGION_BANDS[region])
+        self._segments = IntervalIndex(segments if segments is not None else REGION_SEGMENTS[region])
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    @classmethod
+    def from_file(cls, file_path: str) -> 'BandPlan':
+        '''Loads a band plan from a JSON file: {"region": 1, "bands": [[name, start, stop], ...], "segments": [...]}.
+        The bands or segments left out are taken from the region
+
+        @param file_path(str): the path of the file to read
+        @return (BandPlan): the band plan
+        '''
+        with open(file_path) as f:
+            data = json.load(f)
+        return cls(data.get('region', 2), data.get('bands'), data.get('segments'))
+
+    @property
+    def bands(self) -> list:
+        '''The bands in the plan in frequency order'''
+        return list(self._bands.segments)
+
+    @property
+    def segments(self) -> list:
+        '''The segments in the plan in frequency order'''
+        return list(self._segments.segments)
+
+    def band(self, frequency: float) -> str:
+        '''Gets the band a frequency is in
+
+        @param frequency(float): the frequency in Hz
+        @return (str): the band name, e.g. '20m', '' if the frequency is outside every band
+        '''
+        band = self._bands.find(frequency)
+        return band.name if band is not None else ''
+
+    def segment(self, frequency: float) -> str:
+        '''Gets the band plan segment a frequency is in
+
+        @param frequency(float): the frequency in Hz
+        @return (str): the segment name, e.g. 'CW' or 'DIGITAL', '' if the frequency is outside every segment
+        '''
+        segment = self._segments.find(frequency)
+        return segment.name if segment is not None else ''
+
+    def band_range(self, band: str) -> Segment:
+        '''Gets the edges of a band
+
+        @param band(str): the band name, e.g. '20m'
+        @return (Segment): the band, None if it is not in the plan
+        '''
+        for segment in self._bands.segments:
+            if segment.name == band:
+                return segment
+        return None
+
+    def current_band(self, client: Client) -> str:
+        '''Gets the band Fldigi is tuned to, from a single main.get_frequency call
+
+        @param client(Client): the pyfldm client connected to Fldigi
+        @return (str): the band name, '' if the frequency is outside every band
+        '''
+        return self.band(client.main.get_frequency())
+
+    def _names_of(self, index: IntervalIndex, frequencies, unit_hz: float) -> 'np.ndarray':
+        _require_numpy()
+        names = np.array([segment.name for segment in index.segments] + [''], dtype=object)
+        indexes = index.find_all(np.asarray(frequencies, dtype=float) * unit_hz)
+        # -1 picks the '' on the end
+        return names[indexes]
+
+    def bands_of(self, frequencies, unit_hz: float = 1) -> 'np.ndarray':
+        '''Gets the band of many frequencies at once
+
+        @param frequencies(list[float]|np.ndarray): the frequencies
+        @param unit_hz(float): the size of the frequency unit in Hz, e.g. 1e6 for ADIF FREQ values in MHz
+        @return (np.ndarray): the band name of each frequency, '' where it is outside every band
+        '''
+        return self._names_of(self._bands, frequencies, unit_hz)
+
+    def segments_of(self, frequencies, unit_hz: float = 1) -> 'np.ndarray':
+        '''Gets the segment of many frequencies at once
+
+        @param frequencies(list[float]|np.ndarray): the frequencies
+        @param unit_hz(float): the size of the frequency unit in Hz, e.g. 1e6 for ADIF FREQ values in MHz
+        @return (np.ndarray): the segment name of each frequency, '' where it is outside every segment
+        '''
+        return self._names_of(self._segments, frequencies, unit_hz)
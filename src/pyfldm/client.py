@@ -24,6 +24,7 @@ import logging
 import xmlrpc.client
 from .submodules.fldigi import Fldigi
 from .submodules.ioconfig import IoConfig
+from .submodules.log import Log
 from .submodules.main import Main
 from .submodules.modem import Modem
 from .submodules.navtex import Navtex
@@ -31,6 +32,8 @@ from .submodules.rig import Rig
 from .submodules.spot import Spot
 from .submodules.text import Text
 from .submodules.wefax import Wefax
+from .submodules.batch import BatchCaller
+from .submodules.snapshot import Snapshot, take_snapshot
 
 class Client:
 
@@ -62,9 +65,11 @@ class Client:
         self.port = port
         self.client = xmlrpc.client.ServerProxy(f'http://{self.hostname}:{self.port}/', allow_none=True)
         self.logger = logging.getLogger(__name__)
+        self._batch = BatchCaller(self.client)
 
         self.fldigi = Fldigi(self.client)
         self.io = IoConfig(self.client)
+        self.log = Log(self.client, self._batch)
         self.main = Main(self.client)
         self.modem = Modem(self.client)
         self.navtex = Navtex(self.client)
@@ -75,6 +80,7 @@ class Client:
         self._sub_clients = [
             self.fldigi,
             self.io,
+            self.log,
             self.main,
             self.modem,
             self.navtex,
@@ -107,5 +113,24 @@ class Client:
         for sub in self._sub_clients:
             sub.print_methods()
 
+    def batch(self, calls: list, raise_faults: bool = True) -> list:
+        '''Makes several xmlrpc calls in a single round trip (system.multicall), falling back to
+        individual calls if Fldigi does not support multicall
+
+        @param calls(list[tuple]): (method path, args) pairs, e.g. [('main.get_frequency', ()), ('main.set_afc', (True,))]
+        @param raise_faults(bool): True to raise the first Fault, False to return Faults in place of results
+        @return (list): the result of each call, in order
+        '''
+        return self._batch.call(calls, raise_faults)
+
+    def snapshot(self, fields: list = None) -> Snapshot:
+        '''Captures the radio state across the main, modem, rig and spot groups in as few round trips as
+        possible. See pyfldm.submodules.snapshot.SNAPSHOT_FIELDS for the available fields
+
+        @param fields(list[str]): [OPTIONAL] the fields to capture, defaults to the common status fields
+        @return (Snapshot): an immutable snapshot with a capture timestamp and per-field latency
+        '''
+        return take_snapshot(self._batch, fields)
+
 
     
\ No newline at end of file
@@ -0,0 +1,262 @@
+############################################################################
+#
+#  File: contest.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import sys
+import logging
+import threading
+from typing import NamedTuple
+from .adif import adif_mode, can_resume, file_signature, iter_adif
+from .client import Client
+from .submodules.flconfig_manager import FlConfigManager
+
+# what makes two QSOs with the same call dupes: the same band and mode, the same band, or any QSO at all
+DUPE_SCOPES = ['band_mode', 'band', 'call']
+
+class CheckResult(NamedTuple):
+    '''The result of checking a callsign with DupeChecker.check()'''
+    call: str
+    band: str
+    mode: str
+    dupe: bool
+    new_multipliers: list
+
+def _mode(fields: dict) -> str:
+    # older logs may only have the submode (e.g. PSK31), which maps to its family like a modem name does
+    return fields.get('MODE') or fields.get('SUBMODE') or ''
+
+class DupeChecker:
+    '''Checks callsigns for dupes and new multipliers in constant time during a contest. The worked QSOs are kept
+    in memory as one set of compact string keys (about 60 bytes per QSO, so 100k QSOs fit in a few MB), seeded
+    from the ADIF logbook and then kept up to date by reading only the records Fldigi has appended since (the whole
+    log is read again if Fldigi rewrote it). QSOs can also be added directly as they are logged. Modes are compared
+    as the ADIF MODE, so a Fldigi modem name like BPSK31 matches QSOs logged as MODE PSK, SUBMODE PSK31.
+
+    @param adif_path(str): [OPTIONAL] the ADIF logbook to seed from and follow
+    @param dupe_scope(str): 'band_mode', 'band' or 'call', see DUPE_SCOPES
+    @param multiplier_fields(list[str]): ADIF fields that count as multipliers, e.g. ['STATE'] or ['DXCC']
+    @param multipliers_per_band(bool): True if each multiplier counts again on every band
+    @param points_per_qso(int): the points for each (non-dupe) QSO
+    @param since(str): [OPTIONAL] only count logbook QSOs on or after this ADIF date (YYYYMMDD), e.g. the contest start
+
+    Example use:
+    >>> from pyfldm.client import Client
+    >>> from pyfldm.contest import DupeChecker
+    >>> client = Client()
+    >>> checker = DupeChecker.from_config(multiplier_fields=['STATE'], since='20231104')
+    >>> checker.check('W1AW', '20m', 'RTTY', {'STATE': 'CT'})
+    CheckResult(call='W1AW', band='20m', mode='RTTY', dupe=False, new_multipliers=['CT'])
+    >>> checker.check_current(client)    # whatever is in Fldigi's log fields right now, on the current modem
+    CheckResult(call='K1ABC', band='20m', mode='PSK', dupe=True, new_multipliers=[])
+    >>> checker.update()                 # pick up QSOs logged since
+    1
+    >>> checker.score
+    41912
+    '''
+    def __init__(self,
+                 adif_path: str = None,
+                 dupe_scope: str = 'band_mode',
+                 multiplier_fields: list = None,
+                 multipliers_per_band: bool = False,
+                 points_per_qso: int = 1,
+                 since: str = None) -> None:
+        if dupe_scope not in DUPE_SCOPES:
+            raise ValueError(f"dupe_scope must be one of: {', '.join(DUPE_SCOPES)}")
+        self.logger = logging.getLogger(__name__)
+        self.adif_path = adif_path
+        self._dupe_scope = dupe_scope
+        self._multiplier_fields = [field.upper() for field in (multiplier_fields or [])]
+        self._multipliers_per_band = multipliers_per_band
+        self._points_per_qso = int(points_per_qso)
+        self._since = since
+        self._lock = threading.Lock()
+        self._worked = set()
+        self._multipliers = set()
+        self._offset = 0
+        self._signature = None
+        self.qso_count = 0
+        self.dupe_count = 0
+        if adif_path is not None:
+            self.update()
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def __len__(self) -> int:
+        return self.qso_count
+
+    @classmethod
+    def from_config(cls, config: FlConfigManager = None, **kwargs) -> 'DupeChecker':
+        '''Creates a checker seeded from the logbook Fldigi is configured to use (LOGBOOKFILENAME)
+
+        @param config(FlConfigManager): [OPTIONAL] the config manager to read the logbook path from, the default Fldigi config if not given
+        @return (DupeChecker): the seeded checker
+        '''
+        config = config if config is not None else FlConfigManager()
+        return cls(config.get_log_file_name(), **kwargs)
+
+    def _key(self, call: str, band: str, mode: str) -> str:
+        if self._dupe_scope == 'band_mode':
+            key = f'{call}|{band}|{mode}'
+        elif self._dupe_scope == 'band':
+            key = f'{call}|{band}'
+        else:
+            key = call
+        return sys.intern(key)
+
+    def _multiplier_keys(self, band: str, fields: dict) -> list:
+        keys = []
+        for field in self._multiplier_fields:
+            value = str(fields.get(field) or '').strip().upper()
+            if value:
+                keys.append((field, value, band if self._multipliers_per_band else ''))
+        return keys
+
+    @staticmethod
+    def _normalize(call: str, band: str, mode: str) -> tuple:
+        return call.strip().upper(), band.strip().lower(), adif_mode(mode)[0]
+
+    def is_dupe(self, call: str, band: str, mode: str) -> bool:
+        '''Checks whether a callsign has already been worked
+
+        @param call(str): the callsign
+        @param band(str): the band, e.g. '20m'
+        @param mode(str): the ADIF mode or Fldigi modem name, e.g. 'RTTY' or 'BPSK31'
+        @return (bool): True if it would be a dupe
+        '''
+        return self._key(*self._normalize(call, band, mode)) in self._worked
+
+    def check(self, call: str, band: str, mode: str, fields: dict = None) -> CheckResult:
+        '''Checks a callsign for a dupe and for any new multipliers it would bring, without logging it
+
+        @param call(str): the callsign
+        @param band(str): the band, e.g. '20m'
+        @param mode(str): the ADIF mode or Fldigi modem name, e.g. 'RTTY' or 'BPSK31'
+        @param fields(dict): [OPTIONAL] the multiplier field values of the QSO, keyed by ADIF field name
+        @return (CheckResult): whether it is a dupe and the multiplier values that would be new
+        '''
+        call, band, mode = self._normalize(call, band, mode)
+        fields = {k.upper(): v for k, v in (fields or {}).items()}
+        with self._lock:
+            dupe = self._key(call, band, mode) in self._worked
+            new = []
+            if not dupe:
+                new = [key[1] for key in self._multiplier_keys(band, fields) if key not in self._multipliers]
+        return CheckResult(call, band, mode, dupe, new)
+
+    def add(self, call: str, band: str, mode: str, fields: dict = None) -> CheckResult:
+        '''Logs a QSO
+
+        @param call(str): the callsign
+        @param band(str): the band, e.g. '20m'
+        @param mode(str): the ADIF mode or Fldigi modem name, e.g. 'RTTY' or 'BPSK31'
+        @param fields(dict): [OPTIONAL] the multiplier field values of the QSO, keyed by ADIF field name
+        @return (CheckResult): whether it was a dupe and the new multipliers it brought
+        '''
+        call, band, mode = self._normalize(call, band, mode)
+        fields = {k.upper(): v for k, v in (fields or {}).items()}
+        with self._lock:
+            return self._add_locked(call, band, mode, fields)
+
+    def _add_locked(self, call: str, band: str, mode: str, fields: dict) -> CheckResult:
+        key = self._key(call, band, mode)
+        if key in self._worked:
+            self.dupe_count += 1
+            return CheckResult(call, band, mode, True, [])
+        self._worked.add(key)
+        self.qso_count += 1
+        new = []
+        for multiplier in self._multiplier_keys(band, fields):
+            if multiplier not in self._multipliers:
+                self._multipliers.add(multiplier)
+                new.append(multiplier[1])
+        return CheckResult(call, band, mode, False, new)
+
+    def update(self) -> int:
+        '''Adds the QSOs appended to the logbook since the last update (or all of them the first time). If the
+        logbook was rewritten instead of appended to, the QSOs read from it before are dropped and it is read again
+
+        @return (int): the number of logbook records read
+        '''
+        if self.adif_path is None:
+            return 0
+        count = 0
+        with self._lock:
+            if not can_resume(self.adif_path, self._offset, self._signature):
+                self.logger.info(f"{self.adif_path} was rewritten, reading it again")
+                self._worked.clear()
+                self._multipliers.clear()
+                self.qso_count = 0
+                self.dupe_count = 0
+                self._offset = 0
+            for record in iter_adif(self.adif_path, self._offset):
+                self._offset = record.end
+                fields = record.fields
+                count += 1
+                if self._since and fields.get('QSO_DATE', '') < self._since:
+                    continue
+                call, band, mode = self._normalize(fields.get('CALL', ''), fields.get('BAND', ''), _mode(fields))
+                if call:
+                    self._add_locked(call, band, mode, fields)
+            if count:
+                self._signature = file_signature(self.adif_path, self._offset)
+        if count:
+            self.logger.debug(f"Read {count} QSOs from {self.adif_path}")
+        return count
+
+    def check_current(self, client: Client) -> CheckResult:
+        '''Checks the callsign currently in Fldigi's log fields, on the band in the log fields and the current modem
+
+        @param client(Client): the pyfldm client connected to Fldigi
+        @return (CheckResult): whether it is a dupe and the multiplier values that would be new
+        '''
+        record = client.log.get_record()
+        mode = client.modem.get_name()
+        fields = {field: getattr(record, field.lower(), '') for field in self._multiplier_fields}
+        return self.check(record.call, record.band, mode, fields)
+
+    @property
+    def multiplier_count(self) -> int:
+        '''The number of multipliers worked'''
+        return len(self._multipliers)
+
+    def multipliers(self) -> dict:
+        '''Gets the multipliers worked
+
+        @return (dict): the sorted values worked for each multiplier field (as 'value/band' when counted per band)
+        '''
+        with self._lock:
+            result = {field: [] for field in self._multiplier_fields}
+            for field, value, band in self._multipliers:
+                result[field].append(f'{value}/{band}' if band else value)
+        return {field: sorted(values) for field, values in result.items()}
+
+    @property
+    def points(self) -> int:
+        '''The QSO points, not counting dupes'''
+        return self.qso_count * self._points_per_qso
+
+    @property
+    def score(self) -> int:
+        '''The running score: QSO points times multipliers, or just the points if there are no multiplier fields'''
+        if not self._multiplier_fields:
+            return self.points
+        return self.points * self.multiplier_count
@@ -0,0 +1,311 @@
+############################################################################
+#
+#  File: hopper.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import heapq
+import logging
+import itertools
+import threading
+import statistics
+from time import time, monotonic
+from collections import deque
+from typing import NamedTuple
+from xmlrpc.client import Error, Fault
+from .client import Client
+
+FREQUENCY_SETTERS = {
+    'main': 'main.set_frequency',
+    'rig': 'rig.set_frequency',
+}
+MODE_SETTER = 'rig.set_mode'
+LATENCY_PROBE = 'main.get_trx_status'
+DEFAULT_RTT_SECS = .01
+# weight of each new round trip time in the moving average
+RTT_SMOOTHING = .2
+# the estimated time from sending a hop until Fldigi acts on it, as a fraction of the round trip time
+LEAD_FRACTION = .5
+DEFAULT_LATE_TOLERANCE_SECS = .02
+DEFAULT_MISS_TOLERANCE_SECS = .5
+DEFAULT_PROBE_INTERVAL_SECS = 5.0
+# sleep until this close to the send time, then spin for precision
+SPIN_SECS = .002
+# how many of the most recent hop records are kept for stats(), the oldest are dropped first
+MAX_RECORDS = 1000
+
+class Hop(NamedTuple):
+    '''A scheduled frequency (and optionally rig mode) change'''
+    at: float
+    frequency: float
+    mode: str = None
+    target: str = 'main'
+
+class HopRecord(NamedTuple):
+    '''The outcome of a hop: error_secs is when Fldigi is estimated to have acted on it, relative to the
+    scheduled time (positive is late), None if the hop was missed'''
+    hop: Hop
+    sent_at: float
+    rtt_secs: float
+    error_secs: float
+    late: bool
+    missed: bool
+
+class HopScheduler(threading.Thread):
+    '''Changes the frequency, and optionally the rig mode, at exact wall clock times. Runs as a daemon thread on its
+    own xmlrpc connection and times the hops on the monotonic clock. The round trip time to Fldigi is measured on
+    every hop (and probed while idle) and smoothed with a moving average, and each hop is sent early by the
+    estimated time for it to reach Fldigi. Hops that can no longer be made within miss_tolerance_secs are skipped
+    and counted as missed.
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param late_tolerance_secs(float): hops estimated to land later than this are counted as late
+    @param miss_tolerance_secs(float): hops that are already this overdue are skipped
+    @param probe_interval_secs(float): how often to measure the round trip time while there are no hops to send
+    @param max_records(int): how many of the most recent hop records to keep in records
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from time import time
+    >>> from pyfldm.hopper import HopScheduler
+    >>> hopper = HopScheduler()
+    >>> hopper.start()
+    >>> hopper.add_cycle([7074000, 10136000, 14074000], start=time() + 5, dwell_secs=15, cycles=4)
+    >>> hopper.add(time() + 200, 14070000, mode='USB', target='rig')
+    >>> hopper.stats()
+    {'hops': 13, 'missed': 0, 'late': 1, 'rtt_secs': 0.0021, 'mean_error_secs': 0.0003, 'p50': 0.0002, 'p90': 0.0011, 'p99': 0.0214}
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 late_tolerance_secs: float = DEFAULT_LATE_TOLERANCE_SECS,
+                 miss_tolerance_secs: float = DEFAULT_MISS_TOLERANCE_SECS,
+                 probe_interval_secs: float = DEFAULT_PROBE_INTERVAL_SECS,
+                 max_records: int = MAX_RECORDS) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._late_tolerance = float(late_tolerance_secs)
+        self._miss_tolerance = float(miss_tolerance_secs)
+        self._probe_interval = float(probe_interval_secs)
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._last_rtt_at = None
+        self.rtt_secs = None
+        self.records = deque(maxlen=max_records)
+        # totals over every hop, since records only holds the most recent
+        self.hop_count = 0
+        self.missed_count = 0
+        self.late_count = 0
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def add(self, at: float, frequency: float, mode: str = None, target: str = 'main') -> Hop:
+        '''Schedules a hop
+
+        @param at(float): the unix timestamp to hop at
+        @param frequency(float): the frequency to change to
+        @param mode(str): [OPTIONAL] the rig mode to change to at the same time
+        @param target(str): 'main' to use main.set_frequency, 'rig' to use rig.set_frequency
+        @return (Hop): the scheduled hop
+        '''
+        if target not in FREQUENCY_SETTERS:
+            raise ValueError(f"target must be one of: {', '.join(FREQUENCY_SETTERS)}")
+        hop = Hop(float(at), float(frequency), mode, target)
+        # converted now so that later changes to the wall clock do not move the hop
+        due = monotonic() + (hop.at - time())
+        with self._condition:
+            heapq.heappush(self._schedule, (due, next(self._sequence), hop))
+            self._condition.notify()
+        return hop
+
+    def add_cycle(self,
+                  channels: list,
+                  start: float,
+                  dwell_secs: float,
+                  cycles: int = 1,
+                  mode: str = None,
+                  target: str = 'main') -> list:
+        '''Schedules hops through a list of channels in turn, dwelling on each for the same time
+
+        @param channels(list[float]): the frequencies to hop through
+        @param start(float): the unix timestamp of the first hop
+        @param dwell_secs(float): the time between hops
+        @param cycles(int): the number of times to go through the channels
+        @param mode(str): [OPTIONAL] the rig mode to set with each hop
+        @param target(str): 'main' to use main.set_frequency, 'rig' to use rig.set_frequency
+        @return (list[Hop]): the scheduled hops
+        '''
+        hops = []
+        for i in range(len(channels) * cycles):
+            hops.append(self.add(start + i * dwell_secs, channels[i % len(channels)], mode, target))
+        return hops
+
+    def pending(self) -> list:
+        '''Gets the hops not yet sent, in order
+
+        @return (list[Hop]): the scheduled hops
+        '''
+        with self._condition:
+            return [hop for _, _, hop in sorted(self._schedule)]
+
+    def clear(self) -> None:
+        '''Removes every hop not yet sent'''
+        with self._condition:
+            self._schedule.clear()
+            self._condition.notify()
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops the scheduler. Hops not yet sent are dropped
+
+        @param timeout_secs(float): the max time in seconds to wait for the scheduler to stop
+        '''
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        if self.is_alive():
+            self.join(timeout_secs)
+
+    def _update_rtt(self, rtt: float) -> None:
+        self._last_rtt_at = monotonic()
+        if self.rtt_secs is None:
+            self.rtt_secs = rtt
+        else:
+            self.rtt_secs += RTT_SMOOTHING * (rtt - self.rtt_secs)
+
+    def measure_rtt(self, samples: int = 5) -> float:
+        '''Measures the round trip time to Fldigi and folds it into the moving average
+
+        @param samples(int): the number of calls to time
+        @return (float): the smoothed round trip time in seconds
+        '''
+        for _ in range(samples):
+            start = monotonic()
+            self._client.batch([(LATENCY_PROBE, ())])
+            self._update_rtt(monotonic() - start)
+        return self.rtt_secs
+
+    @property
+    def lead_secs(self) -> float:
+        '''How early hops are sent, the estimated time for a call to reach Fldigi'''
+        return (self.rtt_secs if self.rtt_secs is not None else DEFAULT_RTT_SECS) * LEAD_FRACTION
+
+    def _next_hop(self) -> tuple:
+        '''Waits until the next hop is due to be sent, probing the round trip time while idle'''
+        with self._condition:
+            while not self._stop_event.is_set():
+                if self._schedule:
+                    send_at = self._schedule[0][0] - self.lead_secs
+                    wait = send_at - monotonic()
+                    if wait <= SPIN_SECS:
+                        break
+                else:
+                    wait = None
+                idle = self._last_rtt_at is None or monotonic() - self._last_rtt_at >= self._probe_interval
+                if idle and (wait is None or wait > self._probe_interval):
+                    self._condition.release()
+                    try:
+                        self.measure_rtt(1)
+                    except (OSError, Error):
+                        self.logger.debug("Round trip probe failed", exc_info=True)
+                        self._last_rtt_at = monotonic()
+                    finally:
+                        self._condition.acquire()
+                    continue
+                timeout = self._probe_interval if wait is None else min(wait - SPIN_SECS, self._probe_interval)
+                self._condition.wait(timeout)
+            if self._stop_event.is_set():
+                return None
+            due, _, hop = heapq.heappop(self._schedule)
+        send_at = due - self.lead_secs
+        while monotonic() < send_at:
+            pass
+        return due, hop
+
+    def _send(self, due: float, hop: Hop) -> HopRecord:
+        now = monotonic()
+        if now - due > self._miss_tolerance:
+            self.logger.warning(f"Missed hop to {hop.frequency} scheduled {now - due:.3f} secs ago")
+            return HopRecord(hop, None, None, None, False, True)
+        calls = []
+        if hop.mode is not None:
+            calls.append((MODE_SETTER, (str(hop.mode),)))
+        calls.append((FREQUENCY_SETTERS[hop.target], (hop.frequency,)))
+        sent_at = time()
+        start = monotonic()
+        results = self._client.batch(calls, raise_faults=False)
+        rtt = monotonic() - start
+        self._update_rtt(rtt)
+        for result in results:
+            if isinstance(result, Fault):
+                self.logger.error(f"Hop to {hop.frequency} failed: {result.faultString}")
+        error = (start + rtt * LEAD_FRACTION) - due
+        late = error > self._late_tolerance
+        if late:
+            self.logger.debug(f"Hop to {hop.frequency} landed {error * 1000:.1f} ms late")
+        return HopRecord(hop, sent_at, rtt, error, late, False)
+
+    def _record(self, record: HopRecord) -> None:
+        self.records.append(record)
+        self.hop_count += 1
+        self.missed_count += record.missed
+        self.late_count += record.late
+
+    def stats(self) -> dict:
+        '''Summarizes the hops made so far. The hop, missed and late counts are totals, the mean error and the
+        percentiles of the absolute timing error (jitter) in seconds are over the records kept
+
+        @return (dict): hops, missed, late, rtt_secs, mean_error_secs and the p50, p90 and p99 jitter
+        '''
+        records = list(self.records)
+        errors = [record.error_secs for record in records if not record.missed]
+        result = {
+            'hops': self.hop_count,
+            'missed': self.missed_count,
+            'late': self.late_count,
+            'rtt_secs': self.rtt_secs,
+            'mean_error_secs': statistics.fmean(errors) if errors else None,
+        }
+        jitter = sorted(abs(error) for error in errors)
+        if len(jitter) >= 2:
+            quantiles = statistics.quantiles(jitter, n=100, method='inclusive')
+            result.update(p50=quantiles[49], p90=quantiles[89], p99=quantiles[98])
+        else:
+            result.update(dict.fromkeys(['p50', 'p90', 'p99'], jitter[0] if jitter else None))
+        return result
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Sends hops as they fall due until stopped'''
+        try:
+            self.measure_rtt()
+        except (OSError, Error):
+            self.logger.warning("Could not measure the round trip time to Fldigi", exc_info=True)
+        while True:
+            next_hop = self._next_hop()
+            if next_hop is None:
+                return
+            try:
+                self._record(self._send(*next_hop))
+            except (OSError, Error):
+                self.logger.warning("Hop failed", exc_info=True)
+                self._record(HopRecord(next_hop[1], None, None, None, False, True))
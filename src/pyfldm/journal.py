@@ -0,0 +1,316 @@
+############################################################################
+#
+#  File: journal.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import mmap
+import queue
+import struct
+import logging
+import threading
+from bisect import bisect_right
+from time import time
+from typing import Iterator, NamedTuple
+from xmlrpc.client import Binary
+
+SEGMENT_EXTENSION = '.jrn'
+INDEX_EXTENSION = '.idx'
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_INDEX_INTERVAL_BYTES = 64 * 1024
+DEFAULT_FSYNC_INTERVAL_SECS = 1.0
+
+# record header: timestamp (float64), kind (uint8), payload length (uint32)
+RECORD_HEADER = struct.Struct('<dBI')
+# index entry: timestamp (float64), byte offset into the segment (uint64)
+INDEX_ENTRY = struct.Struct('<dQ')
+
+KIND_RX = 0
+KIND_TX = 1
+KIND_NAMES = {KIND_RX: 'rx', KIND_TX: 'tx'}
+KIND_CODES = {name: code for code, name in KIND_NAMES.items()}
+
+class JournalRecord(NamedTuple):
+    '''A single timestamped chunk of RX or TX data read back from a journal'''
+    timestamp: float
+    kind: str
+    data: bytes
+
+class SessionJournal(threading.Thread):
+    '''An append-only journal of every RX and TX character, for record keeping. Appends only put the data
+    on a queue so they never slow down the caller's poll loop; a daemon writer thread writes the records to
+    segmented files, batching fsyncs and rotating to a new segment once the current one is full. Each
+    segment has a sparse time index so JournalReader can seek to a time range without scanning.
+
+    @param directory(str): the directory to write the journal segments into (created if needed)
+    @param prefix(str): the file name prefix for the segments
+    @param segment_max_bytes(int): the size at which to rotate to a new segment
+    @param index_interval_bytes(int): how many bytes of records between index entries
+    @param fsync_interval_secs(float): the max time between fsyncs of written records
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.client import Client
+    >>> from pyfldm.journal import SessionJournal
+    >>> client = Client()
+    >>> journal = SessionJournal('/var/log/fldigi-journal')
+    >>> journal.start()
+    >>> journal.append_rx(client.text.get_rx_data())
+    >>> journal.append_tx(client.text.get_tx_data())
+    >>> journal.close()
+    '''
+    def __init__(self,
+                 directory: str,
+                 prefix: str = 'journal',
+                 segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+                 index_interval_bytes: int = DEFAULT_INDEX_INTERVAL_BYTES,
+                 fsync_interval_secs: float = DEFAULT_FSYNC_INTERVAL_SECS) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.prefix = prefix
+        self._segment_max_bytes = int(segment_max_bytes)
+        self._index_interval_bytes = int(index_interval_bytes)
+        self._fsync_interval = float(fsync_interval_secs)
+        self._queue = queue.SimpleQueue()
+        self._segment_file = None
+        self._index_file = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._last_indexed = None
+        self._last_fsync = 0.0
+        self._dirty = False
+        self.records_written = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def append(self, kind: str, data) -> None:
+        '''Queues data to be journaled, timestamped now. Empty data is ignored
+
+        @param kind(str): 'rx' or 'tx'
+        @param data(bytes|Binary|str): the data to journal
+        '''
+        if isinstance(data, Binary):
+            data = data.data
+        if not data:
+            return
+        if isinstance(data, str):
+            data = data.encode()
+        self._queue.put((time(), KIND_CODES[kind], bytes(data)))
+
+    def append_rx(self, data) -> None:
+        '''Queues RX data to be journaled, such as the result of text.get_rx_data()
+
+        @param data(bytes|Binary|str): the received data
+        '''
+        self.append('rx', data)
+
+    def append_tx(self, data) -> None:
+        '''Queues TX data to be journaled, such as the result of text.get_tx_data()
+
+        @param data(bytes|Binary|str): the transmitted data
+        '''
+        self.append('tx', data)
+
+    def close(self, timeout_secs: float = None) -> None:
+        '''Writes out everything still queued, fsyncs and closes the journal
+
+        @param timeout_secs(float): the max time in seconds to wait for the writer to finish
+        '''
+        if self.is_alive():
+            self._queue.put(None)
+            self.join(timeout_secs)
+        else:
+            # never started, write whatever was queued from the calling thread
+            self._queue.put(None)
+            self.run()
+
+    def _segment_path(self, number: int, extension: str) -> str:
+        return os.path.join(self.directory, f'{self.prefix}-{number:08d}{extension}')
+
+    def _open_segment(self) -> None:
+        '''Opens the next segment number after any existing segments in the directory'''
+        existing = list_segments(self.directory, self.prefix)
+        self._segment_number = (_segment_number(existing[-1]) if existing else 0) + 1
+        self._segment_file = open(self._segment_path(self._segment_number, SEGMENT_EXTENSION), 'ab')
+        self._index_file = open(self._segment_path(self._segment_number, INDEX_EXTENSION), 'ab')
+        self._segment_size = 0
+        self._last_indexed = None
+        self.logger.debug(f"Opened journal segment {self._segment_number}")
+
+    def _close_segment(self) -> None:
+        if self._segment_file is None:
+            return
+        self._sync()
+        self._segment_file.close()
+        self._index_file.close()
+        self._segment_file = None
+        self._index_file = None
+
+    def _sync(self) -> None:
+        if not self._dirty:
+            return
+        for f in (self._segment_file, self._index_file):
+            f.flush()
+            os.fsync(f.fileno())
+        self._dirty = False
+        self._last_fsync = time()
+
+    def _write(self, timestamp: float, kind: int, data: bytes) -> None:
+        if self._segment_file is None or self._segment_size >= self._segment_max_bytes:
+            self._close_segment()
+            self._open_segment()
+        if self._last_indexed is None or (self._segment_size - self._last_indexed) >= self._index_interval_bytes:
+            self._index_file.write(INDEX_ENTRY.pack(timestamp, self._segment_size))
+            self._last_indexed = self._segment_size
+        self._segment_file.write(RECORD_HEADER.pack(timestamp, kind, len(data)))
+        self._segment_file.write(data)
+        record_size = RECORD_HEADER.size + len(data)
+        self._segment_size += record_size
+        self.bytes_written += record_size
+        self.records_written += 1
+        self._dirty = True
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Writes queued records until the journal is closed'''
+        closing = False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=self._fsync_interval)
+            except queue.Empty:
+                self._sync()
+                continue
+            # write everything already waiting before considering an fsync
+            while True:
+                if item is None:
+                    closing = True
+                    break
+                self._write(*item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if self._dirty:
+                self._segment_file.flush()
+                self._index_file.flush()
+                if (time() - self._last_fsync) >= self._fsync_interval:
+                    self._sync()
+        self._close_segment()
+
+def _segment_number(path: str) -> int:
+    return int(os.path.basename(path)[:-len(SEGMENT_EXTENSION)].rsplit('-', 1)[-1])
+
+def list_segments(directory: str, prefix: str = 'journal') -> list:
+    '''Lists the journal segment files in a directory, oldest first
+
+    @param directory(str): the journal directory
+    @param prefix(str): the file name prefix for the segments
+    @return (list): the paths of the segment files
+    '''
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory)
+             if name.startswith(f'{prefix}-') and name.endswith(SEGMENT_EXTENSION)]
+    paths = [os.path.join(directory, name) for name in names]
+    return sorted(paths, key=_segment_number)
+
+class JournalReader:
+    '''Reads records back from a SessionJournal directory. Segments are memory-mapped and each segment's
+    sparse time index is used to jump straight to the first record of a time range.
+
+    @param directory(str): the journal directory
+    @param prefix(str): the file name prefix for the segments
+
+    Example use:
+    >>> from pyfldm.journal import JournalReader
+    >>> reader = JournalReader('/var/log/fldigi-journal')
+    >>> for record in reader.read(start=1700000000, end=1700003600, kind='rx'):
+    ...     print(record.timestamp, record.data)
+    '''
+    def __init__(self, directory: str, prefix: str = 'journal') -> None:
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.prefix = prefix
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    @staticmethod
+    def _load_index(segment_path: str) -> tuple:
+        index_path = segment_path[:-len(SEGMENT_EXTENSION)] + INDEX_EXTENSION
+        timestamps = []
+        offsets = []
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                raw = f.read()
+            usable = len(raw) - (len(raw) % INDEX_ENTRY.size)
+            for timestamp, offset in INDEX_ENTRY.iter_unpack(raw[:usable]):
+                timestamps.append(timestamp)
+                offsets.append(offset)
+        return timestamps, offsets
+
+    def read(self, start: float = None, end: float = None, kind: str = None) -> Iterator[JournalRecord]:
+        '''Yields the journal records in a time range, oldest first
+
+        @param start(float): [OPTIONAL] the earliest timestamp to include, from the beginning if not given
+        @param end(float): [OPTIONAL] the latest timestamp to include, to the end if not given
+        @param kind(str): [OPTIONAL] 'rx' or 'tx' to only read one kind of record
+        @return (Iterator[JournalRecord]): the matching records
+        '''
+        kind_code = KIND_CODES[kind] if kind else None
+        segments = [(path, self._load_index(path)) for path in list_segments(self.directory, self.prefix)]
+        for i, (path, (timestamps, offsets)) in enumerate(segments):
+            if not timestamps:
+                continue
+            if end is not None and timestamps[0] > end:
+                break
+            if start is not None and i + 1 < len(segments):
+                next_timestamps = segments[i + 1][1][0]
+                if next_timestamps and next_timestamps[0] < start:
+                    # the whole segment is before the requested range
+                    continue
+            offset = 0
+            if start is not None:
+                position = bisect_right(timestamps, start) - 1
+                offset = offsets[position] if position >= 0 else 0
+            for record in self._read_segment(path, offset, kind_code):
+                if start is not None and record.timestamp < start:
+                    continue
+                if end is not None and record.timestamp > end:
+                    return
+                yield record
+
+    def _read_segment(self, path: str, offset: int, kind_code: int = None) -> Iterator[JournalRecord]:
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            while offset + RECORD_HEADER.size <= size:
+                timestamp, code, length = RECORD_HEADER.unpack_from(mapped, offset)
+                data_start = offset + RECORD_HEADER.size
+                if data_start + length > size:
+                    self.logger.warning(f"Truncated record at offset {offset} in {path}")
+                    return
+                offset = data_start + length
+                if kind_code is None or code == kind_code:
+                    yield JournalRecord(timestamp, KIND_NAMES.get(code, str(code)), mapped[data_start:offset])
@@ -0,0 +1,284 @@
+############################################################################
+#
+#  File: maidenhead.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import math
+from typing import NamedTuple
+from .adif import iter_adif
+from .client import Client
+from .submodules.flconfig_manager import FlConfigManager
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_MILE = 1.609344
+# each pair of locator characters: (first valid character, number of values, degrees of longitude, degrees of latitude)
+LOCATOR_PAIRS = [
+    ('A', 18, 20.0, 10.0),              # field
+    ('0', 10, 2.0, 1.0),                # square
+    ('A', 24, 5 / 60, 2.5 / 60),        # subsquare
+    ('0', 10, .5 / 60, .25 / 60),       # extended square
+]
+MAX_LOCATOR_LENGTH = 2 * len(LOCATOR_PAIRS)
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ModuleNotFoundError("The vectorized grid functions require numpy. Install it with: pip install pyfldm[grid]")
+
+def locator_to_latlon(locator: str) -> tuple:
+    '''Converts a Maidenhead locator (2, 4, 6 or 8 characters) to the latitude and longitude of the center of its square
+
+    @param locator(str): the locator, e.g. 'FN31pr'
+    @return (tuple[float, float]): the latitude and longitude in degrees
+    @raises ValueError: if the locator is not valid
+    '''
+    code = locator.strip().upper()
+    if len(code) not in range(2, MAX_LOCATOR_LENGTH + 1, 2):
+        raise ValueError(f"Invalid locator {locator!r}, it must have 2, 4, 6 or 8 characters")
+    lat, lon = -90.0, -180.0
+    for i, (first, count, lon_size, lat_size) in enumerate(LOCATOR_PAIRS[:len(code) // 2]):
+        lon_value = ord(code[2 * i]) - ord(first)
+        lat_value = ord(code[2 * i + 1]) - ord(first)
+        if not (0 <= lon_value < count and 0 <= lat_value < count):
+            raise ValueError(f"Invalid locator {locator!r}")
+        lon += lon_value * lon_size
+        lat += lat_value * lat_size
+    _, _, lon_size, lat_size = LOCATOR_PAIRS[len(code) // 2 - 1]
+    return lat + lat_size / 2, lon + lon_size / 2
+
+def latlon_to_locator(lat: float, lon: float, length: int = 6) -> str:
+    '''Converts a latitude and longitude to a Maidenhead locator
+
+    @param lat(float): the latitude in degrees
+    @param lon(float): the longitude in degrees
+    @param length(int): the number of locator characters, 2, 4, 6 or 8
+    @return (str): the locator, subsquare letters in lower case as is usual, e.g. 'FN31pr'
+    '''
+    if length not in range(2, MAX_LOCATOR_LENGTH + 1, 2):
+        raise ValueError("length must be 2, 4, 6 or 8")
+    # the north pole and the date line belong to the last square rather than one off the grid
+    lat = min(max(lat + 90.0, 0.0), 180.0 - 1e-9)
+    lon = (lon + 180.0) % 360.0
+    locator = ''
+    for i, (first, count, lon_size, lat_size) in enumerate(LOCATOR_PAIRS[:length // 2]):
+        lon_value, lat_value = int(lon // lon_size), int(lat // lat_size)
+        lon -= lon_value * lon_size
+        lat -= lat_value * lat_size
+        pair = chr(ord(first) + min(lon_value, count - 1)) + chr(ord(first) + min(lat_value, count - 1))
+        locator += pair.lower() if i == 2 else pair
+    return locator
+
+def distance_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> tuple:
+    '''Works out the great circle distance and the initial bearing from one point to another
+
+    @param lat1(float): the latitude of the start in degrees
+    @param lon1(float): the longitude of the start in degrees
+    @param lat2(float): the latitude of the end in degrees
+    @param lon2(float): the longitude of the end in degrees
+    @return (tuple[float, float]): the distance in km and the bearing in degrees from true north (0 to 360)
+    '''
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lon2 - lon1)
+    # haversine, which stays accurate for short distances
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+    y = math.sin(dlambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return distance, math.degrees(math.atan2(y, x)) % 360.0
+
+def locators_to_latlon(locators) -> tuple:
+    '''Converts many Maidenhead locators to latitude and longitude at once. Locators may be any mix of 2, 4, 6 and
+    8 characters, and invalid or empty ones give NaN rather than an error, so a whole logbook can be converted in
+    one call
+
+    @param locators(list[str]|np.ndarray): the locators
+    @return (tuple[np.ndarray, np.ndarray]): the latitudes and longitudes in degrees of the square centers
+    '''
+    _require_numpy()
+    codes = np.atleast_1d(np.asarray(locators, dtype=str))
+    if len(codes) == 0:
+        return np.empty(0), np.empty(0)
+    if codes.dtype.itemsize == 0:
+        codes = codes.astype('U1')
+    # one row of unicode code points per locator, zero padded past the end. Working on the code points directly is
+    # several times faster than the np.char string functions
+    chars = codes.view(np.uint32).reshape(len(codes), -1)
+    if np.isin(chars, [ord(c) for c in ' \t\r\n']).any():
+        codes = np.char.strip(codes)
+        chars = codes.view(np.uint32).reshape(len(codes), -1)
+    lengths = np.char.str_len(codes)
+    if chars.shape[1] < MAX_LOCATOR_LENGTH:
+        chars = np.pad(chars, ((0, 0), (0, MAX_LOCATOR_LENGTH - chars.shape[1])))
+    chars = chars[:, :MAX_LOCATOR_LENGTH].astype(np.int64)
+    # upper case
+    chars -= ((chars >= ord('a')) & (chars <= ord('z'))) * (ord('a') - ord('A'))
+    valid = (lengths % 2 == 0) & (lengths >= 2) & (lengths <= MAX_LOCATOR_LENGTH)
+    lat = np.full(len(codes), -90.0)
+    lon = np.full(len(codes), -180.0)
+    for i, (first, count, lon_size, lat_size) in enumerate(LOCATOR_PAIRS):
+        present = lengths > 2 * i
+        lon_value = chars[:, 2 * i] - ord(first)
+        lat_value = chars[:, 2 * i + 1] - ord(first)
+        in_range = (lon_value >= 0) & (lon_value < count) & (lat_value >= 0) & (lat_value < count)
+        valid &= ~present | in_range
+        last = lengths == 2 * i + 2
+        lon += np.where(present, lon_value * lon_size, 0.0) + np.where(last, lon_size / 2, 0.0)
+        lat += np.where(present, lat_value * lat_size, 0.0) + np.where(last, lat_size / 2, 0.0)
+    lat[~valid] = np.nan
+    lon[~valid] = np.nan
+    return lat, lon
+
+def distances_bearings(lat1, lon1, lat2, lon2) -> tuple:
+    '''Works out great circle distances and initial bearings for whole arrays of points at once. Either end may be a
+    single point, which is broadcast against the other
+
+    @param lat1(float|np.ndarray): the latitudes of the starts in degrees
+    @param lon1(float|np.ndarray): the longitudes of the starts in degrees
+    @param lat2(float|np.ndarray): the latitudes of the ends in degrees
+    @param lon2(float|np.ndarray): the longitudes of the ends in degrees
+    @return (tuple[np.ndarray, np.ndarray]): the distances in km and the bearings in degrees (NaN where an input is NaN)
+    '''
+    _require_numpy()
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi, dlambda = phi2 - phi1, np.radians(np.subtract(lon2, lon1))
+    cos_phi1, cos_phi2 = np.cos(phi1), np.cos(phi2)
+    a = np.sin(dphi / 2) ** 2 + cos_phi1 * cos_phi2 * np.sin(dlambda / 2) ** 2
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    y = np.sin(dlambda) * cos_phi2
+    x = cos_phi1 * np.sin(phi2) - np.sin(phi1) * cos_phi2 * np.cos(dlambda)
+    return distances, np.degrees(np.arctan2(y, x)) % 360.0
+
+class StationPath(NamedTuple):
+    '''The path from the home station to another station'''
+    locator: str
+    lat: float
+    lon: float
+    distance_km: float
+    bearing: float
+
+    @property
+    def distance_miles(self) -> float:
+        return self.distance_km / KM_PER_MILE
+
+    @property
+    def az(self) -> str:
+        '''The bearing formatted like Fldigi's AZ log field'''
+        return f'{round(self.bearing) % 360}'
+
+class GridMap:
+    '''Works out distances and bearings from the home station locally, one station at a time or for whole arrays of
+    locators at once, instead of a log.get_az round trip per station. The home latitude and longitude are worked
+    out once, and the vectorized methods need numpy (pip install pyfldm[grid]).
+
+    @param home_locator(str): the home station locator, e.g. 'FN31pr'
+
+    Example use:
+    >>> from pyfldm.client import Client
+    >>> from pyfldm.maidenhead import GridMap
+    >>> client = Client()
+    >>> grid = GridMap.from_config()         # the locator set in Fldigi's operator settings
+    >>> grid.path('JO62qm')
+    StationPath(locator='JO62QM', lat=52.52083, lon=13.375, distance_km=6226.6, bearing=47.1)
+    >>> grid.fill_az(client)                 # the AZ of the station in Fldigi's log fields
+    '47'
+    >>> distances, bearings = grid.distances(['JO62qm', 'PM95', 'QF56od'])
+    >>> calls, distances, bearings = grid.logbook('/home/me/.fldigi/logs/logbook.adi')
+    >>> distances.max()
+    17702.6
+    '''
+    def __init__(self, home_locator: str) -> None:
+        self.home_locator = home_locator.strip().upper()
+        self.home_lat, self.home_lon = locator_to_latlon(self.home_locator)
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def __repr__(self) -> str:
+        return f'GridMap({self.home_locator!r})'
+
+    @classmethod
+    def from_config(cls, config: FlConfigManager = None) -> 'GridMap':
+        '''Creates a grid map for the home locator set in Fldigi's operator settings (MYLOCATOR)
+
+        @param config(FlConfigManager): [OPTIONAL] the config manager to read the locator from, the default Fldigi config if not given
+        @return (GridMap): the grid map
+        @raises ValueError: if no valid locator is configured
+        '''
+        config = config if config is not None else FlConfigManager()
+        return cls(config.get_config('MYLOCATOR') or '')
+
+    def path(self, locator: str) -> StationPath:
+        '''Works out the path to one station
+
+        @param locator(str): the station's locator
+        @return (StationPath): the station position, distance and bearing
+        @raises ValueError: if the locator is not valid
+        '''
+        lat, lon = locator_to_latlon(locator)
+        distance, bearing = distance_bearing(self.home_lat, self.home_lon, lat, lon)
+        return StationPath(locator.strip().upper(), lat, lon, distance, bearing)
+
+    def az(self, locator: str) -> str:
+        '''Gets the bearing to a station formatted like Fldigi's AZ log field
+
+        @param locator(str): the station's locator
+        @return (str): the bearing in whole degrees, '' if the locator is not valid
+        '''
+        try:
+            return self.path(locator).az
+        except ValueError:
+            return ''
+
+    def fill_az(self, client: Client) -> str:
+        '''Gets the AZ value for the locator currently in Fldigi's log fields, without asking Fldigi for it
+
+        @param client(Client): the pyfldm client connected to Fldigi
+        @return (str): the bearing in whole degrees, '' if the locator field is empty or not valid
+        '''
+        return self.az(client.log.get_locator())
+
+    def distances(self, locators) -> tuple:
+        '''Works out the distances and bearings to many stations at once
+
+        @param locators(list[str]|np.ndarray): the station locators
+        @return (tuple[np.ndarray, np.ndarray]): the distances in km and the bearings in degrees, NaN for invalid locators
+        '''
+        lat, lon = locators_to_latlon(locators)
+        return distances_bearings(self.home_lat, self.home_lon, lat, lon)
+
+    def logbook(self, adif_path: str, start: int = 0) -> tuple:
+        '''Works out the distance and bearing of every QSO in an ADIF logbook from its GRIDSQUARE field
+
+        @param adif_path(str): the ADIF logbook
+        @param start(int): [OPTIONAL] the byte offset to start reading from
+        @return (tuple[list[str], np.ndarray, np.ndarray]): the calls, the distances in km and the bearings in degrees, NaN where the QSO has no valid locator
+        '''
+        _require_numpy()
+        calls, locators = [], []
+        for record in iter_adif(adif_path, start):
+            calls.append(record.fields.get('CALL', ''))
+            locators.append(record.fields.get('GRIDSQUARE', ''))
+        if not locators:
+            return calls, np.empty(0), np.empty(0)
+        distances, bearings = self.distances(locators)
+        return calls, distances, bearings
@@ -0,0 +1,151 @@
+############################################################################
+#
+#  File: meterfeed.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import logging
+import threading
+from time import monotonic
+from xmlrpc.client import Error, Fault
+from .client import Client
+
+METER_SETTERS = {
+    'smeter': 'rig.set_smeter',
+    'pwrmeter': 'rig.set_pwrmeter',
+}
+DEFAULT_MAX_RATE_HZ = 10.0
+ERROR_BACKOFF_SECS = 1
+
+class MeterFeed(threading.Thread):
+    '''Feeds S-meter and power meter readings into Fldigi without ever falling behind. Updates only replace the
+    pending value ("latest wins"), and a daemon thread sends whatever is pending at most max_rate_hz times a second,
+    both meters in one batch. It uses its own xmlrpc connection, so meter traffic never queues in front of control
+    commands on the main client, and a slow Fldigi simply means fewer, fresher updates.
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param max_rate_hz(float): the max number of updates sent per second
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.meterfeed import MeterFeed
+    >>> feed = MeterFeed(max_rate_hz=10)
+    >>> feed.start()
+    >>> for reading in sensor:   # e.g. 50 readings a second
+    ...     feed.update_smeter(reading.signal)
+    ...     feed.update_pwrmeter(reading.power)
+    >>> feed.updates_received, feed.updates_sent, feed.updates_coalesced
+    (1000, 200, 800)
+    >>> feed.stop()
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 max_rate_hz: float = DEFAULT_MAX_RATE_HZ) -> None:
+        super().__init__(daemon=True)
+        if max_rate_hz <= 0:
+            raise ValueError("max_rate_hz must be positive")
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._min_interval = 1.0 / max_rate_hz
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self.updates_received = 0
+        self.updates_sent = 0
+        self.updates_coalesced = 0
+        self.last_values = {}
+        self.last_sent_at = None
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def _update(self, meter: str, value: int) -> None:
+        with self._lock:
+            if meter in self._pending:
+                self.updates_coalesced += 1
+            self._pending[meter] = int(value)
+            self.updates_received += 1
+        self._wake.set()
+
+    def update_smeter(self, value: int) -> None:
+        '''Sets the next S-meter value to send, replacing any value not yet sent. Never blocks
+
+        @param value(int): the S-meter value
+        '''
+        self._update('smeter', value)
+
+    def update_pwrmeter(self, value: int) -> None:
+        '''Sets the next power meter value to send, replacing any value not yet sent. Never blocks
+
+        @param value(int): the power meter value
+        '''
+        self._update('pwrmeter', value)
+
+    def _send_pending(self) -> None:
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if not pending:
+            return
+        calls = [(METER_SETTERS[meter], (value,)) for meter, value in pending.items()]
+        try:
+            results = self._client.batch(calls, raise_faults=False)
+        except (OSError, Error):
+            # keep the failed values for the retry unless newer ones have arrived
+            with self._lock:
+                for meter, value in pending.items():
+                    self._pending.setdefault(meter, value)
+            self._wake.set()
+            raise
+        self.last_sent_at = monotonic()
+        for (meter, value), result in zip(pending.items(), results):
+            if isinstance(result, Fault):
+                self.logger.debug(f"Setting the {meter} failed: {result.faultString}")
+                continue
+            self.last_values[meter] = value
+            self.updates_sent += 1
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops the feed after sending the latest pending values
+
+        @param timeout_secs(float): the max time in seconds to wait for the feed to stop
+        '''
+        self._stop_event.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(timeout_secs)
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Sends the latest values, rate limited, until stopped'''
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self.last_sent_at is not None and not self._stop_event.is_set():
+                # rate limit: updates arriving in the meantime just replace the pending values
+                self._stop_event.wait(self._min_interval - (monotonic() - self.last_sent_at))
+            try:
+                self._send_pending()
+            except (OSError, Error):
+                self.logger.warning("Meter update failed, retrying with the latest value", exc_info=True)
+                self._stop_event.wait(ERROR_BACKOFF_SECS)
+            if self._stop_event.is_set():
+                return
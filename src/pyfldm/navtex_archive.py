@@ -0,0 +1,246 @@
+############################################################################
+#
+#  File: navtex_archive.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import queue
+import sqlite3
+import logging
+import threading
+from time import monotonic
+from .navtex_receiver import NavtexMessage, NavtexReceiver
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_SECS = 5
+DEFAULT_QUERY_LIMIT = 1000
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        message_id TEXT,
+        station TEXT,
+        subject TEXT,
+        serial INTEGER,
+        received REAL NOT NULL,
+        body TEXT,
+        raw TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_messages_station ON messages (station, subject, received)',
+    'CREATE INDEX IF NOT EXISTS idx_messages_subject ON messages (subject, received)',
+    'CREATE INDEX IF NOT EXISTS idx_messages_received ON messages (received)',
+]
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(body, content='messages', content_rowid='id')",
+    '''CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, body) VALUES (new.id, new.body);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END''',
+]
+COLUMNS = 'message_id, station, subject, serial, body, received, raw'
+
+class NavtexArchive:
+    '''A persistent, indexed store of NAVTEX messages backed by SQLite. Messages are indexed by station,
+    subject indicator and time, and the bodies are full-text indexed (with FTS5 when the local SQLite
+    supports it). Inserts are buffered and written in batches, one transaction per batch.
+
+    @param db_path(str): the path to the archive database file, created if it does not exist
+    @param batch_size(int): how many messages to buffer before writing them to the database
+
+    Example use:
+    >>> from time import time
+    >>> from pyfldm.navtex_archive import NavtexArchive
+    >>> from pyfldm.navtex_receiver import NavtexReceiver
+    >>> archive = NavtexArchive('/home/me/navtex.db')
+    >>> receiver = NavtexReceiver()
+    >>> archive.record_from(receiver)
+    >>> receiver.start()
+    >>> # all gale warnings from station E in the last week
+    >>> archive.query(station='E', subject='B', since=time() - 7 * 24 * 3600, text='gale')
+    [NavtexMessage(message_id='EB12', station='E', subject='B', serial=12, ...)]
+    '''
+    def __init__(self, db_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self._batch_size = int(batch_size)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._recorder = None
+        self._recorder_stop = threading.Event()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+        self.full_text = self._setup_full_text()
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def _setup_full_text(self) -> bool:
+        try:
+            with self._connection:
+                for statement in FTS_SCHEMA:
+                    self._connection.execute(statement)
+            return True
+        except sqlite3.OperationalError:
+            self.logger.warning("SQLite FTS5 not available, falling back to LIKE searches of message bodies")
+            return False
+
+    def add(self, message: NavtexMessage) -> None:
+        '''Adds a message to the archive. The message is written once a full batch is buffered, or on flush()
+
+        @param message(NavtexMessage): the message to add
+        '''
+        with self._lock:
+            self._pending.append(tuple(message))
+            if len(self._pending) >= self._batch_size:
+                self._flush_locked()
+
+    def add_many(self, messages) -> None:
+        '''Adds many messages to the archive in a single transaction
+
+        @param messages(iterable[NavtexMessage]): the messages to add
+        '''
+        with self._lock:
+            self._pending.extend(tuple(message) for message in messages)
+            self._flush_locked()
+
+    def flush(self) -> None:
+        '''Writes any buffered messages to the database'''
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(f'INSERT INTO messages ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)', self._pending)
+        self.logger.debug(f"Archived {len(self._pending)} NAVTEX messages")
+        self._pending = []
+
+    def _where(self, station, subject, since, until, text) -> tuple:
+        clauses = []
+        params = []
+        joins = ''
+        if station is not None:
+            clauses.append('m.station = ?')
+            params.append(station)
+        if subject is not None:
+            clauses.append('m.subject = ?')
+            params.append(subject)
+        if since is not None:
+            clauses.append('m.received >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('m.received <= ?')
+            params.append(until)
+        if text:
+            if self.full_text:
+                joins = ' JOIN messages_fts ON messages_fts.rowid = m.id'
+                clauses.append('messages_fts MATCH ?')
+                params.append(text)
+            else:
+                clauses.append('m.body LIKE ?')
+                params.append(f'%{text}%')
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return joins + where, params
+
+    def query(self,
+              station: str = None,
+              subject: str = None,
+              since: float = None,
+              until: float = None,
+              text: str = None,
+              limit: int = DEFAULT_QUERY_LIMIT) -> list:
+        '''Finds archived messages, newest first. Buffered messages are flushed first so they are included
+
+        @param station(str): [OPTIONAL] the station id (B1) to match
+        @param subject(str): [OPTIONAL] the subject indicator (B2) to match, e.g. 'B' for meteorological warnings
+        @param since(float): [OPTIONAL] the earliest receive time to include, as a unix timestamp
+        @param until(float): [OPTIONAL] the latest receive time to include, as a unix timestamp
+        @param text(str): [OPTIONAL] a full-text query on the message body (FTS5 query syntax when available)
+        @param limit(int): the max number of messages to return, None for no limit
+        @return (list[NavtexMessage]): the matching messages
+        '''
+        conditions, params = self._where(station, subject, since, until, text)
+        columns = ', '.join(f'm.{column.strip()}' for column in COLUMNS.split(','))
+        sql = f'SELECT {columns} FROM messages m{conditions} ORDER BY m.received DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        with self._lock:
+            self._flush_locked()
+            rows = self._connection.execute(sql, params).fetchall()
+        return [NavtexMessage(*row) for row in rows]
+
+    def count(self,
+              station: str = None,
+              subject: str = None,
+              since: float = None,
+              until: float = None,
+              text: str = None) -> int:
+        '''Counts archived messages, with the same filters as query()
+
+        @return (int): the number of matching messages
+        '''
+        conditions, params = self._where(station, subject, since, until, text)
+        with self._lock:
+            self._flush_locked()
+            return self._connection.execute(f'SELECT COUNT(*) FROM messages m{conditions}', params).fetchone()[0]
+
+    def record_from(self, receiver: NavtexReceiver, flush_interval_secs: float = DEFAULT_FLUSH_INTERVAL_SECS) -> None:
+        '''Archives every message from a NavtexReceiver, using a daemon thread that flushes at least every
+        flush_interval_secs
+
+        @param receiver(NavtexReceiver): the receiver to subscribe to
+        @param flush_interval_secs(float): the max time in seconds a message is buffered before being written
+        '''
+        if self._recorder is not None:
+            raise RuntimeError("NavtexArchive is already recording from a receiver")
+        subscriber = receiver.subscribe(0)
+
+        def record():
+            last_flush = monotonic()
+            while not self._recorder_stop.is_set():
+                # wake up in time for the next flush, even while messages keep arriving
+                wait_secs = max(0, flush_interval_secs - (monotonic() - last_flush))
+                try:
+                    self.add(subscriber.get(timeout=wait_secs))
+                except queue.Empty:
+                    pass
+                if monotonic() - last_flush >= flush_interval_secs:
+                    self.flush()
+                    last_flush = monotonic()
+            receiver.unsubscribe(subscriber)
+
+        self._recorder = threading.Thread(target=record, daemon=True)
+        self._recorder.start()
+
+    def close(self) -> None:
+        '''Stops recording, flushes any buffered messages and closes the database'''
+        if self._recorder is not None:
+            self._recorder_stop.set()
+            self._recorder.join()
+            self._recorder = None
+        self.flush()
+        self._connection.close()
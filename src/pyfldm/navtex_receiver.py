@@ -0,0 +1,193 @@
+############################################################################
+#
+#  File: navtex_receiver.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import re
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from time import time
+from typing import NamedTuple
+from xmlrpc.client import Error
+from .client import Client
+
+DEFAULT_POLL_DELAY_SECS = 10
+DEFAULT_DEDUP_SIZE = 1024
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 1000
+ERROR_BACKOFF_SECS = 2
+# serial number 00 is reserved for messages that must always be printed, so they are never deduplicated
+ALWAYS_PRINT_SERIAL = 0
+
+NAVTEX_PATTERN = re.compile(r'ZCZC\s*([A-Z])([A-Z])(\d{2})\s*(.*?)\s*(?:NNNN|$)', re.DOTALL)
+
+class NavtexMessage(NamedTuple):
+    '''A NAVTEX message parsed from its ZCZC B1B2B3B4 ... NNNN framing. The header fields are None if the
+    framing could not be found in the raw message'''
+    message_id: str
+    station: str
+    subject: str
+    serial: int
+    body: str
+    received: float
+    raw: str
+
+def parse_navtex_message(raw: str, received: float = None) -> NavtexMessage:
+    '''Parses a raw message as returned by navtex.get_message()
+
+    @param raw(str): the raw message text
+    @param received(float): [OPTIONAL] the time the message was received, defaults to now
+    @return (NavtexMessage): the parsed message
+    '''
+    received = time() if received is None else received
+    match = NAVTEX_PATTERN.search(raw)
+    if not match:
+        return NavtexMessage(None, None, None, None, raw.strip(), received, raw)
+    station, subject, serial, body = match.groups()
+    return NavtexMessage(f'{station}{subject}{serial}', station, subject, int(serial), body, received, raw)
+
+class NavtexReceiver(threading.Thread):
+    '''Background NAVTEX receiver. Keeps exactly one navtex.get_message() long-poll outstanding on its own
+    xmlrpc connection (so it never blocks control calls made through other clients), parses each message
+    into a NavtexMessage, drops retransmissions already seen and publishes the rest to subscriber queues.
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param poll_delay_secs(int): the max delay passed to each navtex.get_message() long-poll
+    @param dedup_size(int): how many recent message ids to remember for deduplication
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.navtex_receiver import NavtexReceiver
+    >>> receiver = NavtexReceiver()
+    >>> messages = receiver.subscribe()
+    >>> receiver.start()
+    >>> message = messages.get()
+    >>> message.station, message.subject, message.serial
+    ('E', 'B', 12)
+    >>> receiver.stop()
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 poll_delay_secs: int = DEFAULT_POLL_DELAY_SECS,
+                 dedup_size: int = DEFAULT_DEDUP_SIZE) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._poll_delay = int(poll_delay_secs)
+        self._dedup_size = int(dedup_size)
+        self._seen = OrderedDict()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.received_count = 0
+        self.duplicate_count = 0
+        self.dropped_count = 0
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def subscribe(self, maxsize: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE) -> queue.Queue:
+        '''Creates a queue that receives every new message. If a subscriber falls behind and its queue is full,
+        the oldest message in its queue is dropped to make room
+
+        @param maxsize(int): the max number of messages held for this subscriber, 0 for no limit
+        @return (queue.Queue): the queue messages will be put on
+        '''
+        subscriber = queue.Queue(maxsize)
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        '''Stops delivering messages to a queue created by subscribe()
+
+        @param subscriber(queue.Queue): the subscriber queue
+        '''
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops the receiver. The outstanding long-poll is allowed to finish, so this can take up to
+        poll_delay_secs
+
+        @param timeout_secs(float): the max time in seconds to wait for the receiver to stop
+        '''
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout_secs)
+
+    def _is_duplicate(self, message: NavtexMessage) -> bool:
+        '''Checks a message against the recently seen message ids, remembering it if new'''
+        if message.message_id is None or message.serial == ALWAYS_PRINT_SERIAL:
+            return False
+        if message.message_id in self._seen:
+            self._seen.move_to_end(message.message_id)
+            return True
+        self._seen[message.message_id] = message.received
+        if len(self._seen) > self._dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def _publish(self, message: NavtexMessage) -> None:
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                        self.dropped_count += 1
+                    except queue.Empty:
+                        pass
+
+    def handle_raw(self, raw: str) -> NavtexMessage:
+        '''Parses, deduplicates and publishes a raw message. Used by the receiver thread, but can also be
+        called directly to feed in messages from another source
+
+        @param raw(str): the raw message text
+        @return (NavtexMessage): the parsed message, None if it was a duplicate
+        '''
+        message = parse_navtex_message(raw)
+        if self._is_duplicate(message):
+            self.duplicate_count += 1
+            self.logger.debug(f"Dropping duplicate NAVTEX message {message.message_id}")
+            return None
+        self.received_count += 1
+        self._publish(message)
+        return message
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Long-polls for messages until stopped'''
+        while not self._stop_event.is_set():
+            try:
+                raw = self._client.navtex.get_message(self._poll_delay)
+            except (OSError, Error):
+                self.logger.warning("NAVTEX long-poll failed, retrying", exc_info=True)
+                self._stop_event.wait(ERROR_BACKOFF_SECS)
+                continue
+            if raw:
+                self.handle_raw(raw)
@@ -0,0 +1,312 @@
+############################################################################
+#
+#  File: profiles.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import json
+import logging
+from time import perf_counter, monotonic, sleep
+from typing import NamedTuple
+from xmlrpc.client import Error, Fault
+from .client import Client
+
+# profile setting: (xmlrpc setter, conversion applied to the value), in the order they are applied.
+# The names match the snapshot fields used to read the current value. The modem goes first because
+# changing it resets the modem bandwidth and carrier
+PROFILE_SETTINGS = {
+    'modem': ('modem.set_by_name', str),
+    'bandwidth': ('modem.set_bandwidth', int),
+    'carrier': ('modem.set_carrier', int),
+    'afc': ('main.set_afc', bool),
+    'squelch': ('main.set_squelch', bool),
+    'squelch_level': ('main.set_squelch_level', float),
+    'rsid': ('main.set_rsid', bool),
+    'txid': ('main.set_txid', bool),
+    'reverse': ('main.set_reverse', bool),
+    'lock': ('main.set_lock', bool),
+    'rig_mode': ('rig.set_mode', str),
+    'rig_bandwidth': ('rig.set_bandwidth', str),
+    'frequency': ('main.set_frequency', float),
+}
+# settings that are always sent when the modem changes, since the new modem brings its own values
+MODEM_DEPENDENT_SETTINGS = ['bandwidth', 'carrier']
+# how far a float setting read back after applying may be from the profile value, e.g. a rig rounding the frequency
+READBACK_TOLERANCE = .5
+# Fldigi applies settings asynchronously, so a readback that does not match yet is retried this often until the
+# settle timeout has passed, and only then treated as a setting that did not take
+SETTLE_TIMEOUT_SECS = 2
+SETTLE_POLL_SECS = .05
+
+class Profile:
+    '''A named operating setup. Only the settings given are applied, anything else is left as it is
+
+    @param name(str): the profile name
+    @param settings(dict): the setting values, see PROFILE_SETTINGS for the available settings
+    @param description(str): [OPTIONAL] a note about what the profile is for
+    '''
+    __slots__ = ('name', 'settings', 'description')
+
+    def __init__(self, name: str, settings: dict, description: str = '') -> None:
+        unknown = [setting for setting in settings if setting not in PROFILE_SETTINGS]
+        if unknown:
+            raise ValueError(f"Unknown profile setting(s): {', '.join(unknown)}. Available settings: {', '.join(PROFILE_SETTINGS)}")
+        self.name = name
+        # keep the settings in apply order, whatever order they were given in
+        self.settings = {setting: PROFILE_SETTINGS[setting][1](settings[setting])
+                         for setting in PROFILE_SETTINGS if setting in settings}
+        self.description = description
+
+    def __repr__(self) -> str:
+        return f'Profile({self.name!r}, {self.settings!r})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Profile):
+            return NotImplemented
+        return (self.name, self.settings, self.description) == (other.name, other.settings, other.description)
+
+    def as_dict(self) -> dict:
+        '''Gets the profile as a JSON serializable dict
+
+        @return (dict): the name, description and settings
+        '''
+        return {'name': self.name, 'description': self.description, 'settings': dict(self.settings)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Profile':
+        '''Creates a profile from a dict made by as_dict()
+
+        @param data(dict): the profile data
+        @return (Profile): the profile
+        '''
+        return cls(data['name'], data.get('settings', {}), data.get('description', ''))
+
+class ApplyResult(NamedTuple):
+    '''The outcome of ProfileManager.apply()'''
+    profile: str
+    changes: dict
+    unchanged: list
+    elapsed_secs: float
+
+class ProfileManager:
+    '''Keeps a registry of named profiles and applies them to Fldigi with as few round trips as possible. The
+    current values are read in a single snapshot batch and only the settings that differ are sent. A modem change
+    is sent on its own first and confirmed with modem.get_name(), since the modem resets its bandwidth and carrier,
+    then the other settings are sent together in one batch and read back in another. Fldigi applies settings
+    asynchronously, so readbacks that do not match yet are retried until settle_timeout_secs has passed. If any
+    setter fails or a value does not read back as set, the settings that were changed are put back, so the radio
+    is left either fully configured or as it was.
+
+    @param client(Client): [OPTIONAL] the pyfldm client to use, a new one on the default port if not given
+    @param profiles(list[Profile]): [OPTIONAL] profiles to register
+    @param settle_timeout_secs(float): [OPTIONAL] the max time in seconds to wait for the settings to read back as set
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.profiles import ProfileManager, Profile
+    >>> profiles = ProfileManager()
+    >>> profiles.add(Profile('psk-20m', {'modem': 'BPSK31', 'carrier': 1500, 'afc': True, 'frequency': 14070000}))
+    >>> profiles.add(Profile('rtty-contest', {'modem': 'RTTY', 'carrier': 2125, 'squelch_level': 20, 'txid': False}))
+    >>> profiles.apply('psk-20m')
+    ApplyResult(profile='psk-20m', changes={'modem': ('RTTY', 'BPSK31'), 'carrier': (2125, 1500)}, unchanged=['afc', 'frequency'], elapsed_secs=0.004)
+    >>> profiles.save('/home/me/fldigi-profiles.json')
+    '''
+    def __init__(self, client: Client = None, profiles: list = None, settle_timeout_secs: float = SETTLE_TIMEOUT_SECS) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._client = client if client is not None else Client()
+        self.settle_timeout_secs = settle_timeout_secs
+        self._profiles = {}
+        for profile in profiles or []:
+            self.add(profile)
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._profiles
+
+    @property
+    def names(self) -> list:
+        '''The names of the registered profiles'''
+        return list(self._profiles)
+
+    def add(self, profile: Profile) -> None:
+        '''Registers a profile, replacing any profile with the same name
+
+        @param profile(Profile): the profile to register
+        '''
+        self._profiles[profile.name] = profile
+
+    def remove(self, name: str) -> None:
+        '''Removes a profile from the registry
+
+        @param name(str): the profile name
+        '''
+        self._profiles.pop(name, None)
+
+    def get(self, name: str) -> Profile:
+        '''Gets a registered profile
+
+        @param name(str): the profile name
+        @return (Profile): the profile
+        @raises ValueError: if there is no profile with that name
+        '''
+        try:
+            return self._profiles[name]
+        except KeyError:
+            raise ValueError(f"Unknown profile {name!r}. Available profiles: {', '.join(self._profiles)}") from None
+
+    def save(self, file_path: str) -> None:
+        '''Writes every registered profile to a JSON file
+
+        @param file_path(str): the path of the file to write
+        '''
+        with open(file_path, 'w') as f:
+            json.dump([profile.as_dict() for profile in self._profiles.values()], f, indent=2)
+
+    def load(self, file_path: str) -> list:
+        '''Registers the profiles in a JSON file written by save(), replacing any with the same names
+
+        @param file_path(str): the path of the file to read
+        @return (list[str]): the names of the loaded profiles
+        '''
+        with open(file_path) as f:
+            profiles = [Profile.from_dict(data) for data in json.load(f)]
+        for profile in profiles:
+            self.add(profile)
+        return [profile.name for profile in profiles]
+
+    def diff(self, profile) -> dict:
+        '''Works out which settings of a profile differ from Fldigi's current state, reading them in one batch
+
+        @param profile(str|Profile): the profile or the name of a registered profile
+        @return (dict): {setting: (current value, profile value)} for every setting that needs to be sent
+        '''
+        profile = self.get(profile) if isinstance(profile, str) else profile
+        settings = dict(profile.settings)
+        if 'modem' in settings:
+            # resolves the spelling locally, so a typo fails here rather than part way through the batch
+            settings['modem'] = self._client.modem.get_catalogue().resolve_name(settings['modem'])
+        current = self._client.snapshot(list(settings)).as_dict()
+        changes = {}
+        modem_changes = 'modem' in settings and current['modem'] != settings['modem']
+        for setting, value in settings.items():
+            if current[setting] != value or (modem_changes and setting in MODEM_DEPENDENT_SETTINGS):
+                changes[setting] = (current[setting], value)
+        return changes
+
+    def _send(self, settings: dict) -> list:
+        calls = [(PROFILE_SETTINGS[setting][0], (value,)) for setting, value in settings.items()]
+        return self._client.batch(calls, raise_faults=False)
+
+    def _rollback(self, changes: dict, sent: list) -> None:
+        '''Puts back the old value of every change that was sent, in apply order so the modem is restored first'''
+        restore = {setting: changes[setting][0] for setting in changes if setting in sent and changes[setting][0] is not None}
+        if not restore:
+            return
+        failed = [setting for setting, result in zip(restore, self._send(restore)) if isinstance(result, Fault)]
+        if failed:
+            self.logger.error(f"Could not roll back profile setting(s): {', '.join(failed)}")
+
+    def _mismatched(self, changes: dict) -> dict:
+        '''Reads back the changed settings in one batch, returning {setting: value read} for those that do not match'''
+        current = self._client.snapshot(list(changes)).as_dict()
+        mismatched = {}
+        for setting, (_, value) in changes.items():
+            read = current[setting]
+            if isinstance(value, float) and read is not None:
+                if abs(read - value) > READBACK_TOLERANCE:
+                    mismatched[setting] = read
+            elif read != value:
+                mismatched[setting] = read
+        return mismatched
+
+    def _verify(self, changes: dict) -> dict:
+        '''Reads back the changed settings until they all match or the settle timeout passes, rereading only the
+        ones that did not match yet. Returns {setting: value read} for those that did not take'''
+        deadline = monotonic() + self.settle_timeout_secs
+        while True:
+            mismatched = self._mismatched(changes)
+            if not mismatched or monotonic() >= deadline:
+                return mismatched
+            changes = {setting: changes[setting] for setting in mismatched}
+            sleep(SETTLE_POLL_SECS)
+
+    def _wait_for_modem(self, modem: str) -> str:
+        '''Reads the modem name until it is the one sent or the settle timeout passes, returning the last name read'''
+        deadline = monotonic() + self.settle_timeout_secs
+        while True:
+            current = self._client.modem.get_name()
+            if current == modem or monotonic() >= deadline:
+                return current
+            sleep(SETTLE_POLL_SECS)
+
+    def _apply_changes(self, name: str, changes: dict, sent: list) -> None:
+        '''Sends the changes, the modem first on its own, adding each setting to sent once it was sent'''
+        if 'modem' in changes:
+            modem = changes['modem'][1]
+            sent.append('modem')
+            result = self._send({'modem': modem})[0]
+            if isinstance(result, Fault):
+                raise RuntimeError(f"Could not apply profile {name!r}, rolled back. Failed setting(s): modem ({result.faultString})")
+            current = self._wait_for_modem(modem)
+            if current != modem:
+                raise RuntimeError(f"Could not apply profile {name!r}, rolled back. The modem is {current!r}, not {modem!r}")
+        rest = {setting: new for setting, (_, new) in changes.items() if setting != 'modem'}
+        if rest:
+            sent.extend(rest)
+            results = self._send(rest)
+            failed = {setting: result for setting, result in zip(rest, results) if isinstance(result, Fault)}
+            if failed:
+                for setting in failed:
+                    sent.remove(setting)
+                details = ', '.join(f'{setting} ({fault.faultString})' for setting, fault in failed.items())
+                raise RuntimeError(f"Could not apply profile {name!r}, rolled back. Failed setting(s): {details}")
+        mismatched = self._verify(changes)
+        if mismatched:
+            details = ', '.join(f'{setting} (read back {value!r})' for setting, value in mismatched.items())
+            raise RuntimeError(f"Could not apply profile {name!r}, rolled back. Setting(s) that did not take: {details}")
+
+    def apply(self, profile) -> ApplyResult:
+        '''Applies a profile, sending only the settings that differ from Fldigi's current state, and checks that
+        they took by reading them back
+
+        @param profile(str|Profile): the profile or the name of a registered profile
+        @return (ApplyResult): the settings changed as {setting: (old, new)}, the settings already correct and the time taken
+        @raises RuntimeError: if a setting could not be applied or did not read back as set, after the changed settings have been rolled back
+        '''
+        profile = self.get(profile) if isinstance(profile, str) else profile
+        start = perf_counter()
+        changes = self.diff(profile)
+        unchanged = [setting for setting in profile.settings if setting not in changes]
+        if changes:
+            sent = []
+            try:
+                self._apply_changes(profile.name, changes, sent)
+            except (OSError, Error):
+                # a batch may have been partly applied before the connection failed
+                self.logger.error(f"Applying profile {profile.name!r} failed, rolling back", exc_info=True)
+                self._rollback(changes, sent)
+                raise
+            except RuntimeError:
+                self._rollback(changes, sent)
+                raise
+        elapsed = perf_counter() - start
+        self.logger.info(f"Applied profile {profile.name!r}: {len(changes)} change(s) in {elapsed * 1000:.1f} ms")
+        return ApplyResult(profile.name, changes, unchanged, elapsed)
@@ -0,0 +1,181 @@
+############################################################################
+#
+#  File: rxdecoder.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import codecs
+import logging
+from xmlrpc.client import Binary
+
+DEFAULT_CAPACITY = 64 * 1024
+CONTROL_POLICIES = ['keep', 'strip', 'escape']
+# tab and newline are always kept as they are part of normal text
+KEPT_CONTROL_CHARS = [0x09, 0x0A]
+CONTROL_CHARS = [c for c in range(0x20) if c not in KEPT_CONTROL_CHARS] + [0x7F]
+
+class StreamDecoder:
+    '''Incrementally decodes the chunks returned by text.get_rx_data(), text.get_tx_data(), text.get_rxtx_data()
+    and text.get_rx(). Multi-byte characters and CR/LF pairs that are split across chunks are held back until
+    the rest arrives, so nothing is corrupted at chunk boundaries. Decoded text is accumulated (as UTF-8) into a
+    preallocated buffer that grows geometrically, and can be read without copying through view().
+
+    @param encoding(str): the codec Fldigi's data is encoded with
+    @param errors(str): the codec error handling, as in bytes.decode()
+    @param control(str): what to do with control characters, one of 'keep', 'strip' or 'escape' (as <0xNN>)
+    @param normalize_newlines(bool): True to convert CR/LF and lone CR line endings into LF
+    @param capacity(int): the initial size of the accumulation buffer in bytes
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.client import Client
+    >>> from pyfldm.rxdecoder import StreamDecoder
+    >>> client = Client()
+    >>> decoder = StreamDecoder()
+    >>> decoder.feed(client.text.get_rx_data())
+    'CQ CQ de N0CA'
+    >>> decoder.feed(client.text.get_rx_data())
+    'LL k\\n'
+    >>> decoder.text()
+    'CQ CQ de N0CALL k\\n'
+    '''
+    def __init__(self,
+                 encoding: str = 'utf-8',
+                 errors: str = 'replace',
+                 control: str = 'keep',
+                 normalize_newlines: bool = True,
+                 capacity: int = DEFAULT_CAPACITY) -> None:
+        if control not in CONTROL_POLICIES:
+            raise ValueError(f"control must be one of: {', '.join(CONTROL_POLICIES)}")
+        self.logger = logging.getLogger(__name__)
+        self.encoding = encoding
+        self.errors = errors
+        self.control = control
+        self.normalize_newlines = normalize_newlines
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors)
+        self._table = self._control_table(control)
+        self._pending_cr = False
+        self._buffer = bytearray(max(1, int(capacity)))
+        self._length = 0
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def __len__(self) -> int:
+        return self._length
+
+    @staticmethod
+    def _control_table(control: str) -> dict:
+        if control == 'strip':
+            return {c: None for c in CONTROL_CHARS}
+        if control == 'escape':
+            return {c: f'<0x{c:02X}>' for c in CONTROL_CHARS}
+        return None
+
+    def _normalize(self, text: str) -> str:
+        '''Converts line endings to LF, holding back a trailing CR in case its LF is in the next chunk'''
+        if self._pending_cr:
+            text = '\r' + text
+            self._pending_cr = False
+        if text.endswith('\r'):
+            text = text[:-1]
+            self._pending_cr = True
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def _append(self, text: str) -> None:
+        encoded = text.encode('utf-8')
+        end = self._length + len(encoded)
+        if end > len(self._buffer):
+            # allocate a new buffer rather than resizing so any outstanding views stay valid
+            grown = bytearray(max(end, len(self._buffer) * 2))
+            grown[:self._length] = memoryview(self._buffer)[:self._length]
+            self._buffer = grown
+        self._buffer[self._length:end] = encoded
+        self._length = end
+
+    def _process(self, text: str) -> str:
+        if self.normalize_newlines:
+            text = self._normalize(text)
+        if self._table is not None:
+            text = text.translate(self._table)
+        if text:
+            self._append(text)
+        return text
+
+    def feed(self, chunk) -> str:
+        '''Decodes the next chunk of data. Any incomplete sequence at the end of the chunk is kept until
+        the next call
+
+        @param chunk(bytes|Binary|str): the data returned from Fldigi
+        @return (str): the newly decoded text
+        '''
+        if isinstance(chunk, Binary):
+            chunk = chunk.data
+        if not chunk:
+            return ''
+        if isinstance(chunk, str):
+            # xmlrpc strings are already decoded, only the newline and control policies apply
+            return self._process(chunk)
+        return self._process(self._decoder.decode(chunk))
+
+    def finish(self) -> str:
+        '''Flushes any held back data at the end of a stream. Incomplete sequences are handled per the
+        errors policy
+
+        @return (str): the remaining decoded text
+        '''
+        text = self._decoder.decode(b'', final=True)
+        if self._pending_cr:
+            self._pending_cr = False
+            text = '\r' + text
+        if self.normalize_newlines:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if self._table is not None:
+            text = text.translate(self._table)
+        if text:
+            self._append(text)
+        return text
+
+    def view(self) -> memoryview:
+        '''Gets a zero-copy view of everything decoded so far, as UTF-8 bytes
+
+        @return (memoryview): the accumulated text
+        '''
+        return memoryview(self._buffer)[:self._length]
+
+    def text(self) -> str:
+        '''Gets everything decoded so far as a str
+
+        @return (str): the accumulated text
+        '''
+        return str(self.view(), 'utf-8')
+
+    def clear(self) -> None:
+        '''Empties the accumulation buffer. A new buffer of the same size is allocated, so views taken before
+        keep the text they had. Partial sequences from the last chunk are kept'''
+        self._buffer = bytearray(len(self._buffer))
+        self._length = 0
+
+    def reset(self) -> None:
+        '''Empties the accumulation buffer and discards any partial sequences'''
+        self._decoder.reset()
+        self._pending_cr = False
+        self.clear()
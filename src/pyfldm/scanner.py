@@ -0,0 +1,266 @@
+############################################################################
+#
+#  File: scanner.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import logging
+import threading
+from time import perf_counter
+from typing import NamedTuple
+from .client import Client
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_DWELL_SECS = .5
+DEFAULT_START_HZ = 300
+DEFAULT_STOP_HZ = 2700
+DEFAULT_COARSE_STEP_HZ = 100
+DEFAULT_FINE_STEP_HZ = 10
+DEFAULT_MAX_PEAKS = 5
+DEFAULT_THRESHOLD = 10.0
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ModuleNotFoundError("The carrier scanner requires numpy. Install it with: pip install pyfldm[scanner]")
+
+class ScanPeak(NamedTuple):
+    '''A signal found by CarrierScanner'''
+    carrier: int
+    quality: float
+
+class SweepResult(NamedTuple):
+    '''The samples from a single pass of CarrierScanner'''
+    carriers: 'np.ndarray'
+    quality: 'np.ndarray'
+    elapsed_secs: float
+
+    @property
+    def steps_per_sec(self) -> float:
+        return len(self.carriers) / self.elapsed_secs if self.elapsed_secs else 0.0
+
+class ScanReport(NamedTuple):
+    '''The result of CarrierScanner.scan(): the ranked peaks and the passes that found them'''
+    peaks: list
+    coarse: SweepResult
+    fine: list
+    steps: int
+    elapsed_secs: float
+
+    @property
+    def steps_per_sec(self) -> float:
+        return self.steps / self.elapsed_secs if self.elapsed_secs else 0.0
+
+def find_peaks(carriers, quality, threshold: float = DEFAULT_THRESHOLD, min_separation_hz: int = 0,
+               max_peaks: int = None) -> list:
+    '''Finds the local maxima of a quality sweep, strongest first
+
+    @param carriers(numpy.ndarray): the carrier frequency of each sample, in ascending order
+    @param quality(numpy.ndarray): the quality measured at each carrier
+    @param threshold(float): the minimum quality of a peak
+    @param min_separation_hz(int): weaker peaks closer than this to a stronger one are dropped
+    @param max_peaks(int): [OPTIONAL] the max number of peaks returned
+    @return (list[ScanPeak]): the peaks, ranked by quality
+    '''
+    _require_numpy()
+    quality = np.asarray(quality, dtype=np.float64)
+    carriers = np.asarray(carriers)
+    if quality.size == 0:
+        return []
+    # pad with -inf so the ends of the sweep can be peaks, and use >= on the right so flat tops count once. Steps
+    # that were never measured (NaN) count as -inf too, so a peak next to one is still found
+    padded = np.concatenate(([-np.inf], np.nan_to_num(quality, nan=-np.inf), [-np.inf]))
+    is_peak = (padded[1:-1] > padded[:-2]) & (padded[1:-1] >= padded[2:]) & (quality >= threshold)
+    indexes = np.flatnonzero(is_peak)
+    indexes = indexes[np.argsort(-quality[indexes], kind='stable')]
+    peaks = []
+    for i in indexes:
+        carrier = int(carriers[i])
+        if min_separation_hz and any(abs(carrier - peak.carrier) < min_separation_hz for peak in peaks):
+            continue
+        peaks.append(ScanPeak(carrier, float(quality[i])))
+        if max_peaks is not None and len(peaks) >= max_peaks:
+            break
+    return peaks
+
+class CarrierScanner:
+    '''Finds active signals across the audio passband by moving the modem carrier and measuring the modem quality
+    after a dwell at each step. A full scan makes a fast coarse pass over the whole range, then a fine pass around
+    each peak it found. Uses its own xmlrpc connection, and puts the carrier back where it was when done.
+
+    Requires numpy (pip install pyfldm[scanner])
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param dwell_secs(float): how long to wait at each step before reading the quality
+    @param samples_per_step(int): the number of quality readings per step, spread over the dwell, the max is kept
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.scanner import CarrierScanner
+    >>> scanner = CarrierScanner(dwell_secs=.3)
+    >>> report = scanner.scan(start_hz=300, stop_hz=2700, coarse_step_hz=100, fine_step_hz=10)
+    >>> report.peaks
+    [ScanPeak(carrier=1510, quality=88.0), ScanPeak(carrier=740, quality=42.5)]
+    >>> round(report.steps_per_sec, 1)
+    3.2
+    >>> scanner.search('up', steps=5).carriers
+    array([1620, 1790, 2010, 2255, 2400])
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 dwell_secs: float = DEFAULT_DWELL_SECS,
+                 samples_per_step: int = 1) -> None:
+        _require_numpy()
+        if samples_per_step < 1:
+            raise ValueError("samples_per_step must be at least 1")
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._dwell = float(dwell_secs)
+        self._samples = int(samples_per_step)
+        self._stop_event = threading.Event()
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def stop(self) -> None:
+        '''Stops a scan running on another thread after its current step. The samples taken so far are returned'''
+        self._stop_event.set()
+
+    def _measure(self) -> float:
+        '''Waits out the dwell and reads the quality, keeping the best of samples_per_step readings'''
+        best = -np.inf
+        for _ in range(self._samples):
+            if self._stop_event.wait(self._dwell / self._samples):
+                break
+            best = max(best, float(self._client.modem.get_quality()))
+        return best if best != -np.inf else np.nan
+
+    def _sweep(self, carriers) -> SweepResult:
+        carriers = np.asarray(carriers, dtype=np.int64)
+        quality = np.full(carriers.size, np.nan)
+        start = perf_counter()
+        taken = 0
+        for i, carrier in enumerate(carriers):
+            if self._stop_event.is_set():
+                break
+            self._client.modem.set_carrier(int(carrier))
+            quality[i] = self._measure()
+            taken = i + 1
+        return SweepResult(carriers[:taken], quality[:taken], perf_counter() - start)
+
+    def sweep(self, start_hz: int = DEFAULT_START_HZ, stop_hz: int = DEFAULT_STOP_HZ,
+              step_hz: int = DEFAULT_COARSE_STEP_HZ, restore: bool = True) -> SweepResult:
+        '''Steps the carrier from start_hz to stop_hz (inclusive), measuring the quality at each step
+
+        @param start_hz(int): the first carrier frequency
+        @param stop_hz(int): the last carrier frequency
+        @param step_hz(int): the distance between steps
+        @param restore(bool): True to put the carrier back where it was afterwards
+        @return (SweepResult): the carriers and the quality measured at each
+        '''
+        if step_hz <= 0 or stop_hz < start_hz:
+            raise ValueError("step_hz must be positive and stop_hz must not be below start_hz")
+        self._stop_event.clear()
+        original = self._client.modem.get_carrier() if restore else None
+        try:
+            return self._sweep(np.arange(start_hz, stop_hz + 1, step_hz))
+        finally:
+            if original is not None:
+                self._client.modem.set_carrier(original)
+
+    def search(self, direction: str = 'up', steps: int = 10, restore: bool = True) -> SweepResult:
+        '''Jumps from signal to signal with Fldigi's own search_up/search_down, measuring the quality at each
+
+        @param direction(str): 'up' or 'down'
+        @param steps(int): the number of searches to make
+        @param restore(bool): True to put the carrier back where it was afterwards
+        @return (SweepResult): the carriers found and the quality measured at each, in the order visited
+        '''
+        if direction not in ('up', 'down'):
+            raise ValueError("direction must be 'up' or 'down'")
+        self._stop_event.clear()
+        search = self._client.modem.search_up if direction == 'up' else self._client.modem.search_down
+        original = self._client.modem.get_carrier() if restore else None
+        carriers = np.zeros(steps, dtype=np.int64)
+        quality = np.full(steps, np.nan)
+        start = perf_counter()
+        taken = 0
+        try:
+            for i in range(steps):
+                if self._stop_event.is_set():
+                    break
+                search()
+                quality[i] = self._measure()
+                carriers[i] = self._client.modem.get_carrier()
+                taken = i + 1
+        finally:
+            if original is not None:
+                self._client.modem.set_carrier(original)
+        return SweepResult(carriers[:taken], quality[:taken], perf_counter() - start)
+
+    def scan(self,
+             start_hz: int = DEFAULT_START_HZ,
+             stop_hz: int = DEFAULT_STOP_HZ,
+             coarse_step_hz: int = DEFAULT_COARSE_STEP_HZ,
+             fine_step_hz: int = DEFAULT_FINE_STEP_HZ,
+             max_peaks: int = DEFAULT_MAX_PEAKS,
+             threshold: float = DEFAULT_THRESHOLD) -> ScanReport:
+        '''Makes a coarse pass over the range, then a fine pass of +/- one coarse step around each peak
+
+        @param start_hz(int): the lowest carrier frequency to scan
+        @param stop_hz(int): the highest carrier frequency to scan
+        @param coarse_step_hz(int): the step of the coarse pass
+        @param fine_step_hz(int): the step of the fine passes, 0 to skip them
+        @param max_peaks(int): the max number of peaks to refine and report
+        @param threshold(float): the minimum quality for a step to count as activity
+        @return (ScanReport): the peaks ranked by quality, with the samples and the scan rate
+        '''
+        if coarse_step_hz <= 0 or stop_hz < start_hz:
+            raise ValueError("coarse_step_hz must be positive and stop_hz must not be below start_hz")
+        self._stop_event.clear()
+        original = self._client.modem.get_carrier()
+        start = perf_counter()
+        try:
+            coarse = self._sweep(np.arange(start_hz, stop_hz + 1, coarse_step_hz))
+            peaks = find_peaks(coarse.carriers, coarse.quality, threshold, coarse_step_hz, max_peaks)
+            self.logger.debug(f"Coarse pass found {len(peaks)} peak(s) in {coarse.elapsed_secs:.1f} secs")
+            fine = []
+            if fine_step_hz and peaks:
+                refined = []
+                for peak in peaks:
+                    low = max(start_hz, peak.carrier - coarse_step_hz + fine_step_hz)
+                    high = min(stop_hz, peak.carrier + coarse_step_hz - fine_step_hz)
+                    result = self._sweep(np.arange(low, high + 1, fine_step_hz))
+                    fine.append(result)
+                    if result.quality.size and not np.all(np.isnan(result.quality)):
+                        best = int(np.nanargmax(result.quality))
+                        if result.quality[best] >= peak.quality:
+                            peak = ScanPeak(int(result.carriers[best]), float(result.quality[best]))
+                    refined.append(peak)
+                peaks = sorted(refined, key=lambda peak: peak.quality, reverse=True)
+        finally:
+            self._client.modem.set_carrier(original)
+        steps = len(coarse.carriers) + sum(len(result.carriers) for result in fine)
+        elapsed = perf_counter() - start
+        self.logger.info(f"Scan found {len(peaks)} signal(s), {steps} steps at {steps / elapsed:.1f} steps/sec")
+        return ScanReport(peaks, coarse, fine, steps, elapsed)
@@ -25,6 +25,9 @@ class BaseCall:
     '''Serves as a base class for each of the sub-namespaces of the xmlrpc API
     to house common functionality
     '''
+    # client side helpers built on top of the xmlrpc calls, left out of get_methods()
+    HELPER_METHODS = ()
+
     def __init__(self) -> None:
         self.logger = logging.getLogger(__name__)
         pass
@@ -50,4 +53,5 @@ class BaseCall:
                     callable(getattr(self, func)) 
                     and not func.startswith("__") 
                     and func not in dir(BaseCall)
+                    and func not in self.HELPER_METHODS
                     and func != 'client']
\ No newline at end of file
@@ -0,0 +1,108 @@
+############################################################################
+#
+#  File: batch.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import logging
+from functools import reduce
+from time import perf_counter
+from xmlrpc.client import ServerProxy, MultiCall, Fault
+
+class BatchCaller:
+    '''Sends several xmlrpc calls to Fldigi in a single round trip using system.multicall. If the server does
+    not support multicall the calls are made one at a time instead, and multicall is not tried again.
+
+    This class is not intended to be created or used directly, but rather utilized by the pyfldm client and
+    the features built on it that need to read or write many values at once.
+
+    @param client(xmlrpc.client.ServerProxy): a ServerProxy client object used to make http requests via the fldigi xmlrpc api
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.client import Client
+    >>> client = Client()
+    >>> client.batch([('main.get_frequency', ()), ('modem.get_name', ())])
+    [14070000.0, 'BPSK31']
+    '''
+    def __init__(self, client: ServerProxy) -> None:
+        self.client = client
+        self.logger = logging.getLogger(__name__)
+        self.multicall_supported = True
+        self.last_latencies = []
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    @staticmethod
+    def _method(target, method_path: str):
+        return reduce(getattr, method_path.split('.'), target)
+
+    def call(self, calls: list, raise_faults: bool = True) -> list:
+        '''Makes a batch of xmlrpc calls
+
+        @param calls(list[tuple]): (method path, args) pairs, e.g. ('main.set_afc', (True,))
+        @param raise_faults(bool): True to raise the first Fault, False to return Faults in place of results
+        @return (list): the result of each call, in order
+        '''
+        if not calls:
+            self.last_latencies = []
+            return []
+        if self.multicall_supported and len(calls) > 1:
+            try:
+                return self._multicall(calls, raise_faults)
+            except Fault as e:
+                if 'multicall' not in str(e.faultString).lower():
+                    raise
+                self.logger.info("Fldigi does not support system.multicall, falling back to individual calls")
+                self.multicall_supported = False
+        return self._sequential(calls, raise_faults)
+
+    def _multicall(self, calls: list, raise_faults: bool) -> list:
+        multicall = MultiCall(self.client)
+        for method_path, args in calls:
+            self._method(multicall, method_path)(*args)
+        start = perf_counter()
+        response = multicall()
+        latency = perf_counter() - start
+        results = []
+        for i in range(len(calls)):
+            try:
+                results.append(response[i])
+            except Fault as fault:
+                if raise_faults:
+                    raise
+                results.append(fault)
+        self.last_latencies = [latency] * len(calls)
+        return results
+
+    def _sequential(self, calls: list, raise_faults: bool) -> list:
+        results = []
+        latencies = []
+        for method_path, args in calls:
+            start = perf_counter()
+            try:
+                results.append(self._method(self.client, method_path)(*args))
+            except Fault as fault:
+                if raise_faults:
+                    raise
+                results.append(fault)
+            latencies.append(perf_counter() - start)
+        self.last_latencies = latencies
+        return results
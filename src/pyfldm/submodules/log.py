@@ -21,8 +21,39 @@
 ############################################################################
 
 import logging
+from typing import NamedTuple
 from xmlrpc.client import ServerProxy
 from .base_call import BaseCall
+from .batch import BatchCaller
+
+# the log fields read by get_record(), in LogRecord order
+LOG_FIELDS = [
+    'call', 'name', 'qth', 'state', 'providence', 'country', 'locator', 'az', 'band', 'frequency',
+    'rst_in', 'rst_out', 'serial_number', 'serial_number_sent', 'exchange', 'time_on', 'time_off', 'notes',
+]
+# the log fields Fldigi can set over xmlrpc
+LOG_SETTABLE_FIELDS = ['call', 'name', 'qth', 'locator', 'rst_in', 'rst_out', 'serial_number', 'exchange']
+
+class LogRecord(NamedTuple):
+    '''The contents of the Fldigi log fields, as read by Log.get_record()'''
+    call: str = ''
+    name: str = ''
+    qth: str = ''
+    state: str = ''
+    providence: str = ''
+    country: str = ''
+    locator: str = ''
+    az: str = ''
+    band: str = ''
+    frequency: str = ''
+    rst_in: str = ''
+    rst_out: str = ''
+    serial_number: str = ''
+    serial_number_sent: str = ''
+    exchange: str = ''
+    time_on: str = ''
+    time_off: str = ''
+    notes: str = ''
 
 class Log(BaseCall):
     '''Houses the commands in the log group in the XML-RPC spec for fldigi.
@@ -31,6 +62,7 @@ class Log(BaseCall):
     This class is not intended to be created or used directly, but rather utilized under the pyfldm client object. Reference client.py which has an attribute self.log that interfaces these methods.
 
     @param client(xmlrpc.client.ServerProxy): a ServerProxy client object used to make http requests via the fldigi xmlrpc api
+    @param batch(BatchCaller): [OPTIONAL] the batch caller used by get_record and set_record, shared with the client
     
     Example use:
     # * assuming that Fldigi is already running
@@ -38,10 +70,17 @@ class Log(BaseCall):
     >>> client = Client()
     >>> client.log.get_az()
     ABCD
+    >>> record = client.log.get_record()
+    >>> record.call, record.rst_in
+    ('N0CALL', '599')
+    >>> client.log.set_record({'call': 'W1AW', 'rst_out': '599'})
     '''
-    def __init__(self, client: ServerProxy) -> None:
+    HELPER_METHODS = ('get_record', 'set_record')
+
+    def __init__(self, client: ServerProxy, batch: BatchCaller = None) -> None:
         self.client = client
         self.logger = logging.getLogger(__name__)
+        self._batch = batch if batch is not None else BatchCaller(client)
     
     def __str__(self) -> str:
         return f'log'
@@ -49,6 +88,32 @@ class Log(BaseCall):
     def clear(self) -> None:
         '''Clears the contents of the log fields'''
         self.client.log.clear()
+
+    def get_record(self) -> LogRecord:
+        '''Reads every log field in a single batched request
+
+        @return (LogRecord): the log field contents
+        '''
+        return LogRecord(*self._batch.call([(f'log.get_{field}', ()) for field in LOG_FIELDS]))
+
+    def set_record(self, record, clear: bool = False) -> None:
+        '''Writes several log fields in a single batched request. Fields Fldigi cannot set over xmlrpc (such as
+        country or band) are skipped when a LogRecord is given, and rejected when named in a dict
+
+        @param record(LogRecord|dict): the field values to write, dict values of None are skipped
+        @param clear(bool): True to clear all the log fields first, in the same request
+        @raises ValueError: if a dict names a field that cannot be set
+        '''
+        if isinstance(record, LogRecord):
+            fields = {field: getattr(record, field) for field in LOG_SETTABLE_FIELDS}
+        else:
+            invalid = [field for field in record if field not in LOG_SETTABLE_FIELDS]
+            if invalid:
+                raise ValueError(f"Cannot set log field(s): {', '.join(invalid)}. Settable fields: {', '.join(LOG_SETTABLE_FIELDS)}")
+            fields = {field: value for field, value in record.items() if value is not None}
+        calls = [('log.clear', ())] if clear else []
+        calls += [(f'log.set_{field}', (str(value),)) for field, value in fields.items()]
+        self._batch.call(calls)
     
     def get_az(self) -> str:
         '''Gets the AZ field contents
@@ -197,13 +262,6 @@ class Log(BaseCall):
         '''
         self.client.log.set_locator(locator_str)
     
-    def set_name(self, name_str: str) -> None:
-        '''Sets the name field contents
-        
-        @param name_str(str): the string to populate in the name field
-        '''
-        self.client.log.set_name(name_str)
-
     def set_name(self, name_str: str) -> None:
         '''Sets the name field contents
         
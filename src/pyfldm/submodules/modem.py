@@ -23,6 +23,7 @@
 import logging
 from xmlrpc.client import ServerProxy
 from .base_call import BaseCall
+from .modem_catalogue import ModemCatalogue
 
 class Modem(BaseCall):
     '''Houses the commands in the Modem group in the XML-RPC spec for fldigi.
@@ -39,13 +40,24 @@ class Modem(BaseCall):
     >>> client.modem.get_carrier()
     1234
     '''
+    HELPER_METHODS = ('get_catalogue',)
+
     def __init__(self, client: ServerProxy) -> None:
         self.client = client
         self.logger = logging.getLogger(__name__)
+        self._catalogue = ModemCatalogue(client)
     
     def __str__(self) -> str:
         return __name__.lower().split(".")[-1]
 
+    def get_catalogue(self) -> ModemCatalogue:
+        '''Gets the index of available modems, used to resolve and validate modem names and ids locally.
+        Built from Fldigi the first time it is used
+
+        @return (ModemCatalogue): the modem catalogue
+        '''
+        return self._catalogue
+
     def get_afc_search_range(self) -> int:
         '''Gets the modem AFC search range
         
@@ -141,23 +153,21 @@ class Modem(BaseCall):
         return self.client.modem.olivia.get_tones()
     
     def set_olivia_tones(self, new_tone: int) -> None:
-        '''Sets the Olivia tones. Available values [2, 4, 8, 16, 32, 64, 128, 256]
+        '''Sets the Olivia tones. Available values [2, 4, 8, 16, 32, 64, 128, 256], checked against the modem catalogue
         
         @param new_tone(int): the new Olivia tones value
         '''
         tone = int(new_tone)
-        if tone not in [2, 4, 8, 16, 32, 64, 128, 256]:
-            raise ValueError("Must be one of these values: 2, 4, 8, 16, 32, 64, 128, 256")
+        self._catalogue.validate('OLIVIA', 'tones', tone)
         self.client.modem.olivia.set_tones(tone)
 
     def set_olivia_bandwidth(self, new_bandwidth: int) -> None:
-        '''Sets the Olivia bandwidth. Available values [125, 250, 500, 1000, 2000]
+        '''Sets the Olivia bandwidth. Available values [125, 250, 500, 1000, 2000], checked against the modem catalogue
         
         @param new_bandwidth(int): the new Olivia bandwidth value
         '''
         bandwidth = int(new_bandwidth)
-        if bandwidth not in [125, 250, 500, 1000, 2000]:
-            raise ValueError("Must be one of these values: 125, 250, 500, 1000, 2000")
+        self._catalogue.validate('OLIVIA', 'bandwidth', bandwidth)
         self.client.modem.olivia.set_bandwidth(bandwidth)
 
     def search_down(self) -> None:
@@ -189,16 +199,20 @@ class Modem(BaseCall):
         
         @param new_modem (int): the new modem id
         @return (int): the old modem id
+        @raises ValueError: if the id is not a modem in the catalogue
         '''
-        return self.client.modem.set_by_id(new_modem)
+        modem_id = int(new_modem)
+        self._catalogue.name_of(modem_id)
+        return self.client.modem.set_by_id(modem_id)
     
     def set_by_name(self, new_modem: str) -> str:
         '''Sets the current modem
         
-        @param new_modem (str): the new modem name
+        @param new_modem (str): the new modem name (case-insensitive)
         @return (str): the old modem name
+        @raises ValueError: if the name is not a modem in the catalogue, suggesting the closest names
         '''
-        return self.client.modem.set_by_name(new_modem)
+        return self.client.modem.set_by_name(self._catalogue.resolve_name(new_modem))
     
     def set_carrier(self, new_carrier: int) -> int:
         '''Sets the modem carrier
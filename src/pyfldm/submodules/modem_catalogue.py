@@ -0,0 +1,198 @@
+############################################################################
+#
+#  File: modem_catalogue.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import bisect
+import difflib
+import logging
+import threading
+from xmlrpc.client import ServerProxy
+
+OLIVIA_TONES = [2, 4, 8, 16, 32, 64, 128, 256]
+OLIVIA_BANDWIDTHS = [125, 250, 500, 1000, 2000]
+# modem name prefix: {parameter: valid values}, the longest matching prefix applies. Only parameters Fldigi lets
+# xmlrpc set are listed, which is just the Olivia tones and bandwidth (modem.olivia.set_tones/set_bandwidth)
+MODEM_PARAMETERS = {
+    'OLIVIA': {'tones': OLIVIA_TONES, 'bandwidth': OLIVIA_BANDWIDTHS},
+}
+DEFAULT_SUGGESTIONS = 3
+SUGGESTION_CUTOFF = .5
+
+class ModemCatalogue:
+    '''An index of the modems available in the connected Fldigi, so that modem names and ids can be resolved and
+    validated locally instead of costing a round trip and a server fault. Built from modem.get_names() and
+    modem.get_max_id() the first time it is used, name lookups are case-insensitive.
+
+    This class is not intended to be created or used directly, but rather utilized through client.modem.get_catalogue()
+
+    @param client(xmlrpc.client.ServerProxy): a ServerProxy client object used to make http requests via the fldigi xmlrpc api
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.client import Client
+    >>> client = Client()
+    >>> catalogue = client.modem.get_catalogue()
+    >>> catalogue.id_of('bpsk31'), catalogue.name_of(2)
+    (24, 'CW')
+    >>> catalogue.search('OLIVIA-8')
+    ['OLIVIA-8-250', 'OLIVIA-8-500']
+    >>> client.modem.set_by_name('BSPK31')
+    ValueError: Unknown modem 'BSPK31'. Did you mean: BPSK31, QPSK31, BPSK31R?
+    '''
+    def __init__(self, client: ServerProxy) -> None:
+        self.client = client
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._names = None
+        self._ids = {}
+        self._upper_to_name = {}
+        self._sorted_upper = []
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and name.upper() in self._index()[1]
+
+    def _index(self) -> tuple:
+        if self._names is None:
+            self.refresh()
+        return self._names, self._upper_to_name
+
+    def refresh(self) -> None:
+        '''Rebuilds the catalogue from Fldigi'''
+        names = list(self.client.modem.get_names())
+        max_id = int(self.client.modem.get_max_id())
+        if max_id != len(names) - 1:
+            self.logger.warning(f"Fldigi reported {len(names)} modem names but a max id of {max_id}")
+            names = names[:max_id + 1]
+        with self._lock:
+            self._ids = {name: modem_id for modem_id, name in enumerate(names)}
+            self._upper_to_name = {name.upper(): name for name in names}
+            self._sorted_upper = sorted(self._upper_to_name)
+            self._names = names
+        self.logger.debug(f"Built modem catalogue of {len(names)} modems")
+
+    @property
+    def names(self) -> list:
+        '''All modem names, in id order'''
+        return list(self._index()[0])
+
+    @property
+    def max_id(self) -> int:
+        '''The highest modem id'''
+        return len(self._index()[0]) - 1
+
+    def suggest(self, name: str, count: int = DEFAULT_SUGGESTIONS) -> list:
+        '''Finds the modem names closest to a (misspelt) name
+
+        @param name(str): the name to match
+        @param count(int): the max number of suggestions
+        @return (list[str]): the closest modem names, best first
+        '''
+        upper_to_name = self._index()[1]
+        matches = difflib.get_close_matches(str(name).upper(), self._sorted_upper, count, SUGGESTION_CUTOFF)
+        return [upper_to_name[match] for match in matches]
+
+    def search(self, prefix: str) -> list:
+        '''Finds the modems whose names start with a prefix (case-insensitive)
+
+        @param prefix(str): the start of the modem name, e.g. 'OLIVIA'
+        @return (list[str]): the matching modem names, sorted
+        '''
+        upper_to_name = self._index()[1]
+        prefix = prefix.upper()
+        start = bisect.bisect_left(self._sorted_upper, prefix)
+        matches = []
+        for upper in self._sorted_upper[start:]:
+            if not upper.startswith(prefix):
+                break
+            matches.append(upper_to_name[upper])
+        return matches
+
+    def _unknown(self, name: str) -> ValueError:
+        suggestions = self.suggest(name)
+        hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ''
+        return ValueError(f"Unknown modem {name!r}.{hint}")
+
+    def resolve_name(self, name: str) -> str:
+        '''Gets the exact modem name Fldigi uses for a case-insensitive name
+
+        @param name(str): the modem name
+        @return (str): the modem name as Fldigi spells it
+        @raises ValueError: if there is no such modem, with the closest names as suggestions
+        '''
+        try:
+            return self._index()[1][str(name).upper()]
+        except KeyError:
+            raise self._unknown(name) from None
+
+    def id_of(self, name: str) -> int:
+        '''Gets the id of a modem
+
+        @param name(str): the modem name (case-insensitive)
+        @return (int): the modem id
+        @raises ValueError: if there is no such modem
+        '''
+        return self._ids[self.resolve_name(name)]
+
+    def name_of(self, modem_id: int) -> str:
+        '''Gets the name of a modem
+
+        @param modem_id(int): the modem id
+        @return (str): the modem name
+        @raises ValueError: if the id is out of range
+        '''
+        names = self._index()[0]
+        modem_id = int(modem_id)
+        if not 0 <= modem_id < len(names):
+            raise ValueError(f"Modem id must be between 0 and {len(names) - 1}, got {modem_id}")
+        return names[modem_id]
+
+    def parameters(self, name: str) -> dict:
+        '''Gets the parameters that can be set for a modem and their valid values
+
+        @param name(str): the modem name (case-insensitive)
+        @return (dict): {parameter: [valid values]}, empty if there are none
+        '''
+        upper = self.resolve_name(name).upper()
+        family = max((prefix for prefix in MODEM_PARAMETERS if upper.startswith(prefix)), key=len, default=None)
+        return {parameter: list(values) for parameter, values in MODEM_PARAMETERS.get(family, {}).items()}
+
+    def validate(self, name: str, parameter: str, value) -> None:
+        '''Checks a parameter value against a modem's parameter table
+
+        @param name(str): the modem name (case-insensitive)
+        @param parameter(str): the parameter name, e.g. 'tones'
+        @param value: the value to check
+        @raises ValueError: if the modem does not have the parameter or the value is not valid for it
+        '''
+        parameters = self.parameters(name)
+        if parameter not in parameters:
+            raise ValueError(f"Modem {name!r} has no {parameter!r} parameter")
+        if value not in parameters[parameter]:
+            raise ValueError(f"Must be one of these values: {', '.join(str(v) for v in parameters[parameter])}")
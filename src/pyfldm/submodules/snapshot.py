@@ -0,0 +1,137 @@
+############################################################################
+#
+#  File: snapshot.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+from time import time
+from xmlrpc.client import Fault
+from .batch import BatchCaller
+
+# snapshot field name: (xmlrpc method, conversion applied to the result)
+SNAPSHOT_FIELDS = {
+    'frequency': ('main.get_frequency', float),
+    'trx_state': ('main.get_trx_state', str),
+    'trx_status': ('main.get_trx_status', str),
+    'squelch': ('main.get_squelch', bool),
+    'squelch_level': ('main.get_squelch_level', float),
+    'afc': ('main.get_afc', bool),
+    'lock': ('main.get_lock', bool),
+    'reverse': ('main.get_reverse', bool),
+    'rsid': ('main.get_rsid', bool),
+    'txid': ('main.get_txid', bool),
+    'status1': ('main.get_status1', str),
+    'status2': ('main.get_status2', str),
+    'modem': ('modem.get_name', str),
+    'modem_id': ('modem.get_id', int),
+    'carrier': ('modem.get_carrier', int),
+    'bandwidth': ('modem.get_bandwidth', int),
+    'quality': ('modem.get_quality', float),
+    'rig_mode': ('rig.get_mode', str),
+    'rig_bandwidth': ('rig.get_bandwidth', str),
+    'spot_auto': ('spot.get_auto', bool),
+    'pskrep_count': ('spot.pskrep.get_count', int),
+}
+DEFAULT_SNAPSHOT_FIELDS = [
+    'frequency', 'trx_state', 'trx_status', 'squelch', 'squelch_level', 'afc', 'lock', 'reverse',
+    'status1', 'status2', 'modem', 'carrier', 'bandwidth', 'quality', 'rig_mode',
+]
+
+class Snapshot:
+    '''An immutable snapshot of the radio state, captured by Client.snapshot(). Each requested field is an
+    attribute; fields that were not requested, or that Fldigi failed to return, are None.
+
+    @param values(dict): the field values
+    @param captured_at(float): the unix timestamp the snapshot was captured
+    @param latencies(dict): the round trip time in seconds for each field
+    '''
+    __slots__ = tuple(SNAPSHOT_FIELDS) + ('fields', 'captured_at', 'latencies', 'errors')
+
+    def __init__(self, values: dict, captured_at: float, latencies: dict, errors: dict = None) -> None:
+        for name in SNAPSHOT_FIELDS:
+            object.__setattr__(self, name, values.get(name))
+        object.__setattr__(self, 'fields', tuple(values))
+        object.__setattr__(self, 'captured_at', captured_at)
+        object.__setattr__(self, 'latencies', dict(latencies))
+        object.__setattr__(self, 'errors', dict(errors or {}))
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError("Snapshot is immutable")
+
+    def __delattr__(self, name) -> None:
+        raise AttributeError("Snapshot is immutable")
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)
+        return f'Snapshot({values})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Snapshot):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.as_dict().items()))
+
+    def as_dict(self) -> dict:
+        '''Gets the captured fields as a dict
+
+        @return (dict): the field values keyed by field name
+        '''
+        return {name: getattr(self, name) for name in self.fields}
+
+    def diff(self, other: 'Snapshot') -> dict:
+        '''Compares this snapshot with another (typically a newer one). Only fields captured in both are compared
+
+        @param other(Snapshot): the snapshot to compare against
+        @return (dict): {field: (this value, other value)} for every field that differs
+        '''
+        changes = {}
+        other_fields = set(other.fields)
+        for name in self.fields:
+            if name in other_fields:
+                mine = getattr(self, name)
+                theirs = getattr(other, name)
+                if mine != theirs:
+                    changes[name] = (mine, theirs)
+        return changes
+
+def take_snapshot(batch: BatchCaller, fields: list = None) -> Snapshot:
+    '''Reads the requested fields from Fldigi in a single batch
+
+    @param batch(BatchCaller): the batch caller for the Fldigi connection
+    @param fields(list[str]): [OPTIONAL] the fields to capture, defaults to DEFAULT_SNAPSHOT_FIELDS
+    @return (Snapshot): the snapshot
+    '''
+    fields = list(DEFAULT_SNAPSHOT_FIELDS if fields is None else fields)
+    unknown = [name for name in fields if name not in SNAPSHOT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown snapshot field(s): {', '.join(unknown)}. Available fields: {', '.join(SNAPSHOT_FIELDS)}")
+    captured_at = time()
+    results = batch.call([(SNAPSHOT_FIELDS[name][0], ()) for name in fields], raise_faults=False)
+    values = {}
+    errors = {}
+    for name, result in zip(fields, results):
+        if isinstance(result, Fault):
+            values[name] = None
+            errors[name] = result.faultString
+        else:
+            values[name] = SNAPSHOT_FIELDS[name][1](result)
+    latencies = dict(zip(fields, batch.last_latencies))
+    return Snapshot(values, captured_at, latencies, errors)
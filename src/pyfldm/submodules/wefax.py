@@ -61,14 +61,14 @@ class Wefax(BaseCall):
         '''
         return self.client.wefax.get_received_file(max_delay_secs)
     
-    def send_file(self, max_delay_secs: int) -> str:
-        '''Sends file
-        #TODO: this endpoint does not work as specified. Need to figure out what type and what actual data it expects to send for a valid call
+    def send_file(self, file_path: str, max_delay_secs: int = 0) -> str:
+        '''Sends an image file
         
-        @param max_delay_secs(int): the max time in seconds to wait
+        @param file_path(str): the path of the image file to send
+        @param max_delay_secs(int): the max time in seconds to wait for the transmitter to be ready
         @return (str): empty string if successful send, error message otherwise
         '''
-        return self.client.wefax.send_file(max_delay_secs)
+        return self.client.wefax.send_file(str(file_path), int(max_delay_secs))
     
     def set_adif_log(self, reset: bool = False) -> str:
         '''Set/reset logging to received/transmit images to ADIF log file
@@ -0,0 +1,441 @@
+############################################################################
+#
+#  File: telemetry.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import csv
+import sys
+import math
+import struct
+import logging
+import threading
+from array import array
+from collections import deque
+from time import time, monotonic
+from xmlrpc.client import Error, Fault
+from .client import Client
+from .submodules.snapshot import SNAPSHOT_FIELDS
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TELEMETRY_FIELDS = ['quality', 'squelch_level', 'carrier', 'frequency', 'pskrep_count']
+DEFAULT_INTERVAL_SECS = 1.0
+DEFAULT_CAPACITY = 3600
+# (bucket length in seconds, number of buckets kept): a day of minutes and a week of quarter hours
+DEFAULT_STAGES = [(60, 1440), (900, 672)]
+DEFAULT_PERCENTILES = (50, 90, 99)
+ERROR_BACKOFF_SECS = 2
+BINARY_MAGIC = b'PFTL'
+BINARY_VERSION = 1
+# magic, version, column count, row count
+BINARY_HEADER = struct.Struct('<4sHHQ')
+
+def _percentile(ordered: list, percent: float) -> float:
+    '''Linearly interpolated percentile of an already sorted list, matching numpy's default method'''
+    position = (len(ordered) - 1) * percent / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class RingBuffer:
+    '''A fixed size, columnar time series buffer. Each column is a preallocated array of doubles (8 bytes per
+    value), and once full the oldest rows are overwritten. Missing values are stored as NaN
+
+    @param columns(list[str]): the column names
+    @param capacity(int): the max number of rows kept
+    '''
+    def __init__(self, columns: list, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.columns = list(columns)
+        self.capacity = int(capacity)
+        self._timestamps = array('d', bytes(8 * self.capacity))
+        self._data = {name: array('d', bytes(8 * self.capacity)) for name in self.columns}
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        '''The memory used by the buffer contents in bytes'''
+        return self._timestamps.itemsize * self.capacity * (len(self.columns) + 1)
+
+    def append(self, timestamp: float, values: dict) -> None:
+        '''Adds a row, overwriting the oldest once the buffer is full
+
+        @param timestamp(float): the unix timestamp of the row
+        @param values(dict): the column values, missing columns are stored as NaN
+        '''
+        i = self._next
+        self._timestamps[i] = timestamp
+        for name in self.columns:
+            value = values.get(name)
+            self._data[name][i] = math.nan if value is None else value
+        self._next = (i + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _ordered(self, source: array) -> array:
+        if self._count < self.capacity:
+            return source[:self._count]
+        return source[self._next:] + source[:self._next]
+
+    def timestamps(self) -> array:
+        '''Gets the row timestamps, oldest first
+
+        @return (array.array): the timestamps
+        '''
+        return self._ordered(self._timestamps)
+
+    def column(self, name: str) -> array:
+        '''Gets a column, oldest first
+
+        @param name(str): the column name
+        @return (array.array): the column values
+        '''
+        return self._ordered(self._data[name])
+
+    def clear(self) -> None:
+        '''Removes every row'''
+        self._next = 0
+        self._count = 0
+
+class _Stage:
+    '''A downsampled copy of the telemetry, averaging the samples in each fixed length bucket'''
+    __slots__ = ('bucket_secs', 'buffer', 'bucket_start', 'sums', 'counts')
+
+    def __init__(self, columns: list, bucket_secs: float, capacity: int) -> None:
+        self.bucket_secs = float(bucket_secs)
+        self.buffer = RingBuffer(columns, capacity)
+        self.bucket_start = None
+        self.sums = dict.fromkeys(columns, 0.0)
+        self.counts = dict.fromkeys(columns, 0)
+
+    def add(self, timestamp: float, values: dict) -> None:
+        bucket_start = timestamp - (timestamp % self.bucket_secs)
+        if self.bucket_start is not None and bucket_start != self.bucket_start:
+            self.flush()
+        self.bucket_start = bucket_start
+        for name, value in values.items():
+            if value is not None and not math.isnan(value):
+                self.sums[name] += value
+                self.counts[name] += 1
+
+    def flush(self) -> None:
+        if self.bucket_start is None:
+            return
+        means = {name: (self.sums[name] / self.counts[name]) if self.counts[name] else None for name in self.sums}
+        self.buffer.append(self.bucket_start, means)
+        self.bucket_start = None
+        self.sums = dict.fromkeys(self.sums, 0.0)
+        self.counts = dict.fromkeys(self.counts, 0)
+
+class TelemetryRecorder(threading.Thread):
+    '''Records radio metrics into fixed size columnar ring buffers for long-term monitoring. A daemon thread reads
+    every field in one batch per interval on its own xmlrpc connection. The raw samples are kept for `capacity`
+    intervals, and each downsampling stage keeps the per-bucket means for much longer at a fraction of the size.
+    Statistics are vectorized with numpy when it is installed, with a pure python fallback.
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param fields(list[str]): the snapshot fields to record (see pyfldm.submodules.snapshot.SNAPSHOT_FIELDS)
+    @param interval_secs(float): how often to sample
+    @param capacity(int): the number of raw samples kept
+    @param stages(list[tuple]): (bucket_secs, capacity) for each downsampling stage, [] for none
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.telemetry import TelemetryRecorder
+    >>> recorder = TelemetryRecorder(interval_secs=.5)
+    >>> recorder.start()
+    >>> recorder.stats('quality', window_secs=300)
+    {'count': 600, 'min': 12.0, 'max': 97.5, 'mean': 71.3, 'p50': 74.0, 'p90': 91.0, 'p99': 96.5}
+    >>> recorder.export_csv('/home/me/telemetry.csv')
+    >>> recorder.export_binary('/home/me/telemetry-15min.bin', stage=2)
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 fields: list = None,
+                 interval_secs: float = DEFAULT_INTERVAL_SECS,
+                 capacity: int = DEFAULT_CAPACITY,
+                 stages: list = None) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.fields = list(DEFAULT_TELEMETRY_FIELDS if fields is None else fields)
+        unknown = [name for name in self.fields if name not in SNAPSHOT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown telemetry field(s): {', '.join(unknown)}. Available fields: {', '.join(SNAPSHOT_FIELDS)}")
+        self._client = Client(hostname, port)
+        self._interval = float(interval_secs)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._raw = RingBuffer(self.fields, capacity)
+        self._stages = [_Stage(self.fields, bucket_secs, size)
+                        for bucket_secs, size in (DEFAULT_STAGES if stages is None else stages)]
+        self.samples_taken = 0
+        self.last_sample_secs = None
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    @property
+    def nbytes(self) -> int:
+        '''The memory used by the raw samples and every stage in bytes'''
+        return self._raw.nbytes + sum(stage.buffer.nbytes for stage in self._stages)
+
+    def _buffer(self, stage: int) -> RingBuffer:
+        '''Stage 0 is the raw samples, stage 1 onwards are the downsampling stages'''
+        if stage == 0:
+            return self._raw
+        if not 0 < stage <= len(self._stages):
+            raise ValueError(f"stage must be between 0 and {len(self._stages)}")
+        return self._stages[stage - 1].buffer
+
+    def record(self, values: dict, timestamp: float = None) -> None:
+        '''Adds a sample. Called by the recorder thread, but can be used directly to import existing data
+
+        @param values(dict): the field values, missing fields are recorded as NaN
+        @param timestamp(float): [OPTIONAL] the unix timestamp of the sample, defaults to now
+        '''
+        timestamp = time() if timestamp is None else timestamp
+        with self._lock:
+            self._raw.append(timestamp, values)
+            for stage in self._stages:
+                stage.add(timestamp, values)
+
+    def sample(self) -> dict:
+        '''Reads every field from Fldigi in one batch and records it
+
+        @return (dict): the sampled values, None for fields Fldigi failed to return
+        '''
+        timestamp = time()
+        start = monotonic()
+        results = self._client.batch([(SNAPSHOT_FIELDS[name][0], ()) for name in self.fields], raise_faults=False)
+        self.last_sample_secs = monotonic() - start
+        values = {}
+        for name, result in zip(self.fields, results):
+            values[name] = None if isinstance(result, Fault) else float(result)
+        self.record(values, timestamp)
+        self.samples_taken += 1
+        return values
+
+    def series(self, field: str, stage: int = 0, window_secs: float = None) -> tuple:
+        '''Gets the recorded values of a field, oldest first
+
+        @param field(str): the field name
+        @param stage(int): 0 for the raw samples, 1 onwards for the downsampling stages
+        @param window_secs(float): [OPTIONAL] only the values from the last window_secs
+        @return (tuple): (timestamps, values), as numpy arrays if numpy is installed, otherwise array.array
+        '''
+        with self._lock:
+            buffer = self._buffer(stage)
+            timestamps = buffer.timestamps()
+            values = buffer.column(field)
+        if window_secs is not None and timestamps:
+            cutoff = timestamps[-1] - window_secs
+            start = next((i for i, t in enumerate(timestamps) if t > cutoff), len(timestamps)) if np is None \
+                else int(np.searchsorted(np.frombuffer(timestamps, dtype=np.float64), cutoff, side='right'))
+            timestamps, values = timestamps[start:], values[start:]
+        if np is not None:
+            return np.frombuffer(timestamps, dtype=np.float64), np.frombuffer(values, dtype=np.float64)
+        return timestamps, values
+
+    def stats(self,
+              field: str,
+              window_secs: float = None,
+              stage: int = 0,
+              percentiles: tuple = DEFAULT_PERCENTILES) -> dict:
+        '''Computes summary statistics of a field, ignoring missing samples
+
+        @param field(str): the field name
+        @param window_secs(float): [OPTIONAL] only use the values from the last window_secs
+        @param stage(int): 0 for the raw samples, 1 onwards for the downsampling stages
+        @param percentiles(tuple[float]): the percentiles to compute, each between 0 and 100
+        @return (dict): count, min, max, mean and 'p<percentile>' entries, None values if there are no samples
+        '''
+        _, values = self.series(field, stage, window_secs)
+        keys = [f'p{percent:g}' for percent in percentiles]
+        if np is not None:
+            values = values[~np.isnan(values)]
+            if values.size == 0:
+                return dict({'count': 0, 'min': None, 'max': None, 'mean': None}, **dict.fromkeys(keys))
+            result = {'count': int(values.size), 'min': float(values.min()), 'max': float(values.max()),
+                      'mean': float(values.mean())}
+            result.update(zip(keys, (float(p) for p in np.percentile(values, percentiles))))
+            return result
+        ordered = sorted(value for value in values if not math.isnan(value))
+        if not ordered:
+            return dict({'count': 0, 'min': None, 'max': None, 'mean': None}, **dict.fromkeys(keys))
+        result = {'count': len(ordered), 'min': ordered[0], 'max': ordered[-1], 'mean': math.fsum(ordered) / len(ordered)}
+        result.update((key, _percentile(ordered, percent)) for key, percent in zip(keys, percentiles))
+        return result
+
+    def rolling(self, field: str, window: int, statistic: str = 'mean', stage: int = 0) -> tuple:
+        '''Computes a rolling statistic over a fixed number of samples
+
+        @param field(str): the field name
+        @param window(int): the number of samples in each window
+        @param statistic(str): 'mean', 'min' or 'max'
+        @param stage(int): 0 for the raw samples, 1 onwards for the downsampling stages
+        @return (tuple): (timestamps, values) with one entry per full window, stamped with the window's last sample.
+        Missing samples are left out of each window, and a window with no samples at all gives NaN
+        '''
+        if statistic not in ('mean', 'min', 'max'):
+            raise ValueError("statistic must be 'mean', 'min' or 'max'")
+        window = int(window)
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        timestamps, values = self.series(field, stage)
+        if len(values) < window:
+            return timestamps[:0], values[:0]
+        # missing samples (NaN) are skipped, a window with none present gives NaN
+        if np is not None:
+            present = ~np.isnan(values)
+            counts = np.lib.stride_tricks.sliding_window_view(present, window).sum(axis=1)
+            if statistic == 'mean':
+                filled = np.where(present, values, 0.0)
+                totals = np.lib.stride_tricks.sliding_window_view(filled, window).sum(axis=1)
+                result = totals / np.maximum(counts, 1)
+            else:
+                filled = np.where(present, values, math.inf if statistic == 'min' else -math.inf)
+                result = getattr(np.lib.stride_tricks.sliding_window_view(filled, window), statistic)(axis=1)
+            return timestamps[window - 1:], np.where(counts > 0, result, math.nan)
+        result = array('d')
+        if statistic == 'mean':
+            total = 0.0
+            count = 0
+            for i, value in enumerate(values):
+                if not math.isnan(value):
+                    total += value
+                    count += 1
+                if i >= window and not math.isnan(values[i - window]):
+                    total -= values[i - window]
+                    count -= 1
+                if i >= window - 1:
+                    result.append(total / count if count else math.nan)
+        else:
+            # monotonic deque of indexes, so each window's min or max is found in amortized O(1)
+            better = (lambda a, b: a <= b) if statistic == 'min' else (lambda a, b: a >= b)
+            candidates = deque()
+            for i, value in enumerate(values):
+                if not math.isnan(value):
+                    while candidates and better(value, values[candidates[-1]]):
+                        candidates.pop()
+                    candidates.append(i)
+                if candidates and candidates[0] <= i - window:
+                    candidates.popleft()
+                if i >= window - 1:
+                    result.append(values[candidates[0]] if candidates else math.nan)
+        return timestamps[window - 1:], result
+
+    def flush(self) -> None:
+        '''Closes the partly filled bucket of every downsampling stage so that it shows up in the stage'''
+        with self._lock:
+            for stage in self._stages:
+                stage.flush()
+
+    def _columns(self, stage: int) -> tuple:
+        with self._lock:
+            buffer = self._buffer(stage)
+            return ['timestamp'] + self.fields, [buffer.timestamps()] + [buffer.column(name) for name in self.fields]
+
+    def export_csv(self, file_path: str, stage: int = 0) -> int:
+        '''Writes the recorded rows to a CSV file with a header row. Missing samples are left empty
+
+        @param file_path(str): the path of the file to write
+        @param stage(int): 0 for the raw samples, 1 onwards for the downsampling stages
+        @return (int): the number of rows written
+        '''
+        names, columns = self._columns(stage)
+        rows = [['' if math.isnan(value) else value for value in row] for row in zip(*columns)]
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(rows)
+        return len(rows)
+
+    def export_binary(self, file_path: str, stage: int = 0) -> int:
+        '''Writes the recorded rows to a compact columnar binary file: a header, the column names, then each
+        column as little-endian doubles. Read it back with load_binary()
+
+        @param file_path(str): the path of the file to write
+        @param stage(int): 0 for the raw samples, 1 onwards for the downsampling stages
+        @return (int): the number of rows written
+        '''
+        names, columns = self._columns(stage)
+        rows = len(columns[0])
+        with open(file_path, 'wb') as f:
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(names), rows))
+            for name in names:
+                encoded = name.encode('utf-8')
+                f.write(struct.pack('<H', len(encoded)) + encoded)
+            for column in columns:
+                if sys.byteorder != 'little':
+                    column = array('d', column)
+                    column.byteswap()
+                column.tofile(f)
+        return rows
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops recording. The recorded data stays available
+
+        @param timeout_secs(float): the max time in seconds to wait for the recorder to stop
+        '''
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout_secs)
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Samples every interval until stopped'''
+        next_due = monotonic()
+        while not self._stop_event.wait(max(0.0, next_due - monotonic())):
+            try:
+                self.sample()
+            except (OSError, Error):
+                self.logger.warning("Telemetry sample failed, retrying", exc_info=True)
+                self._stop_event.wait(ERROR_BACKOFF_SECS)
+            next_due = max(next_due + self._interval, monotonic())
+
+def load_binary(file_path: str) -> dict:
+    '''Reads a file written by TelemetryRecorder.export_binary()
+
+    @param file_path(str): the path of the file to read
+    @return (dict): the columns keyed by name ('timestamp' first), as array.array of doubles
+    '''
+    with open(file_path, 'rb') as f:
+        magic, version, column_count, rows = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError(f"{file_path} is not a pyfldm telemetry file")
+        names = []
+        for _ in range(column_count):
+            length = struct.unpack('<H', f.read(2))[0]
+            names.append(f.read(length).decode('utf-8'))
+        columns = {}
+        for name in names:
+            column = array('d')
+            column.fromfile(f, rows)
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns[name] = column
+    return columns
@@ -0,0 +1,299 @@
+############################################################################
+#
+#  File: txstream.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import io
+import os
+import logging
+import threading
+from time import time, monotonic
+from typing import Callable
+from xmlrpc.client import Binary, Fault
+from .client import Client
+
+DEFAULT_LOOKAHEAD_SECS = 10
+DEFAULT_POLL_INTERVAL_SECS = .5
+DEFAULT_CHARS_PER_SEC = 5.0
+# how long Fldigi has to key up after main.tx() before the stream gives up, e.g. on a PTT or rig error
+DEFAULT_START_TIMEOUT_SECS = 5
+MIN_CHUNK_BYTES = 16
+RATE_SAMPLE_TEXT = 'the quick brown fox jumps over the lazy dog 0123456789'
+RETURN_TO_RX_MACRO = '^r'
+
+class TxStream(threading.Thread):
+    '''Streams a large amount of text to Fldigi for transmission, feeding the TX widget in small chunks
+    rather than all at once. Only a bounded look-ahead (sized from the current modem's character rate) is
+    ever queued in Fldigi, so memory stays constant on both sides regardless of the size of the source.
+    Transmitted data is tracked with text.get_tx_data() and main.get_trx_status(), and the stream runs as
+    a daemon thread on its own xmlrpc connection so the caller's client remains free for control calls.
+
+    @param source(str|bytes|file): the text to send, either as a str/bytes or a readable file-like object (text or binary)
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param lookahead_secs(float): how many seconds worth of characters to keep queued in the TX widget
+    @param poll_interval_secs(float): how often to check on transmit progress
+    @param chars_per_sec(float): [OPTIONAL] the modem character rate, measured from Fldigi if not given
+    @param progress_callback(callable): [OPTIONAL] called as progress_callback(sent_bytes, total_bytes) after each poll, total_bytes is None if unknown
+    @param return_to_rx(bool): True to have Fldigi return to receive once all the text is sent
+    @param encoding(str): the encoding used to convert text sources into bytes
+    @param start_timeout_secs(float): how long to wait for Fldigi to start transmitting before aborting the stream
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.txstream import TxStream
+    >>> stream = TxStream.from_file('/home/me/bulletin.txt')
+    >>> stream.start()
+    >>> stream.wait()
+    True
+    >>> stream.sent_bytes
+    1048576
+    '''
+    def __init__(self,
+                 source,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 lookahead_secs: float = DEFAULT_LOOKAHEAD_SECS,
+                 poll_interval_secs: float = DEFAULT_POLL_INTERVAL_SECS,
+                 chars_per_sec: float = None,
+                 progress_callback: Callable = None,
+                 return_to_rx: bool = True,
+                 encoding: str = 'utf-8',
+                 total_bytes: int = None,
+                 start_timeout_secs: float = DEFAULT_START_TIMEOUT_SECS) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._encoding = encoding
+        self._source = self._wrap_source(source)
+        self._owns_source = False
+        # encoded text from a text source that is not yet sent, so chunks can be sized in bytes
+        self._pending = b''
+        self._lookahead_secs = float(lookahead_secs)
+        self._poll_interval = float(poll_interval_secs)
+        self._start_timeout = float(start_timeout_secs)
+        self._chars_per_sec = chars_per_sec
+        self._progress_callback = progress_callback
+        self._return_to_rx = return_to_rx
+        self._cancel_event = threading.Event()
+        self._exhausted = False
+
+        self.chunk_bytes = MIN_CHUNK_BYTES
+        self.lookahead_bytes = MIN_CHUNK_BYTES
+        self.total_bytes = total_bytes if total_bytes is not None else self._source_length(source)
+        self.queued_bytes = 0
+        self.sent_bytes = 0
+        self.started_at = None
+        self.finished_at = None
+        self.completed = False
+        self.cancelled = False
+        self.error = None
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    @classmethod
+    def from_file(cls, file_path: str, **kwargs) -> 'TxStream':
+        '''Creates a TxStream that reads its text from a file on disk, in binary mode so the file is never
+        fully loaded into memory. The stream owns the file and closes it when it finishes
+
+        @param file_path(str): the path to the file to send
+        @return (TxStream): the (not yet started) stream
+        '''
+        kwargs.setdefault('total_bytes', os.path.getsize(file_path))
+        f = open(file_path, 'rb')
+        try:
+            stream = cls(f, **kwargs)
+        except Exception:
+            f.close()
+            raise
+        stream._owns_source = True
+        return stream
+
+    def _wrap_source(self, source):
+        if isinstance(source, str):
+            return io.BytesIO(source.encode(self._encoding))
+        if isinstance(source, (bytes, bytearray)):
+            return io.BytesIO(bytes(source))
+        if not hasattr(source, 'read'):
+            raise TypeError("source must be a str, bytes or a readable file-like object")
+        return source
+
+    def _source_length(self, source) -> int:
+        if isinstance(source, (str, bytes, bytearray)):
+            # the BytesIO made by _wrap_source, holding the encoded text
+            with self._source.getbuffer() as view:
+                return view.nbytes
+        return None
+
+    def close(self) -> None:
+        '''Closes the source file if the stream opened it (see from_file). Done when the stream finishes, so this
+        is only needed for a stream that is never started'''
+        if self._owns_source:
+            self._owns_source = False
+            self._source.close()
+
+    @property
+    def progress(self) -> float:
+        '''The fraction of the source that has been transmitted, None if the total size is unknown'''
+        if not self.total_bytes:
+            return None
+        return min(1.0, self.sent_bytes / self.total_bytes)
+
+    def _measure_char_rate(self) -> float:
+        '''Measures the current modem's character rate with a single get_tx_timing call on a sample
+        sentence. Falls back on a conservative default if Fldigi cannot provide a timing
+
+        @return (float): the modem's character rate in characters per second
+        '''
+        try:
+            timing = self._client.main.get_tx_timing(RATE_SAMPLE_TEXT)
+            secs = float(str(timing).split(':')[-1])
+            if secs > 0:
+                return len(RATE_SAMPLE_TEXT) / secs
+        except (Fault, ValueError, IndexError):
+            self.logger.debug("Unable to measure the modem char rate from get_tx_timing", exc_info=True)
+        self.logger.warning(f"Could not determine the modem char rate, defaulting to {DEFAULT_CHARS_PER_SEC} chars/sec")
+        return DEFAULT_CHARS_PER_SEC
+
+    def _read_tx_data(self) -> int:
+        '''Gets the data transmitted since the last query
+
+        @return (int): the number of bytes transmitted since the last query
+        '''
+        data = self._client.text.get_tx_data()
+        if isinstance(data, Binary):
+            data = data.data
+        return len(data) if data else 0
+
+    def _next_chunk(self) -> bytes:
+        while len(self._pending) < self.chunk_bytes:
+            data = self._source.read(self.chunk_bytes)
+            if not data:
+                break
+            if isinstance(data, str):
+                # a text source: a character can be several bytes, so top up until a whole chunk is encoded
+                self._pending += data.encode(self._encoding)
+            elif not self._pending:
+                return data
+            else:
+                self._pending += data
+        chunk, self._pending = self._pending[:self.chunk_bytes], self._pending[self.chunk_bytes:]
+        if not chunk:
+            self._exhausted = True
+        return chunk
+
+    def _fill(self) -> None:
+        '''Tops up the TX widget until the look-ahead is full or the source is exhausted'''
+        while (not self._exhausted) and (self.queued_bytes - self.sent_bytes) < self.lookahead_bytes:
+            chunk = self._next_chunk()
+            if not chunk:
+                if self._return_to_rx:
+                    self._client.text.add_tx(RETURN_TO_RX_MACRO)
+                break
+            self._client.text.add_tx_bytes(chunk)
+            self.queued_bytes += len(chunk)
+
+    def _report_progress(self) -> None:
+        if self._progress_callback is None:
+            return
+        try:
+            self._progress_callback(self.sent_bytes, self.total_bytes)
+        except Exception:
+            self.logger.exception("TxStream progress callback raised an exception")
+
+    def cancel(self) -> None:
+        '''Cancels the transmission. The stream aborts the transmit via main.abort() and clears any text
+        still queued in the TX widget'''
+        self._cancel_event.set()
+
+    def wait(self, timeout_secs: float = None) -> bool:
+        '''Waits for the stream to finish
+
+        @param timeout_secs(float): the max time in seconds to wait, None to wait indefinitely
+        @return (bool): True if all the text was transmitted
+        '''
+        self.join(timeout_secs)
+        return self.completed
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Feeds the TX widget and tracks transmit progress until the
+        source is fully sent, the stream is cancelled, or Fldigi stops transmitting on its own'''
+        try:
+            self._stream()
+        except Exception as e:
+            self.error = e
+            self.logger.exception("TxStream stopped due to an error")
+            try:
+                self._client.main.abort()
+            except Exception:
+                pass
+        finally:
+            self.close()
+            self.finished_at = time()
+
+    def _stream(self) -> None:
+        if self._chars_per_sec is None:
+            self._chars_per_sec = self._measure_char_rate()
+        self.chunk_bytes = max(MIN_CHUNK_BYTES, int(self._chars_per_sec * self._poll_interval * 2))
+        self.lookahead_bytes = max(self.chunk_bytes, int(self._chars_per_sec * self._lookahead_secs))
+        self.logger.debug(f"Streaming TX at ~{self._chars_per_sec:.1f} chars/sec, chunk {self.chunk_bytes} bytes, look-ahead {self.lookahead_bytes} bytes")
+
+        # discard anything left over from a previous transmission so the byte count starts clean
+        self._read_tx_data()
+        self.started_at = time()
+        self._fill()
+        self._client.main.tx()
+        transmitting = False
+        start_deadline = monotonic() + self._start_timeout
+
+        while not self._cancel_event.wait(self._poll_interval):
+            self.sent_bytes += self._read_tx_data()
+            status = self._client.main.get_trx_status()
+            if status in ['tx', 'tune']:
+                transmitting = True
+            elif transmitting:
+                # back in receive, either because everything was sent or something else stopped the transmit
+                self.sent_bytes = min(self.sent_bytes, self.queued_bytes)
+                self._report_progress()
+                if self._exhausted:
+                    self.completed = True
+                    self.logger.info(f"TxStream finished, sent {self.sent_bytes} bytes in {time() - self.started_at:.1f} secs")
+                else:
+                    self.logger.warning(f"Fldigi stopped transmitting before the stream finished ({self.sent_bytes}/{self.queued_bytes} bytes sent)")
+                return
+            elif monotonic() >= start_deadline:
+                # never keyed up, e.g. a PTT or rig error, so don't leave the text queued to go out later
+                self.error = TimeoutError(f"Fldigi did not start transmitting within {self._start_timeout} secs")
+                self.logger.warning(f"TxStream aborted, {self.error}")
+                self._client.main.abort()
+                self._client.text.clear_tx()
+                return
+            self._fill()
+            self._report_progress()
+            if self._exhausted and (not self._return_to_rx) and self.sent_bytes >= self.queued_bytes:
+                # left in transmit as requested, nothing more to send
+                self.completed = True
+                return
+
+        self.cancelled = True
+        self._client.main.abort()
+        self._client.text.clear_tx()
+        self.logger.info(f"TxStream cancelled after sending {self.sent_bytes} bytes")
@@ -0,0 +1,242 @@
+############################################################################
+#
+#  File: txtiming.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import string
+import logging
+from collections import Counter
+from xmlrpc.client import Fault
+from .client import Client
+
+DEFAULT_CHARSET = string.ascii_letters + string.digits + string.punctuation + ' \n'
+CALIBRATION_TEXT = 'CQ CQ CQ de pyfldm pyfldm k'
+DEFAULT_VERIFY_EVERY = 100
+DEFAULT_DRIFT_TOLERANCE = .05
+
+def parse_timing(timing: str) -> float:
+    '''Converts a Fldigi timing response ("samples:sample rate" or "samples:sample rate:secs") into seconds
+
+    @param timing(str): the timing response from main.get_char_timing or main.get_tx_timing
+    @return (float): the duration in seconds
+    '''
+    parts = str(timing).split(':')
+    samples = float(parts[0])
+    sample_rate = float(parts[1])
+    if sample_rate <= 0:
+        raise ValueError(f"Invalid sample rate in timing response: {timing}")
+    return samples / sample_rate
+
+class ModemTiming:
+    '''The per-character transmit durations for a single modem, as measured from Fldigi
+
+    @param name(str): the modem name
+    @param modem_id(int): the modem id
+    @param char_secs(dict): the transmit duration in seconds of each sampled character
+    @param overhead_secs(float): the fixed per-message overhead (preamble/postamble) in seconds
+    '''
+    __slots__ = ('name', 'modem_id', 'char_secs', 'overhead_secs', 'default_secs')
+
+    def __init__(self, name: str, modem_id: int, char_secs: dict, overhead_secs: float = 0.0) -> None:
+        self.name = name
+        self.modem_id = modem_id
+        self.char_secs = char_secs
+        self.overhead_secs = overhead_secs
+        self.default_secs = (sum(char_secs.values()) / len(char_secs)) if char_secs else 0.0
+
+    def __repr__(self) -> str:
+        return f'ModemTiming({self.name!r}, {self.modem_id}, {len(self.char_secs)} chars)'
+
+    def estimate(self, text: str) -> float:
+        '''Estimates the transmit duration of a string. Characters that were never sampled are
+        estimated with the average character duration
+
+        @param text(str): the text to estimate
+        @return (float): the estimated transmit duration in seconds
+        '''
+        if not text:
+            return 0.0
+        char_secs = self.char_secs
+        default = self.default_secs
+        total = self.overhead_secs
+        for char, count in Counter(text).items():
+            total += char_secs.get(char, default) * count
+        return total
+
+class TxTimingModel:
+    '''A client-side model of how long text takes to transmit with each modem. The model is built from
+    main.get_char_timing() samples the first time a modem is used and cached per modem name and id, after
+    which estimates are made locally with no round trip to Fldigi. Every verify_every estimates the model
+    checks itself against main.get_tx_timing() and rebuilds the modem's timings if they have drifted.
+
+    @param client(Client): the pyfldm client used to query Fldigi
+    @param charset(str): the characters to sample when building a modem's timings
+    @param verify_every(int): how many estimates between checks against the server, 0 to disable
+    @param drift_tolerance(float): the relative error allowed before the modem timings are rebuilt
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.client import Client
+    >>> from pyfldm.txtiming import TxTimingModel
+    >>> model = TxTimingModel(Client())
+    >>> model.estimate('CQ CQ CQ de N0CALL N0CALL k')
+    8.192
+    '''
+    def __init__(self,
+                 client: Client,
+                 charset: str = DEFAULT_CHARSET,
+                 verify_every: int = DEFAULT_VERIFY_EVERY,
+                 drift_tolerance: float = DEFAULT_DRIFT_TOLERANCE) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._client = client
+        self._charset = charset
+        self._verify_every = int(verify_every)
+        self._drift_tolerance = float(drift_tolerance)
+        self._cache = {}
+        self._current = None
+        self._estimates_since_verify = 0
+        self.drift_events = 0
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def refresh(self) -> tuple:
+        '''Re-reads the current modem from Fldigi. Call this after changing modems so that estimates
+        without an explicit modem use the right timings
+
+        @return (tuple): the (name, id) of the current modem
+        '''
+        self._current = (self._client.modem.get_name(), self._client.modem.get_id())
+        return self._current
+
+    def _sample_char(self, char: str) -> float:
+        return parse_timing(self._client.main.get_char_timing(char))
+
+    def _build(self, key: tuple) -> ModemTiming:
+        '''Samples every character in the charset for the current modem in Fldigi'''
+        name, modem_id = key
+        # the samples come from whatever modem is live, so never cache them under another modem's key
+        live = self.refresh()
+        if live != key:
+            raise ValueError(f"Cannot build TX timings for {name} ({modem_id}), the modem in Fldigi is {live[0]} ({live[1]}). "
+                             f"Select the modem in Fldigi first")
+        self.logger.debug(f"Building TX timing model for {name} ({len(self._charset)} characters)")
+        char_secs = {}
+        for char in self._charset:
+            try:
+                char_secs[char] = self._sample_char(char)
+            except (Fault, ValueError, IndexError):
+                self.logger.debug(f"No char timing available for {char!r} in {name}", exc_info=True)
+        timing = ModemTiming(name, modem_id, char_secs)
+        try:
+            server_secs = self._server_estimate(CALIBRATION_TEXT)
+            timing.overhead_secs = max(0.0, server_secs - timing.estimate(CALIBRATION_TEXT))
+        except (Fault, ValueError, IndexError):
+            self.logger.debug(f"Unable to calibrate message overhead for {name}", exc_info=True)
+        return timing
+
+    def _server_estimate(self, text: str) -> float:
+        response = str(self._client.main.get_tx_timing(text))
+        return float(response.split(':')[-1])
+
+    @staticmethod
+    def _key(modem_name: str, modem_id: int) -> tuple:
+        if modem_name is not None and modem_id is None:
+            raise ValueError("modem_id is required when modem_name is given")
+        return (modem_name, int(modem_id)) if modem_name is not None else None
+
+    def get_timing(self, modem_name: str = None, modem_id: int = None) -> ModemTiming:
+        '''Gets the cached timings for a modem, building them if needed. The modem must be the one
+        currently selected in Fldigi when the timings are first built
+
+        @param modem_name(str): [OPTIONAL] the modem name, defaults to the current modem
+        @param modem_id(int): [OPTIONAL] the modem id, required with modem_name
+        @return (ModemTiming): the modem's timings
+        @raises ValueError: if only the modem name is given, or the timings need building and the modem is not the one in Fldigi
+        '''
+        key = self._key(modem_name, modem_id)
+        if key is None:
+            key = self._current or self.refresh()
+            if key not in self._cache:
+                # the remembered modem may be stale, build for the one that is actually live
+                key = self.refresh()
+        timing = self._cache.get(key)
+        if timing is None:
+            timing = self._build(key)
+            self._cache[key] = timing
+        return timing
+
+    def estimate(self, text: str, modem_name: str = None, modem_id: int = None) -> float:
+        '''Estimates how long a string will take to transmit, locally
+
+        @param text(str): the text to estimate
+        @param modem_name(str): [OPTIONAL] the modem name, defaults to the current modem
+        @param modem_id(int): [OPTIONAL] the modem id, required with modem_name
+        @return (float): the estimated transmit duration in seconds
+        '''
+        timing = self.get_timing(modem_name, modem_id)
+        secs = timing.estimate(text)
+        if self._verify_every:
+            self._estimates_since_verify += 1
+            if self._estimates_since_verify >= self._verify_every:
+                self._estimates_since_verify = 0
+                self.verify(text, timing)
+        return secs
+
+    def verify(self, text: str, timing: ModemTiming = None) -> float:
+        '''Checks the model against main.get_tx_timing(). If the relative error is over the drift
+        tolerance the modem's timings are discarded and rebuilt on next use. Timings for a modem that
+        is no longer the one in Fldigi are left alone, since the server can only time the live modem
+
+        @param text(str): the text to check with
+        @param timing(ModemTiming): [OPTIONAL] the timings to check, defaults to the current modem
+        @return (float): the relative error between the local and server estimates
+        '''
+        timing = timing or self.get_timing()
+        live = self.refresh()
+        if live != (timing.name, timing.modem_id):
+            self.logger.debug(f"Skipping TX timing check for {timing.name}, the modem in Fldigi is now {live[0]}")
+            return 0.0
+        try:
+            server_secs = self._server_estimate(text)
+        except (Fault, ValueError, IndexError):
+            self.logger.debug("Unable to verify TX timing model against Fldigi", exc_info=True)
+            return 0.0
+        if server_secs <= 0:
+            return 0.0
+        error = abs(timing.estimate(text) - server_secs) / server_secs
+        if error > self._drift_tolerance:
+            self.drift_events += 1
+            self.logger.warning(f"TX timing model for {timing.name} drifted by {error:.1%}, rebuilding")
+            self.invalidate(timing.name, timing.modem_id)
+        return error
+
+    def invalidate(self, modem_name: str = None, modem_id: int = None) -> None:
+        '''Discards cached timings, for one modem or for all modems if none is given
+
+        @param modem_name(str): [OPTIONAL] the modem name
+        @param modem_id(int): [OPTIONAL] the modem id, required with modem_name
+        '''
+        key = self._key(modem_name, modem_id)
+        if key is None:
+            self._cache.clear()
+            self._current = None
+        else:
+            self._cache.pop(key, None)
@@ -0,0 +1,425 @@
+############################################################################
+#
+#  File: watcher.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import heapq
+import asyncio
+import itertools
+import logging
+import threading
+from time import time, monotonic
+from typing import Any, Callable, NamedTuple
+from xmlrpc.client import Error, Fault
+from .client import Client
+from .submodules.snapshot import SNAPSHOT_FIELDS
+
+DEFAULT_INTERVAL_SECS = 1.0
+DEFAULT_BACKOFF = 2.0
+DEFAULT_ACTIVITY_INTERVAL_SECS = .5
+ACTIVE_TRX_STATUSES = ['tx', 'tune']
+# internal polls used to detect activity, not reported to subscribers
+ACTIVITY_PROBES = {
+    '_trx_status': ('main.get_trx_status', str),
+    '_rx_length': ('text.get_rx_length', int),
+}
+# polls due within this window of each other are sent in the same batch
+COALESCE_WINDOW_SECS = .02
+ERROR_BACKOFF_SECS = 2
+
+class StateChange(NamedTuple):
+    '''An event emitted by StateWatcher when a watched value changes'''
+    name: str
+    old: Any
+    new: Any
+    timestamp: float
+
+class _Watch:
+    '''The polling and change detection state of a single watched value'''
+    __slots__ = ('name', 'method', 'convert', 'interval', 'min_interval', 'max_interval', 'backoff',
+                 'deadband', 'debounce', 'next_due', 'value', 'initialized', 'changed', 'candidate',
+                 'candidate_since', 'internal')
+
+    def __init__(self, name, method, convert, interval, deadband, debounce,
+                 max_interval=None, backoff=DEFAULT_BACKOFF, internal=False) -> None:
+        self.name = name
+        self.method = method
+        self.convert = convert
+        self.interval = interval
+        self.min_interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.deadband = deadband
+        self.debounce = debounce
+        self.next_due = 0.0
+        self.value = None
+        self.initialized = False
+        self.changed = False
+        self.candidate = None
+        self.candidate_since = None
+        self.internal = internal
+
+    @property
+    def adaptive(self) -> bool:
+        return self.max_interval is not None
+
+    def adapt(self, active: bool) -> None:
+        '''Polls at the fastest rate after a change or while the station is active, otherwise backs off'''
+        if not self.adaptive:
+            return
+        if self.changed or active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+
+    def _outside_deadband(self, new, reference) -> bool:
+        if self.deadband is not None and new is not None and reference is not None:
+            return abs(new - reference) > self.deadband
+        return new != reference
+
+    def _differs(self, new) -> bool:
+        return self._outside_deadband(new, self.value)
+
+    def update(self, new, now: float) -> bool:
+        '''Applies a newly polled value
+
+        @return (bool): True if the value should be reported as changed
+        '''
+        if not self.initialized:
+            self.initialized = True
+            self.value = new
+            self.changed = False
+            return False
+        self.changed = self._differs(new)
+        if not self.changed:
+            self.candidate_since = None
+            return False
+        if not self.debounce:
+            return True
+        # the new value has to hold (within the deadband, if any) for the debounce time before it is reported
+        if self.candidate_since is None or self._outside_deadband(new, self.candidate):
+            self.candidate = new
+            self.candidate_since = now
+            return False
+        return (now - self.candidate_since) >= self.debounce
+
+class StateWatcher(threading.Thread):
+    '''Watches Fldigi state for changes. Each watched value is polled at its own rate, and a single scheduler
+    sends all the polls that are due at the same time in one batched round trip. An event is emitted only when a
+    value actually changes, with optional deadband (for noisy numbers like modem quality) and debounce. Events
+    can be received through callbacks or asyncio queues. Runs as a daemon thread on its own xmlrpc connection.
+
+    Watches given a max_interval_secs are adaptive: they poll at interval_secs after a change or while the station
+    is active (transmitting, tuning or receiving text), and back off exponentially towards max_interval_secs while
+    nothing changes. An optional RPC budget caps the polls per second across all watches.
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param rpc_budget(float): [OPTIONAL] the max number of getter calls per second shared by all watches
+    @param activity_interval_secs(float): how often to check for station activity when there are adaptive watches
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.watcher import StateWatcher
+    >>> watcher = StateWatcher()
+    >>> watcher.watch('trx_status', interval_secs=.25)
+    >>> watcher.watch('frequency', interval_secs=1)
+    >>> watcher.watch('quality', interval_secs=.5, deadband=5, debounce_secs=1)
+    >>> watcher.watch('carrier', interval_secs=.25, max_interval_secs=8)
+    >>> watcher.subscribe(print, names=['trx_status'])
+    >>> watcher.start()
+    StateChange(name='trx_status', old='rx', new='tx', timestamp=1700000000.1)
+    >>> watcher.effective_rates()
+    {'trx_status': 4.0, 'frequency': 1.0, 'quality': 2.0, 'carrier': 4.0, '_trx_status': 2.0, '_rx_length': 2.0}
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 rpc_budget: float = None,
+                 activity_interval_secs: float = DEFAULT_ACTIVITY_INTERVAL_SECS) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._watches = {}
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._rpc_budget = float(rpc_budget) if rpc_budget else None
+        self._tokens = self._rpc_budget or 0.0
+        self._tokens_updated = monotonic()
+        self._activity_interval = float(activity_interval_secs)
+        self.active = False
+        self.batches_sent = 0
+        self.calls_sent = 0
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def watch(self,
+              name: str,
+              interval_secs: float = DEFAULT_INTERVAL_SECS,
+              method: str = None,
+              convert: Callable = None,
+              deadband: float = None,
+              debounce_secs: float = None,
+              max_interval_secs: float = None,
+              backoff: float = DEFAULT_BACKOFF) -> None:
+        '''Starts watching a value. Snapshot field names (see pyfldm.submodules.snapshot.SNAPSHOT_FIELDS) need only
+        the name, anything else needs the xmlrpc method to poll
+
+        @param name(str): the name of the value, used in the emitted events
+        @param interval_secs(float): how often to poll the value (the fastest rate for adaptive watches)
+        @param method(str): [OPTIONAL] the xmlrpc getter to poll, e.g. 'modem.get_quality'
+        @param convert(callable): [OPTIONAL] a conversion applied to each polled result
+        @param deadband(float): [OPTIONAL] for numeric values, the smallest change that is reported
+        @param debounce_secs(float): [OPTIONAL] how long a new value must hold before it is reported
+        @param max_interval_secs(float): [OPTIONAL] makes the watch adaptive, backing off to this interval when idle
+        @param backoff(float): the factor the interval grows by after each poll with no change
+        '''
+        if name in ACTIVITY_PROBES:
+            raise ValueError(f"{name!r} is reserved for activity detection")
+        if method is None:
+            if name not in SNAPSHOT_FIELDS:
+                raise ValueError(f"Unknown field {name!r}, pass the xmlrpc method to poll. Known fields: {', '.join(SNAPSHOT_FIELDS)}")
+            method, default_convert = SNAPSHOT_FIELDS[name]
+            convert = convert or default_convert
+        if max_interval_secs is not None and max_interval_secs < interval_secs:
+            raise ValueError("max_interval_secs must be at least interval_secs")
+        entry = _Watch(name, method, convert, float(interval_secs), deadband, debounce_secs,
+                       max_interval_secs, float(backoff))
+        with self._lock:
+            self._watches[name] = entry
+            self._push(entry)
+            if entry.adaptive:
+                self._add_activity_probes()
+        self._wake.set()
+
+    def _push(self, entry: _Watch) -> None:
+        heapq.heappush(self._schedule, (entry.next_due, next(self._sequence), entry))
+
+    def _add_activity_probes(self) -> None:
+        for name, (method, convert) in ACTIVITY_PROBES.items():
+            if name not in self._watches:
+                entry = _Watch(name, method, convert, self._activity_interval, None, None, internal=True)
+                self._watches[name] = entry
+                self._push(entry)
+
+    def effective_rates(self) -> dict:
+        '''Gets the current polling rate of every watch, including the internal activity checks. If the watches
+        together want more calls than the RPC budget allows, the rates are scaled down to fit the budget
+
+        @return (dict): the polling rate in polls per second, keyed by watch name
+        '''
+        with self._lock:
+            rates = {name: 1.0 / entry.interval for name, entry in self._watches.items()}
+        demand = sum(rates.values())
+        if self._rpc_budget and demand > self._rpc_budget:
+            scale = self._rpc_budget / demand
+            rates = {name: rate * scale for name, rate in rates.items()}
+        return rates
+
+    def unwatch(self, name: str) -> None:
+        '''Stops watching a value. The internal activity checks stop too once no adaptive watches are left
+
+        @param name(str): the name of the value
+        '''
+        if name in ACTIVITY_PROBES:
+            return
+        with self._lock:
+            self._watches.pop(name, None)
+            if not any(entry.adaptive for entry in self._watches.values()):
+                for probe in ACTIVITY_PROBES:
+                    self._watches.pop(probe, None)
+                self.active = False
+
+    def value(self, name: str):
+        '''Gets the last reported value of a watched value
+
+        @param name(str): the name of the value
+        @return (Any): the value, None if not yet polled
+        '''
+        entry = self._watches.get(name)
+        return entry.value if entry else None
+
+    def subscribe(self, callback: Callable, names: list = None) -> Callable:
+        '''Calls a function with a StateChange for every change. Callbacks run on the watcher thread, so they
+        should return quickly
+
+        @param callback(callable): called as callback(event)
+        @param names(list[str]): [OPTIONAL] only report changes to these values
+        @return (callable): the callback, for use with unsubscribe()
+        '''
+        with self._lock:
+            self._subscribers.append((callback, set(names) if names else None))
+        return callback
+
+    def unsubscribe(self, callback: Callable) -> None:
+        '''Stops calling a subscribed function
+
+        @param callback(callable): the callback passed to subscribe()
+        '''
+        with self._lock:
+            self._subscribers = [(cb, names) for cb, names in self._subscribers if cb is not callback]
+
+    def subscribe_async(self, names: list = None, loop: asyncio.AbstractEventLoop = None) -> asyncio.Queue:
+        '''Delivers changes to an asyncio queue. Must be called from the event loop's thread unless the loop
+        is given
+
+        @param names(list[str]): [OPTIONAL] only report changes to these values
+        @param loop(asyncio.AbstractEventLoop): [OPTIONAL] the event loop, defaults to the running loop
+        @return (asyncio.Queue): the queue events will be put on
+        '''
+        loop = loop or asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def deliver(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        self.subscribe(deliver, names)
+        return events
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops watching
+
+        @param timeout_secs(float): the max time in seconds to wait for the watcher to stop
+        '''
+        self._stop_event.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(timeout_secs)
+
+    def _update_activity(self, now: float) -> None:
+        '''Works out whether the station is busy from the internal probes, and speeds up every adaptive watch
+        as soon as it becomes busy'''
+        trx = self._watches.get('_trx_status')
+        rx = self._watches.get('_rx_length')
+        if trx is None or rx is None:
+            return
+        active = (trx.value in ACTIVE_TRX_STATUSES) or rx.changed
+        if active and not self.active:
+            self.logger.debug("Station activity detected, polling at the fastest rates")
+            with self._lock:
+                for entry in self._watches.values():
+                    if entry.adaptive:
+                        entry.interval = entry.min_interval
+                        if entry.next_due > now + entry.interval:
+                            entry.next_due = now + entry.interval
+                            self._push(entry)
+        self.active = active
+
+    def _emit(self, event: StateChange) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, names in subscribers:
+            if names is None or event.name in names:
+                try:
+                    callback(event)
+                except Exception:
+                    self.logger.exception("StateWatcher subscriber raised an exception")
+
+    def _due(self, now: float) -> list:
+        '''Pops every watch due within the coalescing window'''
+        due = []
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now + COALESCE_WINDOW_SECS:
+                due_time, _, entry = heapq.heappop(self._schedule)
+                # skip watches that were removed, replaced or rescheduled since this entry was pushed
+                if self._watches.get(entry.name) is entry and due_time == entry.next_due:
+                    due.append(entry)
+        return due
+
+    def _refill_tokens(self, now: float) -> None:
+        elapsed = now - self._tokens_updated
+        self._tokens_updated = now
+        self._tokens = min(self._rpc_budget, self._tokens + elapsed * self._rpc_budget)
+
+    def _apply_budget(self, due: list, now: float) -> list:
+        '''Trims a batch to the calls the RPC budget allows right now, leaving the rest scheduled as due'''
+        if not self._rpc_budget:
+            return due
+        self._refill_tokens(now)
+        allowed = min(len(due), int(self._tokens))
+        if allowed < len(due):
+            with self._lock:
+                for entry in due[allowed:]:
+                    self._push(entry)
+        self._tokens -= allowed
+        return due[:allowed]
+
+    def _reschedule(self, entries: list, now: float) -> None:
+        with self._lock:
+            for entry in entries:
+                if self._watches.get(entry.name) is not entry:
+                    continue
+                entry.adapt(self.active)
+                entry.next_due = max(entry.next_due + entry.interval, now)
+                self._push(entry)
+
+    def _poll(self, entries: list) -> None:
+        results = self._client.batch([(entry.method, ()) for entry in entries], raise_faults=False)
+        self.batches_sent += 1
+        self.calls_sent += len(entries)
+        now = monotonic()
+        timestamp = time()
+        for entry, result in zip(entries, results):
+            if isinstance(result, Fault):
+                self.logger.debug(f"Polling {entry.method} failed: {result.faultString}")
+                continue
+            new = entry.convert(result) if entry.convert else result
+            if entry.update(new, now):
+                old = entry.value
+                entry.value = new
+                entry.candidate_since = None
+                if not entry.internal:
+                    self._emit(StateChange(entry.name, old, new, timestamp))
+        self._update_activity(now)
+
+    def _wait_time(self) -> float:
+        with self._lock:
+            if not self._schedule:
+                return None
+            wait = max(0.0, self._schedule[0][0] - monotonic())
+        if self._rpc_budget and self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / self._rpc_budget)
+        return wait
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Polls the watched values as they fall due until stopped'''
+        while not self._stop_event.is_set():
+            self._wake.wait(self._wait_time())
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            self._tick(monotonic())
+
+    def _tick(self, now: float) -> None:
+        '''Polls every watch that is due, as far as the RPC budget allows, and schedules their next polls'''
+        due = self._apply_budget(self._due(now), now)
+        if not due:
+            return
+        try:
+            self._poll(due)
+        except (OSError, Error):
+            self.logger.warning("StateWatcher poll failed, retrying", exc_info=True)
+            self._stop_event.wait(ERROR_BACKOFF_SECS)
+        self._reschedule(due, monotonic())
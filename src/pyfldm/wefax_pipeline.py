@@ -0,0 +1,312 @@
+############################################################################
+#
+#  File: wefax_pipeline.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import time, perf_counter
+from xmlrpc.client import Error
+from .client import Client
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+DEFAULT_POLL_DELAY_SECS = 10
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 100
+DEFAULT_THUMBNAIL_SIZE = 256
+DEFAULT_CROP_MIN_STD = 8.0
+ERROR_BACKOFF_SECS = 2
+QUEUE_PUT_TIMEOUT_SECS = .5
+
+def _require_image_support() -> None:
+    if np is None or Image is None:
+        raise ModuleNotFoundError("WEFAX image processing requires numpy and Pillow. Install them with: pip install pyfldm[wefax]")
+
+def correct_slant(image, slant: float):
+    '''Removes slant caused by a small sample rate mismatch by shifting each line back by slant pixels per line
+
+    @param image(numpy.ndarray): the grayscale image, one row per fax line
+    @param slant(float): the horizontal drift in pixels per line
+    @return (numpy.ndarray): the corrected image
+    '''
+    height, width = image.shape
+    shifts = np.rint(np.arange(height) * slant).astype(np.int64)
+    columns = (np.arange(width)[None, :] + shifts[:, None]) % width
+    return image[np.arange(height)[:, None], columns]
+
+def denoise(image):
+    '''Removes speckle noise with a 3x3 median filter
+
+    @param image(numpy.ndarray): the grayscale image
+    @return (numpy.ndarray): the filtered image
+    '''
+    height, width = image.shape
+    padded = np.pad(image, 1, mode='edge')
+    neighbours = np.stack([padded[row:row + height, col:col + width] for row in range(3) for col in range(3)])
+    return np.median(neighbours, axis=0).astype(image.dtype)
+
+def crop(image, min_std: float = DEFAULT_CROP_MIN_STD):
+    '''Trims blank borders, where rows and columns have (almost) no variation
+
+    @param image(numpy.ndarray): the grayscale image
+    @param min_std(float): the standard deviation below which a row or column is considered blank
+    @return (numpy.ndarray): the cropped image
+    '''
+    rows = np.flatnonzero(image.std(axis=1) >= min_std)
+    columns = np.flatnonzero(image.std(axis=0) >= min_std)
+    if rows.size == 0 or columns.size == 0:
+        return image
+    return image[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+
+def thumbnail(image, max_size: int = DEFAULT_THUMBNAIL_SIZE):
+    '''Shrinks an image by block averaging so that its largest side is at most max_size
+
+    @param image(numpy.ndarray): the grayscale image
+    @param max_size(int): the max width or height of the thumbnail
+    @return (numpy.ndarray): the thumbnail
+    '''
+    height, width = image.shape
+    factor = max(1, -(-max(height, width) // max_size))
+    height, width = (height // factor) * factor, (width // factor) * factor
+    if height == 0 or width == 0:
+        return image
+    blocks = image[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(1, 3)).astype(np.uint8)
+
+def process_wefax_image(file_path: str,
+                        output_dir: str = None,
+                        slant: float = 0.0,
+                        denoise_image: bool = True,
+                        crop_image: bool = True,
+                        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE) -> dict:
+    '''Runs the post-processing steps on a received fax image and saves the results. This runs in the
+    pipeline's worker processes, but can also be called directly
+
+    @param file_path(str): the path to the received image
+    @param output_dir(str): [OPTIONAL] where to save the processed image and thumbnail, defaults to the image's directory
+    @param slant(float): the slant to remove in pixels per line, 0 to skip
+    @param denoise_image(bool): True to apply the median filter
+    @param crop_image(bool): True to trim blank borders
+    @param thumbnail_size(int): the max size of the thumbnail, 0 to skip
+    @return (dict): the output paths, image shape and the time in seconds spent on each step
+    '''
+    _require_image_support()
+    timings = {}
+    start = perf_counter()
+    mark = start
+
+    def lap(step):
+        nonlocal mark
+        now = perf_counter()
+        timings[step] = now - mark
+        mark = now
+
+    with Image.open(file_path) as source:
+        image = np.asarray(source.convert('L'))
+    lap('load')
+    if slant:
+        image = correct_slant(image, slant)
+        lap('slant')
+    if denoise_image:
+        image = denoise(image)
+        lap('denoise')
+    if crop_image:
+        image = crop(image)
+        lap('crop')
+
+    output_dir = output_dir or os.path.dirname(os.path.abspath(file_path))
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    output_path = os.path.join(output_dir, f'{base_name}-processed.png')
+    Image.fromarray(image).save(output_path)
+    thumbnail_path = None
+    if thumbnail_size:
+        thumbnail_path = os.path.join(output_dir, f'{base_name}-thumb.png')
+        Image.fromarray(thumbnail(image, thumbnail_size)).save(thumbnail_path)
+    lap('save')
+    timings['total'] = perf_counter() - start
+    return {
+        'source': file_path,
+        'output': output_path,
+        'thumbnail': thumbnail_path,
+        'shape': image.shape,
+        'timings': timings,
+    }
+
+class WefaxPipeline(threading.Thread):
+    '''Receives WEFAX images and post-processes them in a process pool so that slow image processing never
+    holds up reception. A daemon thread long-polls wefax.get_received_file() on its own xmlrpc connection and
+    puts each file on a bounded queue; images are handed to the process pool as workers free up, and the results
+    (with per-step and end-to-end timings) are published to subscriber queues. When the queue is full the
+    receiving thread waits, which bounds the memory used during schedule bursts.
+
+    Requires numpy and Pillow (pip install pyfldm[wefax])
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param output_dir(str): [OPTIONAL] where to save processed images, defaults to each image's directory
+    @param workers(int): [OPTIONAL] the number of worker processes, defaults to the number of CPUs
+    @param queue_size(int): the max number of received images waiting to be processed
+    @param poll_delay_secs(int): the max delay passed to each wefax.get_received_file() long-poll
+    @param options(dict): [OPTIONAL] keyword arguments passed on to process_wefax_image (slant, denoise_image, ...)
+
+    Example use:
+    # * assuming that Fldigi is already running
+    >>> from pyfldm.wefax_pipeline import WefaxPipeline
+    >>> pipeline = WefaxPipeline(output_dir='/home/me/charts', options={'slant': 0.02})
+    >>> results = pipeline.subscribe()
+    >>> pipeline.start()
+    >>> result = results.get()
+    >>> result['thumbnail'], result['timings']['total']
+    ('/home/me/charts/gale-thumb.png', 0.41)
+    >>> pipeline.stop()
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 output_dir: str = None,
+                 workers: int = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 poll_delay_secs: int = DEFAULT_POLL_DELAY_SECS,
+                 options: dict = None) -> None:
+        _require_image_support()
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._output_dir = output_dir
+        self._workers = workers or os.cpu_count() or 1
+        self._poll_delay = int(poll_delay_secs)
+        self._options = dict(options or {})
+        self._queue = queue.Queue(int(queue_size))
+        self._in_flight = threading.BoundedSemaphore(self._workers)
+        self._executor = None
+        self._dispatcher = None
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.received_count = 0
+        self.processed_count = 0
+        self.failed_count = 0
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def subscribe(self, maxsize: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE) -> queue.Queue:
+        '''Creates a queue that receives the result dict of every processed image. Failed images are published
+        with an 'error' entry instead of the output paths
+
+        @param maxsize(int): the max number of results held for this subscriber, 0 for no limit
+        @return (queue.Queue): the queue results will be put on
+        '''
+        subscriber = queue.Queue(maxsize)
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def _publish(self, result: dict) -> None:
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(result)
+            except queue.Full:
+                self.logger.warning("WEFAX result subscriber is full, dropping result")
+
+    def submit(self, file_path: str) -> bool:
+        '''Queues an image for processing, waiting while the queue is full
+
+        @param file_path(str): the path to the image
+        @return (bool): True if queued, False if the pipeline was stopped first
+        '''
+        item = (file_path, time())
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=QUEUE_PUT_TIMEOUT_SECS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _on_done(self, file_path: str, received: float, submitted: float, future) -> None:
+        self._in_flight.release()
+        try:
+            result = future.result()
+            self.processed_count += 1
+        except Exception as e:
+            self.failed_count += 1
+            self.logger.error(f"WEFAX processing failed for {file_path}: {e}")
+            result = {'source': file_path, 'error': e, 'timings': {}}
+        result['timings']['queue_wait'] = submitted - received
+        result['timings']['latency'] = time() - received
+        self._publish(result)
+
+    def _dispatch(self) -> None:
+        '''Hands queued images to the process pool as workers become free'''
+        while True:
+            try:
+                item = self._queue.get(timeout=QUEUE_PUT_TIMEOUT_SECS)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                continue
+            file_path, received = item
+            self._in_flight.acquire()
+            future = self._executor.submit(process_wefax_image, file_path, self._output_dir, **self._options)
+            submitted = time()
+            future.add_done_callback(lambda f, p=file_path, r=received, s=submitted: self._on_done(p, r, s, f))
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops receiving, finishes processing the queued images and shuts down the process pool
+
+        @param timeout_secs(float): the max time in seconds to wait for the receiving thread to stop
+        '''
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout_secs)
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Long-polls for received images until stopped'''
+        self._executor = ProcessPoolExecutor(max_workers=self._workers)
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        while not self._stop_event.is_set():
+            try:
+                file_path = self._client.wefax.get_received_file(self._poll_delay)
+            except (OSError, Error):
+                self.logger.warning("WEFAX long-poll failed, retrying", exc_info=True)
+                self._stop_event.wait(ERROR_BACKOFF_SECS)
+                continue
+            if file_path:
+                self.received_count += 1
+                self.logger.debug(f"Received WEFAX image {file_path}")
+                self.submit(file_path)
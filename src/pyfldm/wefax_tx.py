@@ -0,0 +1,328 @@
+############################################################################
+#
+#  File: wefax_tx.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import heapq
+import struct
+import logging
+import itertools
+import threading
+from time import time
+from collections import deque
+from typing import Callable
+from .client import Client
+
+DEFAULT_PRIORITY = 10
+DEFAULT_SEND_DELAY_SECS = 10
+MIN_POLL_INTERVAL_SECS = .1
+MAX_POLL_INTERVAL_SECS = 1.0
+TX_POLL_INTERVAL_SECS = .2
+START_TIMEOUT_SECS = 30
+# how many finished jobs are kept in completed_jobs, the oldest are dropped first
+MAX_COMPLETED_JOBS = 100
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def read_image_lines(file_path: str) -> int:
+    '''Reads the height (number of fax lines) of an image from its header. PNG headers are read directly,
+    other formats need Pillow
+
+    @param file_path(str): the path to the image
+    @return (int): the number of lines, None if it could not be determined
+    '''
+    with open(file_path, 'rb') as f:
+        header = f.read(24)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b'IHDR':
+        return struct.unpack('>I', header[20:24])[0]
+    try:
+        from PIL import Image
+        with Image.open(file_path) as image:
+            return image.height
+    except Exception:
+        return None
+
+class WefaxTxJob:
+    '''A single image queued for WEFAX transmission. Created by WefaxTxQueue.add()
+
+    @param file_path(str): the path to the image to send
+    @param priority(int): lower values are sent first, equal priorities are sent in the order added
+    @param skip_apt(bool): True to skip the APT start tones
+    @param skip_phasing(bool): True to skip the phasing lines
+    @param lines(int): [OPTIONAL] the number of lines in the image, read from the file if not given
+    '''
+    __slots__ = ('file_path', 'priority', 'skip_apt', 'skip_phasing', 'lines', 'status', 'error',
+                 'queued_at', 'started_at', 'finished_at', 'states', '_done')
+
+    def __init__(self,
+                 file_path: str,
+                 priority: int = DEFAULT_PRIORITY,
+                 skip_apt: bool = False,
+                 skip_phasing: bool = False,
+                 lines: int = None) -> None:
+        self.file_path = file_path
+        self.priority = priority
+        self.skip_apt = skip_apt
+        self.skip_phasing = skip_phasing
+        self.lines = lines
+        self.status = 'queued'
+        self.error = None
+        self.queued_at = time()
+        self.started_at = None
+        self.finished_at = None
+        self.states = []
+        self._done = threading.Event()
+
+    def __repr__(self) -> str:
+        return f'WefaxTxJob({self.file_path!r}, priority={self.priority}, status={self.status!r})'
+
+    @property
+    def duration_secs(self) -> float:
+        '''The time spent transmitting, None until the job has finished'''
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @property
+    def lines_per_minute(self) -> float:
+        '''The transmit throughput in lines per minute, None until the job has finished'''
+        duration = self.duration_secs
+        if not duration or not self.lines:
+            return None
+        return self.lines * 60 / duration
+
+    def wait(self, timeout_secs: float = None) -> bool:
+        '''Waits for the job to finish
+
+        @param timeout_secs(float): the max time in seconds to wait, None to wait indefinitely
+        @return (bool): True if the image was sent
+        '''
+        self._done.wait(timeout_secs)
+        return self.status == 'done'
+
+class WefaxTxQueue(threading.Thread):
+    '''Sends a batch of images over WEFAX back-to-back, highest priority first. Runs as a daemon thread on its
+    own xmlrpc connection. While waiting for a job to start transmitting the wefax state string is watched, polling
+    quickly right after it changes and backing off while it is stable. Once it is transmitting the polling stays
+    at a short fixed interval, so the next job starts as soon as Fldigi returns to receive.
+
+    @param hostname(str): the IP address of the xmlrpc server to connect to
+    @param port(int): the port number of the xmlrpc server connection
+    @param send_delay_secs(int): the max delay passed to wefax.send_file() for the transmitter to be ready
+    @param state_callback(callable): [OPTIONAL] called as state_callback(job, state_string) on each state change
+    @param max_completed_jobs(int): [OPTIONAL] how many finished jobs to keep in completed_jobs
+
+    Example use:
+    # * assuming that Fldigi is already running with a WEFAX modem selected
+    >>> from pyfldm.wefax_tx import WefaxTxQueue
+    >>> tx_queue = WefaxTxQueue()
+    >>> tx_queue.start()
+    >>> job = tx_queue.add('/home/me/charts/surface.png', priority=1, skip_apt=True)
+    >>> tx_queue.add('/home/me/charts/wave.png')
+    >>> job.wait()
+    True
+    >>> job.lines_per_minute
+    120.2
+    '''
+    def __init__(self,
+                 hostname: str = '127.0.0.1',
+                 port: int = 7362,
+                 send_delay_secs: int = DEFAULT_SEND_DELAY_SECS,
+                 state_callback: Callable = None,
+                 max_completed_jobs: int = MAX_COMPLETED_JOBS) -> None:
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self._client = Client(hostname, port)
+        self._send_delay = int(send_delay_secs)
+        self._state_callback = state_callback
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._abort_event = threading.Event()
+        self.current_job = None
+        self.completed_jobs = deque(maxlen=max_completed_jobs)
+
+    def __str__(self) -> str:
+        return __name__.lower().split(".")[-1]
+
+    def add(self,
+            file_path: str,
+            priority: int = DEFAULT_PRIORITY,
+            skip_apt: bool = False,
+            skip_phasing: bool = False,
+            lines: int = None) -> WefaxTxJob:
+        '''Queues an image to send
+
+        @param file_path(str): the path to the image to send
+        @param priority(int): lower values are sent first, equal priorities are sent in the order added
+        @param skip_apt(bool): True to skip the APT start tones for a faster transmission
+        @param skip_phasing(bool): True to skip the phasing lines for a faster transmission
+        @param lines(int): [OPTIONAL] the number of lines in the image, read from the file if not given
+        @return (WefaxTxJob): the queued job, already cancelled if the queue has been stopped
+        '''
+        if lines is None:
+            lines = read_image_lines(file_path)
+        job = WefaxTxJob(file_path, priority, skip_apt, skip_phasing, lines)
+        with self._condition:
+            if self._stop_event.is_set():
+                self._finish(job, 'cancelled')
+                return job
+            heapq.heappush(self._heap, (priority, next(self._counter), job))
+            self._condition.notify()
+        return job
+
+    def pending(self) -> list:
+        '''Gets the jobs waiting to be sent, in the order they will be sent
+
+        @return (list[WefaxTxJob]): the queued jobs
+        '''
+        with self._condition:
+            return [job for _, _, job in sorted(self._heap)]
+
+    def cancel(self, job: WefaxTxJob) -> bool:
+        '''Cancels a job. A queued job is removed from the queue, the job being sent is aborted with
+        wefax.set_tx_abort_flag()
+
+        @param job(WefaxTxJob): the job to cancel
+        @return (bool): True if the job was found and cancelled
+        '''
+        with self._condition:
+            if job is self.current_job:
+                self._abort_event.set()
+                return True
+            for i, (_, _, queued) in enumerate(self._heap):
+                if queued is job:
+                    self._heap.pop(i)
+                    heapq.heapify(self._heap)
+                    self._finish(job, 'cancelled')
+                    return True
+        return False
+
+    def stop(self, timeout_secs: float = None) -> None:
+        '''Stops the queue after the current job. Queued jobs are left unsent and finish as cancelled, so anything
+        waiting on them is released
+
+        @param timeout_secs(float): the max time in seconds to wait for the current job to finish
+        '''
+        with self._condition:
+            self._stop_event.set()
+            for _, _, job in sorted(self._heap):
+                self._finish(job, 'cancelled')
+            self._heap.clear()
+            self._condition.notify()
+        if self.is_alive():
+            self.join(timeout_secs)
+
+    def _finish(self, job: WefaxTxJob, status: str, error: str = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time()
+        self.completed_jobs.append(job)
+        job._done.set()
+
+    def _next_job(self) -> WefaxTxJob:
+        with self._condition:
+            while not self._heap and not self._stop_event.is_set():
+                self._condition.wait()
+            if self._stop_event.is_set():
+                return None
+            job = heapq.heappop(self._heap)[2]
+            # an abort meant for the previous job that arrived as it finished must not cancel this one
+            self._abort_event.clear()
+            self.current_job = job
+            return job
+
+    def _record_state(self, job: WefaxTxJob, state: str) -> None:
+        job.states.append((time(), state))
+        self.logger.debug(f"WEFAX state: {state}")
+        if self._state_callback is not None:
+            try:
+                self._state_callback(job, state)
+            except Exception:
+                self.logger.exception("WefaxTxQueue state callback raised an exception")
+
+    def _send(self, job: WefaxTxJob) -> None:
+        '''Sends one job and watches it through to the end of the transmission'''
+        job.status = 'sending'
+        result = self._client.wefax.send_file(job.file_path, self._send_delay)
+        if result:
+            self._finish(job, 'failed', result)
+            self.logger.error(f"WEFAX send of {job.file_path} failed: {result}")
+            return
+
+        interval = MIN_POLL_INTERVAL_SECS
+        last_state = None
+        transmitting = False
+        skipped = False
+        requested = time()
+        while True:
+            if self._abort_event.wait(interval):
+                self._abort_event.clear()
+                self._client.wefax.set_tx_abort_flag()
+                self._finish(job, 'cancelled')
+                self.logger.info(f"WEFAX send of {job.file_path} cancelled")
+                return
+
+            state = self._client.wefax.state_string()
+            if state != last_state:
+                self._record_state(job, state)
+                last_state = state
+                interval = MIN_POLL_INTERVAL_SECS
+            else:
+                interval = min(MAX_POLL_INTERVAL_SECS, interval * 2)
+
+            status = self._client.main.get_trx_status()
+            if status == 'tx':
+                if not transmitting:
+                    transmitting = True
+                    job.started_at = time()
+                # the end of the transmission is what starts the next job, so don't back off while sending
+                interval = min(interval, TX_POLL_INTERVAL_SECS)
+                if not skipped:
+                    skipped = True
+                    if job.skip_apt:
+                        self._client.wefax.skip_apt()
+                    if job.skip_phasing:
+                        self._client.wefax.skip_phasing()
+            elif transmitting:
+                self._finish(job, 'done')
+                lpm = job.lines_per_minute
+                lpm_text = f", {lpm:.1f} lines/min" if lpm else ''
+                self.logger.info(f"WEFAX sent {job.file_path} in {job.duration_secs:.1f} secs{lpm_text}")
+                return
+            elif (time() - requested) > (self._send_delay + START_TIMEOUT_SECS):
+                self._finish(job, 'failed', 'transmission never started')
+                self.logger.error(f"WEFAX send of {job.file_path} never started transmitting")
+                return
+
+    def run(self) -> None:
+        '''Overrides the Thread object run. Sends queued jobs until stopped'''
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._send(job)
+            except Exception as e:
+                self.logger.exception(f"WEFAX send of {job.file_path} failed")
+                self._finish(job, 'failed', str(e))
+            finally:
+                with self._condition:
+                    self.current_job = None
@@ -1,12 +1,31 @@
 from .testing_runner import TestingRunner
-from .test_appmonitor import TestAppMonitor
+from .test_appmonitor import TestAppMonitor, TestAppMonitorProcess
 from .test_client import TestClient
 from .test_client_fldigi import TestClientFldigi
 from .test_client_io import TestClientIo
+from .test_client_log import TestClientLog
 from .test_client_main import TestClientMain
 from .test_client_modem import TestClientModem
 from .test_client_navtex import TestClientNavtex
 from .test_client_rig import TestClientRig
 from .test_client_spot import TestClientSpot
 from .test_client_text import TestClientText
-from .test_client_wefax import TestClientWefax
\ No newline at end of file
+from .test_client_wefax import TestClientWefax
+from .test_watcher import TestWatcher
+from .test_txtiming import TestTxTiming
+from .test_adif import TestAdif
+from .test_contest import TestContest
+from .test_navtex import TestNavtex
+from .test_rxdecoder import TestRxDecoder
+from .test_telemetry import TestTelemetry
+from .test_profiles import TestProfiles
+from .test_txstream import TestTxStream
+from .test_bandplan import TestBandPlan
+from .test_maidenhead import TestMaidenhead
+from .test_journal import TestJournal
+from .test_wefax_tx import TestWefaxTx
+from .test_wefax_pipeline import TestWefaxPipeline
+from .test_scanner import TestScanner
+from .test_hopper import TestHopper
+from .test_meterfeed import TestMeterFeed
+from .test_modem_catalogue import TestModemCatalogue
\ No newline at end of file
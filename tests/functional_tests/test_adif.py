@@ -0,0 +1,144 @@
+############################################################################
+#
+#  File: test_adif.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import shutil
+import tempfile
+from pyfldm.adif import AdifIndex, iter_adif, read_record, at_record_end
+from .base_test_case import BaseTestCase
+
+ADIF_HEADER = 'Test log <ADIF_VER:5>3.1.4 <PROGRAMID:6>pyfldm <EOH>\n'
+
+def adif_field(name: str, value: str) -> str:
+    return f'<{name}:{len(value.encode())}>{value}'
+
+def adif_record(call: str, band: str = '20m', mode: str = 'RTTY', qso_date: str = '20231104', **fields) -> str:
+    values = {'CALL': call, 'BAND': band, 'MODE': mode, 'QSO_DATE': qso_date, 'TIME_ON': '1200', **fields}
+    return ''.join(adif_field(name, value) for name, value in values.items()) + '<EOR>\n'
+
+class TestAdif(BaseTestCase):
+    '''ADIF reader and logbook index tests on temporary files, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'logbook.adif')
+
+    def each_cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write(self, text: str, mode: str = 'w') -> None:
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.write(text)
+
+    def test_adif_reads_records(self):
+        self._write(ADIF_HEADER
+                    + adif_record('W1AW', NAME='Hiram <Percy> Maxim')
+                    + '<call:5>K1ABC<band:3>40m<Mode:3>PSK<SUBMODE:6>BPSK31<freq:8:N>7.070000<eor>\n')
+        records = list(iter_adif(self.path))
+        assert len(records) == 2
+        assert records[0].fields['CALL'] == 'W1AW'
+        assert records[0].fields['NAME'] == 'Hiram <Percy> Maxim'
+        # tag names are matched in any case, and typed lengths are understood
+        assert records[1].fields == {'CALL': 'K1ABC', 'BAND': '40m', 'MODE': 'PSK', 'SUBMODE': 'BPSK31', 'FREQ': '7.070000'}
+        assert 'ADIF_VER' not in records[0].fields
+        # the offsets point at the records in the file
+        assert read_record(self.path, records[1].offset).fields == records[1].fields
+        assert records[0].end == records[1].offset - 1
+
+    def test_adif_chunk_boundaries(self):
+        text = ADIF_HEADER + ''.join(adif_record(f'K{i}ABC', NAME='Søren ' * (i % 4), COMMENT='<b>') for i in range(60))
+        self._write(text)
+        expected = list(iter_adif(self.path))
+        assert len(expected) == 60
+        # tags and values cut at every possible place by the end of a chunk
+        for chunk_bytes in [1, 2, 5, 7, 13, 37, 64, 1000]:
+            assert list(iter_adif(self.path, chunk_bytes=chunk_bytes)) == expected, chunk_bytes
+
+    def test_adif_incomplete_record_is_not_returned(self):
+        self._write(ADIF_HEADER + adif_record('W1AW') + adif_field('CALL', 'K1ABC'))
+        records = list(iter_adif(self.path))
+        assert [record.fields['CALL'] for record in records] == ['W1AW']
+        # once the record is finished it is read by resuming from the end of the last one
+        self._write(adif_field('BAND', '20m') + '<EOR>\n', 'a')
+        resumed = list(iter_adif(self.path, records[-1].end))
+        assert [record.fields['CALL'] for record in resumed] == ['K1ABC']
+        assert at_record_end(self.path, records[-1].end)
+        assert at_record_end(self.path, 0)
+        assert not at_record_end(self.path, records[-1].end - 1)
+
+    def test_adif_index_incremental_update(self):
+        self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(10)))
+        index = AdifIndex(self.path)
+        try:
+            assert index.update() == 10
+            assert index.update() == 0
+            self._write(adif_record('W1AW', band='40m', qso_date='20231105'), 'a')
+            assert index.update() == 1
+            assert index.count() == 11
+            assert [entry.call for entry in index.query(band='40M')] == ['W1AW']
+            assert index.count(date_from='20231105') == 1
+            entry = index.query(call='w1aw')[0]
+            assert index.record(entry.offset).fields['CALL'] == 'W1AW'
+        finally:
+            index.close()
+
+    def test_adif_index_rebuilds_when_shrunk(self):
+        self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(10)))
+        index = AdifIndex(self.path)
+        try:
+            index.update()
+            self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(5)))
+            assert index.update() == 5
+            assert index.count() == 5
+        finally:
+            index.close()
+
+    def test_adif_index_rebuilds_when_start_changes(self):
+        self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(10)))
+        index = AdifIndex(self.path)
+        try:
+            index.update()
+            self._write(ADIF_HEADER + adif_record('W1AW') + ''.join(adif_record(f'K{i}ABC') for i in range(1, 11)))
+            assert index.update() == 11
+            assert index.count(call='K0ABC') == 0
+            assert index.count(call='W1AW') == 1
+        finally:
+            index.close()
+
+    def test_adif_index_rebuilds_when_rewritten_past_signature(self):
+        records = [adif_record(f'K{i}ABC', NAME='x' * 20) for i in range(200)]
+        self._write(ADIF_HEADER + ''.join(records))
+        assert os.path.getsize(self.path) > 8192
+        index = AdifIndex(self.path)
+        try:
+            index.update()
+            # Fldigi rewrites the whole log when a record is edited: here one past the hashed start gets longer,
+            # so the log grows and the old end offset lands in the middle of a record
+            records[150] = adif_record('K150ABC', NAME='x' * 20, COMMENT='edited after the contest')
+            records.append(adif_record('W1AW'))
+            self._write(ADIF_HEADER + ''.join(records))
+            assert index.update() == 201
+            assert index.count() == 201
+            assert index.count(call='W1AW') == 1
+            entry = index.query(call='K150ABC')[0]
+            assert index.record(entry.offset).fields['COMMENT'] == 'edited after the contest'
+        finally:
+            index.close()
@@ -20,10 +20,14 @@
 #
 ############################################################################
 
-from time import sleep
+from time import sleep, monotonic
+import os
 import sys
+import shutil
 import logging
-from pyfldm.appmonitor import AppMonitor
+import tempfile
+import psutil
+from pyfldm.appmonitor import AppMonitor, StartupTimings, StopTimings
 from pyfldm.client import Client
 from .base_test_case import BaseTestCase
 from utilities.user_prompt import UserPrompt
@@ -134,3 +138,174 @@ class TestAppMonitor(BaseTestCase):
             logger.info(f'Starting power cycle {i+1}')
             self.app.start()
             self.app.stop()
+
+
+# a stand in for Fldigi that serves just fldigi.name and fldigi.terminate, so the AppMonitor process handling can be
+# timed without a real Fldigi. Its behavior is set with FAKE_FLDIGI_* environment variables
+FAKE_FLDIGI = '''#!{python}
+import os, sys, time, signal, threading
+from xmlrpc.server import SimpleXMLRPCServer
+if os.environ.get('FAKE_FLDIGI_EXIT'):
+    sys.exit(int(os.environ['FAKE_FLDIGI_EXIT']))
+time.sleep(float(os.environ.get('FAKE_FLDIGI_START_SECS', '.2')))
+port = int(sys.argv[sys.argv.index('--xmlrpc-server-port') + 1])
+# the port is listening from here, but requests wait until serve_forever
+server = SimpleXMLRPCServer(('127.0.0.1', port), logRequests=False)
+def terminate(*args):
+    if not os.environ.get('FAKE_FLDIGI_IGNORE_TERMINATE'):
+        threading.Timer(.05, os._exit, (0,)).start()
+    return 0
+server.register_function(terminate, 'fldigi.terminate')
+server.register_function(lambda: 'fldigi', 'fldigi.name')
+if os.environ.get('FAKE_FLDIGI_IGNORE_SIGTERM'):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+time.sleep(float(os.environ.get('FAKE_FLDIGI_SERVE_SECS', '0')))
+server.serve_forever()
+'''
+FAKE_FLDIGI_PORT = 7399
+FAKE_FLDIGI_OPTIONS = ['FAKE_FLDIGI_EXIT', 'FAKE_FLDIGI_START_SECS', 'FAKE_FLDIGI_SERVE_SECS',
+                       'FAKE_FLDIGI_IGNORE_TERMINATE', 'FAKE_FLDIGI_IGNORE_SIGTERM']
+
+class TestAppMonitorProcess(BaseTestCase):
+    '''AppMonitor startup, shutdown and timing tests against a fake fldigi put first on the PATH. These need no
+    running Fldigi (and no other Fldigi may be running) and are linux/MacOS only'''
+    def setup(self) -> None:
+        if sys.platform == 'win32':
+            return
+        if any('fldigi' in (proc.info['name'] or '') for proc in psutil.process_iter(['name'])):
+            raise TestSetupException("Exception in setting up test class TestAppMonitorProcess, Fldigi is already running")
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, 'fldigi')
+        with open(path, 'w') as f:
+            f.write(FAKE_FLDIGI.format(python=sys.executable))
+        os.chmod(path, 0o755)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.dir + os.pathsep + self.path
+
+    def cleanup(self) -> None:
+        if sys.platform == 'win32':
+            return
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def each_setup(self) -> None:
+        self.app = AppMonitor(port=FAKE_FLDIGI_PORT)
+
+    def each_cleanup(self) -> None:
+        for option in FAKE_FLDIGI_OPTIONS:
+            os.environ.pop(option, None)
+        if sys.platform != 'win32':
+            self.app.kill(sigterm_timeout_secs=1, sigkill_timeout_secs=1)
+
+    def test_startup_timings(self):
+        if sys.platform == 'win32':
+            return
+        os.environ['FAKE_FLDIGI_SERVE_SECS'] = '.5'
+        assert self.app.start() == 0
+        timings = self.app.startup_timings
+        assert type(timings) == StartupTimings
+        assert timings.spawn_secs <= timings.port_open_secs <= timings.rpc_ready_secs < 5
+        # the port is probed until it opens, then xmlrpc is tried until it answers
+        assert timings.port_open_secs >= .2
+        assert timings.rpc_ready_secs - timings.port_open_secs >= .4
+        assert self.app.is_running()
+        assert self.app.is_functional()
+
+    def test_start_returns_when_fldigi_exits(self):
+        if sys.platform == 'win32':
+            return
+        os.environ['FAKE_FLDIGI_EXIT'] = '3'
+        start = monotonic()
+        assert self.app.start() == 1
+        # the exit is seen at once rather than at the end of the startup timeout
+        assert monotonic() - start < 2
+        assert self.app.returncode == 3
+        assert self.app.startup_timings.port_open_secs is None
+        assert self.app.wait_for_exit(0)
+        assert not self.app.is_running()
+
+    def test_wait_for_exit(self):
+        if sys.platform == 'win32':
+            return
+        assert self.app.start() == 0
+        assert not self.app.wait_for_exit(.2)
+        self.app._client.fldigi.terminate(False, False, False)
+        start = monotonic()
+        assert self.app.wait_for_exit(5)
+        assert monotonic() - start < 1
+        assert self.app.returncode == 0
+        assert not self.app.is_running()
+
+    def test_stop_graceful(self):
+        if sys.platform == 'win32':
+            return
+        assert self.app.start() == 0
+        assert self.app.stop()
+        timings = self.app.stop_timings
+        assert type(timings) == StopTimings
+        assert timings.stopped_by == 'xmlrpc'
+        # returns as soon as Fldigi exits, not at the end of the timeout
+        assert timings.graceful_secs < 1
+        assert timings.sigterm_secs is None and timings.sigkill_secs is None
+        assert timings.total_secs >= timings.request_secs + timings.graceful_secs
+        assert not self.app.is_running()
+        # nothing running is a successful stop
+        assert self.app.stop()
+
+    def test_stop_deadlines_without_force(self):
+        if sys.platform == 'win32':
+            return
+        os.environ['FAKE_FLDIGI_IGNORE_TERMINATE'] = '1'
+        assert self.app.start() == 0
+        assert not self.app.stop(timeout_secs=.3)
+        timings = self.app.stop_timings
+        assert timings.stopped_by is None
+        assert .3 <= timings.graceful_secs < 1
+        assert timings.sigterm_secs is None
+        assert self.app.is_running()
+
+    def test_stop_force_kill_escalates(self):
+        if sys.platform == 'win32':
+            return
+        os.environ['FAKE_FLDIGI_IGNORE_TERMINATE'] = '1'
+        os.environ['FAKE_FLDIGI_IGNORE_SIGTERM'] = '1'
+        assert self.app.start() == 0
+        assert self.app.stop(timeout_secs=.3, force_if_unsuccessful=True, sigterm_timeout_secs=.3)
+        timings = self.app.stop_timings
+        assert timings.stopped_by == 'sigkill'
+        # each stage waits for its own deadline, and SIGKILL returns as soon as the process is gone
+        assert .3 <= timings.graceful_secs < 1
+        assert .3 <= timings.sigterm_secs < 1
+        assert timings.sigkill_secs < 1
+        assert timings.total_secs < 3
+        assert not self.app.is_running()
+
+    def test_kill(self):
+        if sys.platform == 'win32':
+            return
+        assert self.app.start() == 0
+        assert self.app.kill()
+        timings = self.app.stop_timings
+        assert timings.stopped_by == 'sigterm'
+        assert timings.request_secs is None and timings.graceful_secs is None
+        assert timings.sigterm_secs < 1
+        assert not self.app.is_running()
+
+    def test_restart(self):
+        if sys.platform == 'win32':
+            return
+        assert self.app.start() == 0
+        first_pid = self.app.process_id
+        first_timings = self.app.startup_timings
+        assert self.app.restart() == 0
+        assert self.app.stop_timings.stopped_by == 'xmlrpc'
+        assert self.app.process_id != first_pid
+        assert self.app.startup_timings is not first_timings
+        assert self.app.is_functional()
+        # a Fldigi that will not stop is not started a second time
+        os.environ['FAKE_FLDIGI_IGNORE_TERMINATE'] = '1'
+        assert self.app.restart() == 0
+        second_pid = self.app.process_id
+        self.app.stop = lambda force_if_unsuccessful: False
+        assert self.app.restart() == 1
+        assert self.app.process_id == second_pid
@@ -0,0 +1,101 @@
+############################################################################
+#
+#  File: test_bandplan.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import json
+import shutil
+import tempfile
+from pyfldm import bandplan
+from pyfldm.bandplan import BandPlan, IntervalIndex, Segment
+from .base_test_case import BaseTestCase
+
+# the FT8 dial frequency on each HF band, in Hz
+FT8_FREQUENCIES = {
+    '160m': 1840000, '80m': 3573000, '40m': 7074000, '30m': 10136000, '20m': 14074000,
+    '17m': 18100000, '15m': 21074000, '12m': 24915000, '10m': 28074000,
+}
+
+class TestBandPlan(BaseTestCase):
+    '''Band plan lookup tests, these need no running Fldigi'''
+    def test_bandplan_ft8_is_digital_in_every_region(self):
+        for region in [1, 2, 3]:
+            plan = BandPlan(region)
+            for band, frequency in FT8_FREQUENCIES.items():
+                assert plan.band(frequency) == band, (region, frequency)
+                assert plan.segment(frequency) == 'DIGITAL', (region, frequency)
+
+    def test_bandplan_edges(self):
+        plan = BandPlan(region=1)
+        assert plan.band(7000000) == '40m'
+        assert plan.segment(7000000) == 'CW'
+        # stops are exclusive
+        assert plan.band(7200000) == ''
+        assert plan.segment(7040000) == 'DIGITAL'
+        assert plan.segment(7150000) == 'PHONE'
+        assert plan.band(6999999) == ''
+        assert plan.band(7250000) == ''
+        assert BandPlan(region=2).band(7250000) == '40m'
+        assert plan.band_range('20m') == Segment('20m', 14000000, 14350000)
+        assert plan.band_range('4m') is None
+        try:
+            BandPlan(region=4)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_bandplan_interval_index_rejects_overlaps(self):
+        for intervals in [[('a', 0, 10), ('b', 5, 15)], [('a', 10, 10)]]:
+            try:
+                IntervalIndex(intervals)
+                assert False, "expected a ValueError"
+            except ValueError:
+                pass
+        index = IntervalIndex([('b', 20, 30), ('a', 0, 10)])
+        assert [segment.name for segment in index.segments] == ['a', 'b']
+        assert index.find(10) is None
+        assert index.find(25).name == 'b'
+        assert index.find(-1) is None
+
+    def test_bandplan_bulk_lookups_match_single_lookups(self):
+        if bandplan.np is None:
+            return
+        plan = BandPlan(region=1)
+        frequencies = [1.5, 1.84, 3.6, 7.074, 7.1, 10.1, 14.1, 14.35, 50.313, 99.1]
+        bands = plan.bands_of(frequencies, unit_hz=1e6)
+        segments = plan.segments_of(frequencies, unit_hz=1e6)
+        assert list(bands) == [plan.band(round(f * 1e6)) for f in frequencies]
+        assert list(segments) == [plan.segment(round(f * 1e6)) for f in frequencies]
+        assert list(bands[:4]) == ['', '160m', '80m', '40m']
+
+    def test_bandplan_from_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'bandplan.json')
+            with open(path, 'w') as f:
+                json.dump({'region': 1, 'segments': [['FT8', 14074000, 14077000]]}, f)
+            plan = BandPlan.from_file(path)
+            assert plan.segment(14075000) == 'FT8'
+            assert plan.segment(14080000) == ''
+            # the bands come from the region
+            assert plan.band(7150000) == '40m'
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -50,5 +50,23 @@ class TestClient(BaseTestCase):
         assert type(methods) == list
 
         self.app.stop()
+
+    def test_snapshot(self):
+        self.app.start()
+
+        snapshot1 = self.client.snapshot()
+        assert type(snapshot1.frequency) == float
+        assert type(snapshot1.modem) == str
+        assert set(snapshot1.latencies) == set(snapshot1.fields)
+        assert snapshot1.captured_at > 0
+
+        self.client.main.set_frequency(snapshot1.frequency + 1000)
+        snapshot2 = self.client.snapshot(['frequency', 'modem'])
+        assert snapshot2.fields == ('frequency', 'modem')
+        assert snapshot2.quality is None
+        assert 'frequency' in snapshot1.diff(snapshot2)
+        assert 'modem' not in snapshot1.diff(snapshot2)
+
+        self.app.stop()
     
     
\ No newline at end of file
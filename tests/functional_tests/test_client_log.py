@@ -0,0 +1,85 @@
+############################################################################
+# 
+#  File: test_client_log.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+from time import sleep
+from pyfldm.appmonitor import AppMonitor
+from pyfldm.client import Client
+from pyfldm.submodules.log import LogRecord
+from .base_test_case import BaseTestCase
+from utilities.user_prompt import UserPrompt
+
+class TestClientLog(BaseTestCase):
+    def __init__(self) -> None:
+        super().__init__()
+        self.user_prompt = UserPrompt()
+        self.app = AppMonitor()
+        self.client = Client()
+    
+    def setup(self) -> None:
+        if self.app.is_running():
+            self.app.stop(force_if_unsuccessful=True)
+        self.app.start()
+        self.client.modem.set_by_name("CW")
+    
+    def cleanup(self) -> None:
+        if self.app.is_running():
+            self.app.stop(force_if_unsuccessful=True)
+
+    def test_log_get_set_call(self):
+        self.client.log.set_call("N0CALL")
+        sleep(1)
+        result = self.client.log.get_call()
+        assert type(result) == str
+        assert result == "N0CALL"
+
+        self.client.log.clear()
+        sleep(1)
+        assert self.client.log.get_call() == ""
+
+    def test_log_get_set_record(self):
+        # client side helpers, not xmlrpc methods
+        assert 'get_record' not in self.client.log.get_methods()
+        assert 'set_record' not in self.client.log.get_methods()
+
+        self.client.log.set_record({'call': 'W1AW', 'name': 'Hiram', 'qth': 'Newington', 'rst_out': '599'}, clear=True)
+        sleep(1)
+
+        record = self.client.log.get_record()
+        assert type(record) == LogRecord
+        assert record.call == 'W1AW'
+        assert record.name == 'Hiram'
+        assert record.qth == 'Newington'
+        assert record.rst_out == '599'
+        assert record.rst_in == ''
+
+        self.client.log.set_record(record._replace(call='N0CALL', rst_in='579'))
+        sleep(1)
+        assert self.client.log.get_call() == 'N0CALL'
+        assert self.client.log.get_rst_in() == '579'
+        assert self.client.log.get_name() == 'Hiram'
+
+        try:
+            self.client.log.set_record({'country': 'USA'})
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+        self.client.log.clear()
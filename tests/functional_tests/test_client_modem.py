@@ -198,4 +198,35 @@ class TestClientModem(BaseTestCase):
         self.client.modem.set_olivia_tones(8)
         result2 = self.client.modem.get_olivia_tones()
         assert type(result2) == int
-        assert result2 == 8
\ No newline at end of file
+        assert result2 == 8
+
+    def test_modem_catalogue(self):
+        # a client side helper, not an xmlrpc method
+        assert 'get_catalogue' not in self.client.modem.get_methods()
+        assert 'get_carrier' in self.client.modem.get_methods()
+
+        catalogue = self.client.modem.get_catalogue()
+        names = self.client.modem.get_names()
+        assert len(catalogue) == len(names)
+        assert catalogue.max_id == self.client.modem.get_max_id()
+
+        assert catalogue.id_of('bpsk31') == names.index('BPSK31')
+        assert catalogue.name_of(catalogue.id_of('CW')) == 'CW'
+        assert 'OLIVIA-8-250' in catalogue.search('olivia')
+        assert 'BPSK31' in catalogue.suggest('BSPK31')
+        assert 8 in catalogue.parameters('OLIVIA')['tones']
+
+        self.client.modem.set_by_name('cw')
+        sleep(1)
+        assert self.client.modem.get_name() == 'CW'
+
+        try:
+            self.client.modem.set_by_name('BSPK31')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+        try:
+            self.client.modem.set_by_id(catalogue.max_id + 1)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
@@ -0,0 +1,141 @@
+############################################################################
+#
+#  File: test_contest.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import shutil
+import tempfile
+from pyfldm.adif import adif_mode
+from pyfldm.contest import DupeChecker
+from .base_test_case import BaseTestCase
+from .test_adif import ADIF_HEADER, adif_record
+
+class _FakeRecord:
+    call = 'W1AW'
+    band = '20m'
+    state = 'CT'
+
+class _FakeLog:
+    def get_record(self) -> _FakeRecord:
+        return _FakeRecord()
+
+class _FakeModem:
+    def get_name(self) -> str:
+        return 'BPSK31'
+
+class _FakeClient:
+    '''Stands in for the log and modem parts of Client that DupeChecker.check_current uses'''
+    def __init__(self) -> None:
+        self.log = _FakeLog()
+        self.modem = _FakeModem()
+
+class TestContest(BaseTestCase):
+    '''Dupe checker tests on temporary logbooks, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'logbook.adif')
+
+    def each_cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write(self, text: str, mode: str = 'w') -> None:
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.write(text)
+
+    def test_contest_adif_mode(self):
+        assert adif_mode('BPSK31') == ('PSK', 'PSK31')
+        assert adif_mode('QPSK63') == ('PSK', 'QPSK63')
+        assert adif_mode('OLIVIA-8-250') == ('OLIVIA', 'OLIVIA 8/250')
+        assert adif_mode('DOMX22') == ('DOMINO', 'DOMINOEX')
+        assert adif_mode('rtty') == ('RTTY', '')
+        assert adif_mode('PSK') == ('PSK', '')
+        assert adif_mode('SSB') == ('SSB', '')
+
+    def test_contest_dupe_scopes(self):
+        checker = DupeChecker(dupe_scope='band_mode')
+        assert not checker.add('W1AW', '20m', 'RTTY').dupe
+        assert checker.check('w1aw', '20M', 'rtty').dupe
+        assert not checker.check('W1AW', '40m', 'RTTY').dupe
+        assert not checker.check('W1AW', '20m', 'BPSK31').dupe
+        checker = DupeChecker(dupe_scope='band')
+        checker.add('W1AW', '20m', 'RTTY')
+        assert checker.check('W1AW', '20m', 'BPSK31').dupe
+        assert not checker.check('W1AW', '40m', 'RTTY').dupe
+        checker = DupeChecker(dupe_scope='call')
+        checker.add('W1AW', '20m', 'RTTY')
+        assert checker.check('W1AW', '40m', 'BPSK31').dupe
+        try:
+            DupeChecker(dupe_scope='mode')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_contest_modem_name_matches_logged_mode(self):
+        self._write(ADIF_HEADER + adif_record('W1AW', mode='PSK', SUBMODE='PSK31', STATE='CT')
+                    + adif_record('K1ABC', mode='OLIVIA', SUBMODE='OLIVIA 8/250'))
+        checker = DupeChecker(self.path, multiplier_fields=['STATE'])
+        assert checker.check('W1AW', '20m', 'BPSK31').dupe
+        assert checker.check('W1AW', '20m', 'QPSK63').dupe
+        assert checker.check('K1ABC', '20m', 'OLIVIA-8-250').dupe
+        assert not checker.check('W1AW', '20m', 'RTTY').dupe
+        result = checker.check_current(_FakeClient())
+        assert result.dupe
+        assert result.mode == 'PSK'
+
+    def test_contest_multipliers_and_score(self):
+        checker = DupeChecker(multiplier_fields=['STATE'], points_per_qso=2)
+        assert checker.add('W1AW', '20m', 'RTTY', {'state': 'CT'}).new_multipliers == ['CT']
+        assert checker.add('K1ABC', '40m', 'RTTY', {'STATE': 'CT'}).new_multipliers == []
+        assert checker.check('N1XYZ', '20m', 'RTTY', {'STATE': 'MA'}).new_multipliers == ['MA']
+        assert checker.add('W1AW', '20m', 'RTTY', {'STATE': 'CT'}).dupe
+        assert checker.qso_count == 2
+        assert checker.dupe_count == 1
+        assert checker.score == 2 * 2 * 1
+        checker = DupeChecker(multiplier_fields=['STATE'], multipliers_per_band=True)
+        checker.add('W1AW', '20m', 'RTTY', {'STATE': 'CT'})
+        assert checker.add('K1ABC', '40m', 'RTTY', {'STATE': 'CT'}).new_multipliers == ['CT']
+        assert checker.multipliers() == {'STATE': ['CT/20m', 'CT/40m']}
+
+    def test_contest_update_reads_appended_qsos(self):
+        self._write(ADIF_HEADER + adif_record('W1AW', qso_date='20231103') + adif_record('K1ABC'))
+        checker = DupeChecker(self.path, since='20231104')
+        assert len(checker) == 1
+        assert not checker.check('W1AW', '20m', 'RTTY').dupe
+        assert checker.update() == 0
+        self._write(adif_record('N1XYZ'), 'a')
+        assert checker.update() == 1
+        assert len(checker) == 2
+        assert checker.check('N1XYZ', '20m', 'RTTY').dupe
+
+    def test_contest_update_rereads_rewritten_log(self):
+        self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(10)))
+        checker = DupeChecker(self.path)
+        assert len(checker) == 10
+        # a QSO deleted in Fldigi's logbook: the log is rewritten shorter
+        self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(1, 10)))
+        assert checker.update() == 9
+        assert len(checker) == 9
+        assert not checker.check('K0ABC', '20m', 'RTTY').dupe
+        # a QSO edited in place: the log is the same length, but what was read before has changed
+        self._write(ADIF_HEADER + ''.join(adif_record(f'K{i}ABC') for i in range(1, 9)) + adif_record('K9ABD'))
+        assert checker.update() == 9
+        assert not checker.check('K9ABC', '20m', 'RTTY').dupe
+        assert checker.check('K9ABD', '20m', 'RTTY').dupe
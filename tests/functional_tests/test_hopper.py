@@ -0,0 +1,144 @@
+############################################################################
+#
+#  File: test_hopper.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+
+import statistics
+from time import time, monotonic, sleep
+from xmlrpc.client import Fault
+from pyfldm.hopper import HopScheduler, Hop, HopRecord
+from .base_test_case import BaseTestCase
+
+class _FakeClient:
+    '''Stands in for the batch call of Client that HopScheduler uses. Each call takes rtt_secs and is acted on
+    half way through, the time it was acted on is recorded for each hop'''
+    def __init__(self, rtt_secs: float) -> None:
+        self.rtt_secs = rtt_secs
+        self.hop_rtt_secs = rtt_secs
+        self.hops = []
+        self.fault = None
+        self.error = None
+
+    def batch(self, calls: list, raise_faults: bool = True) -> list:
+        probe = calls[0][0] == 'main.get_trx_status'
+        if not probe and self.error is not None:
+            raise self.error
+        rtt = self.rtt_secs if probe else self.hop_rtt_secs
+        sleep(rtt / 2)
+        if not probe:
+            self.hops.append((monotonic(), calls))
+        sleep(rtt / 2)
+        return [self.fault if self.fault is not None and not probe else '' for _ in calls]
+
+class TestHopper(BaseTestCase):
+    '''Hop scheduler tests against a fake client, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.hopper = HopScheduler(late_tolerance_secs=.02, miss_tolerance_secs=.5, max_records=50)
+        self.client = _FakeClient(.04)
+        self.hopper._client = self.client
+
+    def each_cleanup(self) -> None:
+        self.hopper.stop(5)
+
+    def _add(self, delay_secs: float, frequency: float, **kwargs) -> float:
+        # returns when the hop is due on the monotonic clock
+        at = time() + delay_secs
+        due = monotonic() + (at - time())
+        self.hopper.add(at, frequency, **kwargs)
+        return due
+
+    def _wait_for_records(self, count: int) -> None:
+        deadline = monotonic() + 10
+        while self.hopper.hop_count < count:
+            assert monotonic() < deadline, "the hops were never sent"
+            sleep(.01)
+
+    def test_hopper_sends_early_by_the_lead(self):
+        self.hopper.start()
+        due = [self._add(.4 + i * .15, 7074000 + i * 1000) for i in range(3)]
+        self._wait_for_records(3)
+        # the round trip time is measured, and each hop is sent half of it early so it is acted on when due
+        assert abs(self.hopper.rtt_secs - .04) < .02
+        assert abs(self.hopper.lead_secs - self.hopper.rtt_secs / 2) < 1e-9
+        for (acted_at, calls), hop_due in zip(self.client.hops, due):
+            assert abs(acted_at - hop_due) < .015, acted_at - hop_due
+        assert [calls for _, calls in self.client.hops][0] == [('main.set_frequency', (7074000.0,))]
+        stats = self.hopper.stats()
+        assert stats['hops'] == 3 and stats['missed'] == 0 and stats['late'] == 0
+        assert all(abs(record.error_secs) < .015 for record in self.hopper.records)
+
+    def test_hopper_mode_and_rig_target(self):
+        self.hopper.start()
+        self._add(.3, 14070000, mode='USB', target='rig')
+        self._wait_for_records(1)
+        assert self.client.hops[0][1] == [('rig.set_mode', ('USB',)), ('rig.set_frequency', (14070000.0,))]
+        try:
+            self.hopper.add(time(), 14070000, target='radio')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_hopper_late_and_missed_hops(self):
+        self.hopper.start()
+        # due long ago, so skipped rather than sent
+        self._add(-1, 7074000)
+        self._wait_for_records(1)
+        # a call that suddenly takes far longer than the measured round trip lands late
+        self.client.hop_rtt_secs = .2
+        self._add(.3, 10136000)
+        self._wait_for_records(2)
+        # a failed call counts as missed, a fault does not
+        self.client.error = OSError('connection reset')
+        self._add(.05, 14074000)
+        self._wait_for_records(3)
+        self.client.error = None
+        self.client.hop_rtt_secs = .04
+        self.client.fault = Fault(1, 'rig not connected')
+        self._add(.05, 18100000)
+        self._wait_for_records(4)
+        missed, late, failed, faulted = self.hopper.records
+        assert missed.missed and missed.sent_at is None and missed.error_secs is None
+        assert late.late and not late.missed and late.error_secs > .05
+        assert failed.missed and failed.hop.frequency == 14074000
+        assert not faulted.missed
+        stats = self.hopper.stats()
+        assert (stats['hops'], stats['missed'], stats['late']) == (4, 2, 1)
+        assert len(self.client.hops) == 2
+
+    def test_hopper_stats_percentiles(self):
+        hopper = HopScheduler(max_records=100)
+        assert hopper.stats()['p50'] is None and hopper.stats()['mean_error_secs'] is None
+        hop = Hop(0, 7074000)
+        hopper._record(HopRecord(hop, 0, .01, -.004, False, False))
+        assert hopper.stats()['p99'] == .004
+        errors = [(i - 50) / 1000 for i in range(101)]
+        for error in errors:
+            hopper._record(HopRecord(hop, 0, .01, error, error > .02, False))
+        hopper._record(HopRecord(hop, None, None, None, False, True))
+        stats = hopper.stats()
+        # the first record and 2 of the errors have been dropped, the counts are still totals
+        kept = errors[2:]
+        assert len(hopper.records) == 100
+        assert (stats['hops'], stats['missed'], stats['late']) == (103, 1, 30)
+        assert abs(stats['mean_error_secs'] - statistics.fmean(kept)) < 1e-12
+        jitter = statistics.quantiles(sorted(abs(error) for error in kept), n=100, method='inclusive')
+        assert (stats['p50'], stats['p90'], stats['p99']) == (jitter[49], jitter[89], jitter[98])
+        assert stats['p50'] <= stats['p90'] <= stats['p99'] <= .05
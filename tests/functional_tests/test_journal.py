@@ -0,0 +1,96 @@
+############################################################################
+#
+#  File: test_journal.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import shutil
+import tempfile
+from xmlrpc.client import Binary
+from pyfldm.journal import SessionJournal, JournalReader, JournalRecord, list_segments, KIND_RX, KIND_TX
+from .base_test_case import BaseTestCase
+
+class TestJournal(BaseTestCase):
+    '''Session journal write and read back tests in a temporary directory, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.dir = tempfile.mkdtemp()
+
+    def each_cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write_timed(self, journal: SessionJournal, count: int) -> None:
+        # queues records with known timestamps, one a second from 1000, alternating rx and tx
+        for i in range(count):
+            journal._queue.put((1000.0 + i, KIND_RX if i % 2 == 0 else KIND_TX, f'record {i}\n'.encode()))
+
+    def test_journal_round_trip(self):
+        journal = SessionJournal(self.dir, fsync_interval_secs=.1)
+        journal.start()
+        journal.append_rx('CQ CQ de Søren\n')
+        journal.append_tx(Binary(b'N0CALL de W1AW k\n'))
+        journal.append_rx(b'')
+        journal.append_rx(Binary(b''))
+        journal.append('rx', b'\x00\xff binary\n')
+        journal.close(5)
+        assert not journal.is_alive()
+        assert journal.records_written == 3
+        records = list(JournalReader(self.dir).read())
+        assert [(record.kind, record.data) for record in records] == [
+            ('rx', 'CQ CQ de Søren\n'.encode()), ('tx', b'N0CALL de W1AW k\n'), ('rx', b'\x00\xff binary\n')]
+        assert records[0].timestamp <= records[1].timestamp <= records[2].timestamp
+        assert [record.data for record in JournalReader(self.dir).read(kind='tx')] == [b'N0CALL de W1AW k\n']
+
+    def test_journal_close_without_start(self):
+        journal = SessionJournal(self.dir)
+        journal.append_rx('never started')
+        journal.close()
+        assert [record.data for record in JournalReader(self.dir).read()] == [b'never started']
+
+    def test_journal_segments_and_time_ranges(self):
+        journal = SessionJournal(self.dir, segment_max_bytes=1024, index_interval_bytes=128)
+        self._write_timed(journal, 500)
+        journal.close()
+        segments = list_segments(self.dir)
+        assert len(segments) > 10
+        reader = JournalReader(self.dir)
+        records = list(reader.read())
+        assert [record.timestamp for record in records] == [1000.0 + i for i in range(500)]
+        assert records[7] == JournalRecord(1007.0, 'tx', b'record 7\n')
+        # ranges are inclusive, found by seeking through the index of the right segment
+        assert [record.timestamp for record in reader.read(start=1200.5, end=1210)] == [1201.0 + i for i in range(10)]
+        assert [record.timestamp for record in reader.read(start=1490, kind='rx')] == [1490.0 + i for i in range(0, 10, 2)]
+        assert list(reader.read(start=2000)) == []
+        assert list(reader.read(end=999)) == []
+        # a new journal in the same directory carries on with the next segment
+        journal = SessionJournal(self.dir)
+        journal.append_rx('later')
+        journal.close()
+        assert len(list_segments(self.dir)) == len(segments) + 1
+        assert list(reader.read(start=1499.5))[-1].data == b'later'
+
+    def test_journal_truncated_record(self):
+        journal = SessionJournal(self.dir)
+        self._write_timed(journal, 3)
+        journal.close()
+        segment = list_segments(self.dir)[0]
+        # a crash part way through writing the last record
+        with open(segment, 'r+b') as f:
+            f.truncate(os.path.getsize(segment) - 2)
+        assert [record.data for record in JournalReader(self.dir).read()] == [b'record 0\n', b'record 1\n']
@@ -0,0 +1,94 @@
+############################################################################
+#
+#  File: test_maidenhead.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import math
+import random
+from pyfldm import maidenhead
+from pyfldm.maidenhead import GridMap, locator_to_latlon, latlon_to_locator, distance_bearing, locators_to_latlon
+from .base_test_case import BaseTestCase
+
+class TestMaidenhead(BaseTestCase):
+    '''Maidenhead locator tests, these need no running Fldigi'''
+    def test_maidenhead_locator_to_latlon(self):
+        assert locator_to_latlon('AA') == (-85.0, -170.0)
+        assert locator_to_latlon('RR99') == (89.5, 179.0)
+        lat, lon = locator_to_latlon(' fn31PR ')
+        assert abs(lat - (41 + 17 * 2.5 / 60 + 1.25 / 60)) < 1e-9
+        assert abs(lon - (-74 + 15 * 5 / 60 + 2.5 / 60)) < 1e-9
+        for locator in ['F', 'FN3', 'SN31', 'FNAA', 'FN31py1', 'FN31pr0a']:
+            try:
+                locator_to_latlon(locator)
+                assert False, f"expected a ValueError for {locator!r}"
+            except ValueError:
+                pass
+
+    def test_maidenhead_round_trip(self):
+        random.seed(46)
+        for _ in range(500):
+            lat, lon = random.uniform(-90, 90), random.uniform(-180, 180)
+            for length in [2, 4, 6, 8]:
+                locator = latlon_to_locator(lat, lon, length)
+                assert len(locator) == length
+                # the point is inside the square of its locator
+                center_lat, center_lon = locator_to_latlon(locator)
+                _, _, lon_size, lat_size = maidenhead.LOCATOR_PAIRS[length // 2 - 1]
+                assert abs(center_lat - lat) <= lat_size / 2 + 1e-9, (lat, lon, locator)
+                assert abs(center_lon - lon) <= lon_size / 2 + 1e-9, (lat, lon, locator)
+                assert latlon_to_locator(center_lat, center_lon, length) == locator
+        assert latlon_to_locator(41.714775, -72.727260) == 'FN31pr'
+        # the north pole and the date line stay on the grid
+        assert latlon_to_locator(90, 180, 4) == 'AR09'
+        assert latlon_to_locator(90, 179.99, 4) == 'RR99'
+
+    def test_maidenhead_distance_bearing(self):
+        distance, bearing = distance_bearing(0, 0, 0, 90)
+        assert abs(distance - math.pi / 2 * maidenhead.EARTH_RADIUS_KM) < 1e-6
+        assert abs(bearing - 90) < 1e-9
+        distance, bearing = distance_bearing(0, 0, 10, 0)
+        assert abs(bearing) < 1e-9
+        assert distance_bearing(50, 10, 50, 10) == (0.0, 0.0)
+        # Newington to Berlin
+        path = GridMap('FN31pr').path('JO62qm')
+        assert 6150 < path.distance_km < 6300
+        assert 40 < path.bearing < 55
+        assert path.az == f'{round(path.bearing)}'
+        assert GridMap('FN31pr').az('not a locator') == ''
+
+    def test_maidenhead_vectorized_matches_single(self):
+        if maidenhead.np is None:
+            return
+        locators = ['FN31pr', 'jo62QM', ' PM95 ', 'QF56od12', 'AA', '', 'FN3', 'ZZ99', 'FN31pr0a']
+        lats, lons = locators_to_latlon(locators)
+        grid = GridMap('FN31pr')
+        distances, bearings = grid.distances(locators)
+        for i, locator in enumerate(locators):
+            try:
+                lat, lon = locator_to_latlon(locator)
+            except ValueError:
+                assert math.isnan(lats[i]) and math.isnan(lons[i]) and math.isnan(distances[i]), locator
+                continue
+            assert abs(lats[i] - lat) < 1e-9 and abs(lons[i] - lon) < 1e-9, locator
+            path = grid.path(locator)
+            assert abs(distances[i] - path.distance_km) < 1e-6, locator
+            # the bearing from the home square to itself is just rounding noise
+            if path.distance_km > 1e-6:
+                assert abs(bearings[i] - path.bearing) < 1e-6, locator
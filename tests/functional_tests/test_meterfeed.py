@@ -0,0 +1,90 @@
+############################################################################
+#
+#  File: test_meterfeed.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+
+import threading
+from time import monotonic, sleep
+from pyfldm.meterfeed import MeterFeed
+from .base_test_case import BaseTestCase
+
+class _FakeClient:
+    '''Stands in for the batch call of Client that MeterFeed uses, recording when each batch was sent'''
+    def __init__(self) -> None:
+        self.batches = []
+        self.sent = threading.Event()
+
+    def batch(self, calls: list, raise_faults: bool = True) -> list:
+        self.batches.append((monotonic(), calls))
+        self.sent.set()
+        return ['' for _ in calls]
+
+class TestMeterFeed(BaseTestCase):
+    '''Meter feed tests against a fake client, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.client = _FakeClient()
+
+    def _feed(self, max_rate_hz: float) -> MeterFeed:
+        feed = MeterFeed(max_rate_hz=max_rate_hz)
+        feed._client = self.client
+        return feed
+
+    def test_meterfeed_burst_sends_only_the_latest(self):
+        feed = self._feed(10)
+        for value in range(100):
+            feed.update_smeter(value)
+            feed.update_pwrmeter(value * 2)
+        feed.start()
+        assert self.client.sent.wait(5)
+        sleep(.3)
+        feed.stop(5)
+        # both meters go in one batch, with only the last value of the burst
+        assert [calls for _, calls in self.client.batches] == [[('rig.set_smeter', (99,)), ('rig.set_pwrmeter', (198,))]]
+        assert feed.updates_received == 200 and feed.updates_coalesced == 198 and feed.updates_sent == 2
+        assert feed.last_values == {'smeter': 99, 'pwrmeter': 198}
+
+    def test_meterfeed_respects_the_rate_limit(self):
+        feed = self._feed(20)
+        feed.start()
+        start = monotonic()
+        value = 0
+        # readings at about 500 a second for half a second
+        while monotonic() - start < .5:
+            value += 1
+            feed.update_smeter(value)
+            sleep(.002)
+        feed.stop(5)
+        elapsed = monotonic() - start
+        times = [sent_at for sent_at, _ in self.client.batches]
+        values = [calls[0][1][0] for _, calls in self.client.batches]
+        assert 2 <= len(times) <= elapsed * 20 + 2
+        # the min interval between sends is kept, allowing for timer slop
+        assert all(later - earlier >= 1 / 20 - .005 for earlier, later in zip(times, times[1:]))
+        # every send is newer than the one before, and stopping sends the very last reading
+        assert values == sorted(set(values))
+        assert values[-1] == value == feed.last_values['smeter']
+        assert feed.updates_sent == len(values)
+        assert feed.updates_coalesced == value - len(values)
+        try:
+            MeterFeed(max_rate_hz=0)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
@@ -0,0 +1,89 @@
+############################################################################
+#
+#  File: test_modem_catalogue.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+
+from pyfldm.submodules.modem import Modem
+from pyfldm.submodules.modem_catalogue import ModemCatalogue, OLIVIA_TONES, OLIVIA_BANDWIDTHS
+from .base_test_case import BaseTestCase
+
+FAKE_MODEM_NAMES = ['NULL', 'CW', 'BPSK31', 'OLIVIA', 'OLIVIA-8-250', 'RTTY']
+
+class _FakeOlivia:
+    def __init__(self) -> None:
+        self.sent = []
+
+    def set_tones(self, tones: int) -> None:
+        self.sent.append(('tones', tones))
+
+    def set_bandwidth(self, bandwidth: int) -> None:
+        self.sent.append(('bandwidth', bandwidth))
+
+class _FakeModemGroup:
+    def __init__(self) -> None:
+        self.olivia = _FakeOlivia()
+
+    def get_names(self) -> list:
+        return list(FAKE_MODEM_NAMES)
+
+    def get_max_id(self) -> int:
+        return len(FAKE_MODEM_NAMES) - 1
+
+class _FakeServerProxy:
+    '''Stands in for the modem group of the xmlrpc ServerProxy'''
+    def __init__(self) -> None:
+        self.modem = _FakeModemGroup()
+
+class TestModemCatalogue(BaseTestCase):
+    '''Modem catalogue tests against a fake xmlrpc proxy, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.proxy = _FakeServerProxy()
+        self.modem = Modem(self.proxy)
+
+    def test_modem_catalogue_parameters(self):
+        catalogue = ModemCatalogue(self.proxy)
+        assert catalogue.parameters('olivia') == {'tones': OLIVIA_TONES, 'bandwidth': OLIVIA_BANDWIDTHS}
+        assert catalogue.parameters('RTTY') == {}
+        catalogue.validate('OLIVIA', 'tones', 32)
+        for parameter, value in [('tones', 3), ('bandwidth', 100), ('shift', 170)]:
+            try:
+                catalogue.validate('OLIVIA', parameter, value)
+                assert False, f"expected a ValueError for {parameter}"
+            except ValueError:
+                pass
+        try:
+            catalogue.validate('RTTY', 'tones', 8)
+            assert False, "expected a ValueError"
+        except ValueError as e:
+            assert 'no' in str(e)
+
+    def test_modem_catalogue_checks_olivia_setters(self):
+        self.modem.set_olivia_tones('16')
+        self.modem.set_olivia_bandwidth(1000)
+        assert self.proxy.modem.olivia.sent == [('tones', 16), ('bandwidth', 1000)]
+        for setter, value in [(self.modem.set_olivia_tones, 3), (self.modem.set_olivia_bandwidth, 300)]:
+            try:
+                setter(value)
+                assert False, "expected a ValueError"
+            except ValueError as e:
+                assert 'Must be one of these values' in str(e)
+        # nothing invalid reached Fldigi
+        assert len(self.proxy.modem.olivia.sent) == 2
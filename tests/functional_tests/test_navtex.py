@@ -0,0 +1,123 @@
+############################################################################
+#
+#  File: test_navtex.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import os
+import shutil
+import sqlite3
+import tempfile
+from time import sleep, monotonic
+from pyfldm.navtex_archive import NavtexArchive
+from pyfldm.navtex_receiver import NavtexReceiver, parse_navtex_message
+from .base_test_case import BaseTestCase
+
+GALE_WARNING = 'ZCZC EB12\nGALE WARNING DOVER\nSW 8 EXPECTED\nNNNN'
+
+class TestNavtex(BaseTestCase):
+    '''NAVTEX parsing and archive tests, these need no running Fldigi (the receiver is never started, messages are
+    fed in with handle_raw)'''
+    def each_setup(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'navtex.db')
+
+    def each_cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _stored(self) -> int:
+        # counts the rows actually written, without flushing the archive's buffer first like count() does
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+    def test_navtex_parse_message(self):
+        message = parse_navtex_message('noise ' + GALE_WARNING + '\n', 100)
+        assert message.message_id == 'EB12'
+        assert (message.station, message.subject, message.serial) == ('E', 'B', 12)
+        assert message.body == 'GALE WARNING DOVER\nSW 8 EXPECTED'
+        assert message.received == 100
+        # a message cut off before NNNN keeps what was received
+        message = parse_navtex_message('ZCZC OA05\nBUOY ADRIFT')
+        assert (message.message_id, message.body) == ('OA05', 'BUOY ADRIFT')
+        # no ZCZC framing at all
+        message = parse_navtex_message(' garbled text ', 100)
+        assert message.message_id is None and message.serial is None
+        assert message.body == 'garbled text'
+
+    def test_navtex_receiver_drops_duplicates(self):
+        receiver = NavtexReceiver(dedup_size=2)
+        messages = receiver.subscribe()
+        assert receiver.handle_raw(GALE_WARNING) is not None
+        assert receiver.handle_raw(GALE_WARNING) is None
+        # serial 00 messages and unframed text are never treated as retransmissions
+        assert receiver.handle_raw('ZCZC EA00\nALWAYS PRINT\nNNNN') is not None
+        assert receiver.handle_raw('ZCZC EA00\nALWAYS PRINT\nNNNN') is not None
+        assert receiver.handle_raw('garbled') is not None
+        assert receiver.handle_raw('garbled') is not None
+        # only the last dedup_size ids are remembered
+        receiver.handle_raw('ZCZC EA01\nONE\nNNNN')
+        receiver.handle_raw('ZCZC EA02\nTWO\nNNNN')
+        assert receiver.handle_raw(GALE_WARNING) is not None
+        assert receiver.received_count == 8
+        assert receiver.duplicate_count == 1
+        assert messages.qsize() == 8
+
+    def test_navtex_receiver_drops_oldest_for_slow_subscriber(self):
+        receiver = NavtexReceiver()
+        messages = receiver.subscribe(2)
+        for serial in range(1, 4):
+            receiver.handle_raw(f'ZCZC EA{serial:02}\nWARNING {serial}\nNNNN')
+        assert [messages.get_nowait().serial for _ in range(2)] == [2, 3]
+        assert receiver.dropped_count == 1
+        receiver.unsubscribe(messages)
+        receiver.handle_raw('ZCZC EA04\nWARNING 4\nNNNN')
+        assert messages.empty()
+
+    def test_navtex_archive_batches_and_queries(self):
+        archive = NavtexArchive(self.path, batch_size=3)
+        try:
+            archive.add(parse_navtex_message(GALE_WARNING, 100))
+            archive.add(parse_navtex_message('ZCZC EA01\nNAV WARNING BUOY ADRIFT\nNNNN', 200))
+            assert self._stored() == 0
+            archive.add(parse_navtex_message('ZCZC OB02\nGALE WARNING FAIR ISLE\nNNNN', 300))
+            assert self._stored() == 3
+            assert archive.count() == 3
+            assert archive.count(station='E') == 2
+            assert [m.message_id for m in archive.query(subject='B')] == ['OB02', 'EB12']
+            assert [m.message_id for m in archive.query(text='gale', since=150)] == ['OB02']
+            assert archive.query(station='E', subject='B')[0] == parse_navtex_message(GALE_WARNING, 100)
+        finally:
+            archive.close()
+
+    def test_navtex_archive_flushes_while_messages_keep_arriving(self):
+        archive = NavtexArchive(self.path)
+        receiver = NavtexReceiver()
+        try:
+            archive.record_from(receiver, flush_interval_secs=.5)
+            # a message every 0.1 secs never leaves the recorder idle for a whole flush interval
+            start = monotonic()
+            serial = 0
+            while monotonic() - start < 1.2:
+                serial += 1
+                receiver.handle_raw(f'ZCZC EA{serial:02}\nNAV WARNING {serial}\nNNNN')
+                sleep(.1)
+            assert self._stored() > 0
+        finally:
+            archive.close()
+        assert self._stored() == serial
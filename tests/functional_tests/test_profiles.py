@@ -0,0 +1,167 @@
+############################################################################
+#
+#  File: test_profiles.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+from time import monotonic
+from xmlrpc.client import Fault
+from pyfldm.profiles import ProfileManager, Profile
+from pyfldm.submodules.snapshot import Snapshot, SNAPSHOT_FIELDS
+from .base_test_case import BaseTestCase
+
+# the bandwidth and carrier each fake modem resets to when it is selected
+FAKE_MODEMS = {'BPSK31': (31, 1000), 'RTTY': (250, 1500)}
+
+class _FakeCatalogue:
+    def resolve_name(self, name: str) -> str:
+        for modem in FAKE_MODEMS:
+            if modem.lower() == name.lower():
+                return modem
+        raise ValueError(f"Unknown modem {name!r}")
+
+class _FakeModem:
+    def __init__(self, client: '_FakeClient') -> None:
+        self.client = client
+
+    def get_catalogue(self) -> _FakeCatalogue:
+        return _FakeCatalogue()
+
+    def get_name(self) -> str:
+        return self.client.read(['modem'])['modem']
+
+class _FakeClient:
+    '''Stands in for the parts of Client that ProfileManager uses. Records each batch of setters sent. Like Fldigi,
+    a setting only reads back as set once delay_secs has passed since it was sent'''
+    def __init__(self, delay_secs: float = 0) -> None:
+        self.state = {'modem': 'RTTY', 'bandwidth': 250, 'carrier': 1500, 'afc': False, 'frequency': 14080000.0}
+        self.modem = _FakeModem(self)
+        self.batches = []
+        self.failing = {}
+        self.ignored = []
+        self.delay_secs = delay_secs
+        self.pending = {}
+        self.reads = 0
+
+    def _set(self, field: str, value) -> None:
+        if self.delay_secs:
+            self.pending[field] = (value, monotonic() + self.delay_secs)
+        else:
+            self.state[field] = value
+
+    def read(self, fields: list) -> dict:
+        self.reads += 1
+        for field, (value, ready_at) in list(self.pending.items()):
+            if monotonic() >= ready_at:
+                self.state[field] = value
+                del self.pending[field]
+        return {field: self.state[field] for field in fields}
+
+    def snapshot(self, fields: list) -> Snapshot:
+        return Snapshot(self.read(fields), 0, {})
+
+    def batch(self, calls: list, raise_faults: bool = True) -> list:
+        self.batches.append([method for method, _ in calls])
+        setters = {method.replace('.get_', '.set_'): field for field, (method, _) in SNAPSHOT_FIELDS.items()}
+        setters['modem.set_by_name'] = 'modem'
+        results = []
+        for method, (value,) in calls:
+            field = setters[method]
+            if field in self.failing:
+                results.append(Fault(1, self.failing[field]))
+                continue
+            if field not in self.ignored:
+                self._set(field, value)
+                if field == 'modem':
+                    self._set('bandwidth', FAKE_MODEMS[value][0])
+                    self._set('carrier', FAKE_MODEMS[value][1])
+            results.append('')
+        return results
+
+PSK_PROFILE = Profile('psk', {'modem': 'bpsk31', 'carrier': 1500, 'afc': True, 'frequency': 14080000})
+
+class TestProfiles(BaseTestCase):
+    '''Profile manager tests against a fake client, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.client = _FakeClient()
+        self.profiles = ProfileManager(self.client, [PSK_PROFILE], settle_timeout_secs=.2)
+
+    def test_profiles_modem_is_sent_first(self):
+        result = self.profiles.apply('psk')
+        assert result.changes == {'modem': ('RTTY', 'BPSK31'), 'carrier': (1500, 1500), 'afc': (False, True)}
+        assert result.unchanged == ['frequency']
+        # the modem on its own, then the settings it resets along with the rest
+        assert self.client.batches == [['modem.set_by_name'], ['modem.set_carrier', 'main.set_afc']]
+        assert self.client.state['carrier'] == 1500
+        assert self.profiles.apply('psk').changes == {}
+
+    def test_profiles_rolls_back_a_failed_setting(self):
+        self.client.failing['afc'] = 'afc is not available'
+        try:
+            self.profiles.apply('psk')
+            assert False, "expected a RuntimeError"
+        except RuntimeError as e:
+            assert 'afc is not available' in str(e)
+        # the modem is put back first, then the carrier it reset
+        assert self.client.batches[-1] == ['modem.set_by_name', 'modem.set_carrier']
+        assert self.client.state == _FakeClient().state
+
+    def test_profiles_rolls_back_a_setting_that_does_not_read_back(self):
+        self.client.ignored.append('afc')
+        try:
+            self.profiles.apply('psk')
+            assert False, "expected a RuntimeError"
+        except RuntimeError as e:
+            assert 'afc' in str(e)
+        assert self.client.state['modem'] == 'RTTY'
+
+    def test_profiles_stops_if_the_modem_does_not_change(self):
+        self.client.ignored.append('modem')
+        try:
+            self.profiles.apply('psk')
+            assert False, "expected a RuntimeError"
+        except RuntimeError as e:
+            assert 'BPSK31' in str(e)
+        # nothing else was sent before the modem was found not to have changed
+        assert self.client.batches == [['modem.set_by_name'], ['modem.set_by_name']]
+        assert self.client.state['afc'] is False
+
+    def test_profiles_waits_for_settings_to_settle(self):
+        # the modem and then the rest only read back as set a little after they are sent
+        client = _FakeClient(delay_secs=.15)
+        profiles = ProfileManager(client, [PSK_PROFILE], settle_timeout_secs=2)
+        start = monotonic()
+        result = profiles.apply('psk')
+        assert result.changes == {'modem': ('RTTY', 'BPSK31'), 'carrier': (1500, 1500), 'afc': (False, True)}
+        assert client.batches == [['modem.set_by_name'], ['modem.set_carrier', 'main.set_afc']]
+        assert client.state['modem'] == 'BPSK31' and client.state['afc'] is True
+        assert .3 <= monotonic() - start < 2
+        # readback was retried rather than taken as a failure
+        assert client.reads > 3
+
+    def test_profiles_settle_timeout_is_bounded(self):
+        client = _FakeClient(delay_secs=5)
+        profiles = ProfileManager(client, [PSK_PROFILE], settle_timeout_secs=.2)
+        start = monotonic()
+        try:
+            profiles.apply('psk')
+            assert False, "expected a RuntimeError"
+        except RuntimeError as e:
+            assert 'BPSK31' in str(e)
+        assert monotonic() - start < 1
@@ -0,0 +1,65 @@
+############################################################################
+#
+#  File: test_rxdecoder.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+from xmlrpc.client import Binary
+from pyfldm.rxdecoder import StreamDecoder
+from .base_test_case import BaseTestCase
+
+class TestRxDecoder(BaseTestCase):
+    '''Stream decoder tests, these need no running Fldigi'''
+    def test_rxdecoder_split_characters(self):
+        data = 'CQ de Søren, 73 ☺\r\nQRZ?\r\n'.encode('utf-8')
+        # every split of the data into two chunks decodes the same
+        for i in range(len(data) + 1):
+            decoder = StreamDecoder(capacity=4)
+            decoded = decoder.feed(data[:i]) + decoder.feed(Binary(data[i:])) + decoder.finish()
+            assert decoded == 'CQ de Søren, 73 ☺\nQRZ?\n', i
+            assert decoder.text() == decoded
+            assert len(decoder) == len(decoded.encode('utf-8'))
+
+    def test_rxdecoder_control_policies(self):
+        assert StreamDecoder(control='keep').feed(b'a\x07b\tc\n') == 'a\x07b\tc\n'
+        assert StreamDecoder(control='strip').feed(b'a\x07b\tc\n') == 'ab\tc\n'
+        assert StreamDecoder(control='escape').feed(b'a\x07b\x7f') == 'a<0x07>b<0x7F>'
+        assert StreamDecoder(normalize_newlines=False).feed('a\r\nb') == 'a\r\nb'
+        try:
+            StreamDecoder(control='drop')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_rxdecoder_views_survive_clear(self):
+        decoder = StreamDecoder(capacity=8)
+        decoder.feed(b'first line\n')
+        view = decoder.view()
+        decoder.clear()
+        decoder.feed(b'second line\n')
+        assert bytes(view) == b'first line\n'
+        assert decoder.text() == 'second line\n'
+        # a held back CR is kept by clear, and dropped by reset
+        decoder.feed(b'end\r')
+        decoder.clear()
+        assert decoder.feed(b'\n') == '\n'
+        decoder.feed(b'end\r')
+        decoder.reset()
+        assert decoder.feed(b'x') == 'x'
+        assert decoder.text() == 'x'
@@ -0,0 +1,144 @@
+############################################################################
+#
+#  File: test_scanner.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+
+from pyfldm import scanner
+from pyfldm.scanner import CarrierScanner, ScanPeak, find_peaks
+from .base_test_case import BaseTestCase
+
+# the scripted band: (center carrier, quality at the center), the quality falls by half a point per Hz off center
+SIGNALS = [(740, 40.0), (1513, 90.0), (2200, 8.0)]
+
+class _FakeModem:
+    def __init__(self) -> None:
+        self.carrier = 1000
+        self.carriers_set = []
+        self.quality_reads = 0
+        self.on_quality = None
+
+    def get_carrier(self) -> int:
+        return self.carrier
+
+    def set_carrier(self, carrier: int) -> int:
+        self.carriers_set.append(carrier)
+        self.carrier = carrier
+        return carrier
+
+    def get_quality(self) -> float:
+        self.quality_reads += 1
+        if self.on_quality is not None:
+            self.on_quality()
+        return max([0.0] + [peak - abs(self.carrier - center) * .5 for center, peak in SIGNALS])
+
+    def search_up(self) -> None:
+        above = [center for center, _ in SIGNALS if center > self.carrier]
+        self.carrier = above[0] if above else self.carrier
+
+    def search_down(self) -> None:
+        below = [center for center, _ in SIGNALS if center < self.carrier]
+        self.carrier = below[-1] if below else self.carrier
+
+class _FakeClient:
+    '''Stands in for the modem part of Client that CarrierScanner uses, with a quality scripted by carrier'''
+    def __init__(self) -> None:
+        self.modem = _FakeModem()
+
+class TestScanner(BaseTestCase):
+    '''Carrier scanner tests against a fake client, these need no running Fldigi but need numpy'''
+    def each_setup(self) -> None:
+        if scanner.np is None:
+            return
+        self.scanner = CarrierScanner(dwell_secs=0)
+        self.client = _FakeClient()
+        self.scanner._client = self.client
+
+    def test_scanner_find_peaks(self):
+        if scanner.np is None:
+            return
+        carriers = [100, 200, 300, 400, 500, 600, 700, 800]
+        quality = [30, 10, 50, 45, 5, 20, 20, 60]
+        # the ends count as peaks, and so does the first step of a flat top
+        assert find_peaks(carriers, quality, threshold=0) == [
+            ScanPeak(800, 60.0), ScanPeak(300, 50.0), ScanPeak(100, 30.0), ScanPeak(600, 20.0)]
+        assert find_peaks(carriers, quality, threshold=30) == [ScanPeak(800, 60.0), ScanPeak(300, 50.0), ScanPeak(100, 30.0)]
+        assert find_peaks(carriers, quality, threshold=0, max_peaks=2) == [ScanPeak(800, 60.0), ScanPeak(300, 50.0)]
+        # a weaker peak within min_separation_hz of a stronger one is dropped
+        assert find_peaks(carriers, quality, threshold=0, min_separation_hz=250) == [ScanPeak(800, 60.0), ScanPeak(300, 50.0)]
+        assert find_peaks(carriers, quality, threshold=0, min_separation_hz=200) == [
+            ScanPeak(800, 60.0), ScanPeak(300, 50.0), ScanPeak(100, 30.0), ScanPeak(600, 20.0)]
+        assert find_peaks([], [], threshold=0) == []
+        assert find_peaks([100], [5], threshold=0) == [ScanPeak(100, 5.0)]
+        # steps never measured are not peaks
+        assert find_peaks([100, 200, 300], [scanner.np.nan, 40, scanner.np.nan], threshold=0) == [ScanPeak(200, 40.0)]
+
+    def test_scanner_scan_refines_coarse_peaks(self):
+        if scanner.np is None:
+            return
+        report = self.scanner.scan(start_hz=300, stop_hz=2700, coarse_step_hz=100, fine_step_hz=10, threshold=10)
+        # the coarse pass finds 1500 and 700, the fine passes move them to the signal centers
+        assert [peak.carrier for peak in report.peaks] == [1510, 740]
+        assert report.peaks[0].quality == 88.5 and report.peaks[1].quality == 40.0
+        assert list(report.coarse.carriers) == list(range(300, 2701, 100))
+        assert [(int(result.carriers[0]), int(result.carriers[-1])) for result in report.fine] == [(1410, 1590), (610, 790)]
+        assert report.steps == 25 + 19 + 19
+        assert report.steps_per_sec > 0
+        # the carrier is put back where it was
+        assert self.client.modem.carrier == 1000
+
+    def test_scanner_scan_without_fine_pass(self):
+        if scanner.np is None:
+            return
+        report = self.scanner.scan(start_hz=300, stop_hz=2700, coarse_step_hz=100, fine_step_hz=0, max_peaks=1)
+        assert report.peaks == [ScanPeak(1500, 83.5)]
+        assert report.fine == [] and report.steps == 25
+        try:
+            self.scanner.scan(start_hz=300, stop_hz=200)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_scanner_stop_keeps_samples_taken(self):
+        if scanner.np is None:
+            return
+        modem = self.client.modem
+        modem.on_quality = lambda: self.scanner.stop() if modem.quality_reads == 5 else None
+        result = self.scanner.sweep(300, 2700, 100)
+        assert list(result.carriers) == [300, 400, 500, 600, 700]
+        assert len(result.quality) == 5
+        assert modem.carrier == 1000
+
+    def test_scanner_search(self):
+        if scanner.np is None:
+            return
+        result = self.scanner.search('up', steps=3)
+        # the last search finds nothing higher and stays put
+        assert list(result.carriers) == [1513, 2200, 2200]
+        assert list(result.quality) == [90.0, 8.0, 8.0]
+        assert self.client.modem.carrier == 1000
+        result = self.scanner.search('down', steps=2, restore=False)
+        assert list(result.carriers) == [740, 740]
+        assert self.client.modem.carrier == 740
+        try:
+            self.scanner.search('sideways')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
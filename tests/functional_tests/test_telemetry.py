@@ -0,0 +1,105 @@
+############################################################################
+#
+#  File: test_telemetry.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import math
+import random
+from pyfldm import telemetry
+from pyfldm.telemetry import TelemetryRecorder
+from .base_test_case import BaseTestCase
+
+def _same(a: list, b: list) -> bool:
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if math.isnan(x) or math.isnan(y):
+            if not (math.isnan(x) and math.isnan(y)):
+                return False
+        elif abs(x - y) > 1e-9:
+            return False
+    return True
+
+class TestTelemetry(BaseTestCase):
+    '''Telemetry statistics tests on recorded samples, these need no running Fldigi. Each result is worked out
+    with numpy (when installed) and with the pure python fallback'''
+    def each_setup(self) -> None:
+        random.seed(37)
+        self.recorder = TelemetryRecorder(fields=['quality'], capacity=100, stages=[])
+        for i in range(120):
+            # a few missing samples, including a run longer than the rolling window. The first 20 are overwritten
+            missing = i % 7 == 3 or 50 <= i < 56
+            self.recorder.record({'quality': None if missing else random.uniform(0, 100)}, 1000 + i)
+        self.numpy = telemetry.np
+
+    def each_cleanup(self) -> None:
+        telemetry.np = self.numpy
+
+    def _both(self, method: str, *args, **kwargs) -> tuple:
+        # (numpy result or None if it is not installed, fallback result)
+        with_numpy = getattr(self.recorder, method)(*args, **kwargs) if self.numpy is not None else None
+        telemetry.np = None
+        try:
+            return with_numpy, getattr(self.recorder, method)(*args, **kwargs)
+        finally:
+            telemetry.np = self.numpy
+
+    def _expected_rolling(self, window: int, statistic: str) -> list:
+        _, values = self._both('series', 'quality')[1]
+        values = list(values)
+        expected = []
+        for i in range(window - 1, len(values)):
+            present = [value for value in values[i - window + 1:i + 1] if not math.isnan(value)]
+            if not present:
+                expected.append(math.nan)
+            elif statistic == 'mean':
+                expected.append(sum(present) / len(present))
+            else:
+                expected.append(min(present) if statistic == 'min' else max(present))
+        return expected
+
+    def test_telemetry_rolling_skips_missing_samples(self):
+        for statistic in ['mean', 'min', 'max']:
+            for window in [1, 4, 5, 30]:
+                expected = self._expected_rolling(window, statistic)
+                with_numpy, fallback = self._both('rolling', 'quality', window, statistic)
+                assert list(fallback[0]) == [1020 + i for i in range(window - 1, 100)]
+                assert _same(list(fallback[1]), expected), (statistic, window)
+                if with_numpy is not None:
+                    assert list(with_numpy[0]) == list(fallback[0])
+                    assert _same(list(with_numpy[1]), expected), (statistic, window)
+        # windows that fall entirely in the run of missing samples
+        _, fallback = self._both('rolling', 'quality', 5, 'mean')
+        assert sum(1 for value in fallback[1] if math.isnan(value)) == 2
+
+    def test_telemetry_stats_match(self):
+        with_numpy, fallback = self._both('stats', 'quality', window_secs=60)
+        assert fallback['count'] == sum(1 for i in range(60, 120) if i % 7 != 3)
+        if with_numpy is not None:
+            assert with_numpy.keys() == fallback.keys()
+            assert _same(list(with_numpy.values()), list(fallback.values()))
+
+    def test_telemetry_rolling_rejects_bad_arguments(self):
+        for args in [('quality', 5, 'median'), ('quality', 0)]:
+            try:
+                self.recorder.rolling(*args)
+                assert False, "expected a ValueError"
+            except ValueError:
+                pass
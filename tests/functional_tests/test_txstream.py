@@ -0,0 +1,143 @@
+############################################################################
+#
+#  File: test_txstream.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import io
+import os
+import shutil
+import tempfile
+from time import monotonic
+from pyfldm.txstream import TxStream
+from .base_test_case import BaseTestCase
+
+TEXT = 'Søren ☺ 73 de N0CALL\n' * 40
+
+class _FakeText:
+    def __init__(self) -> None:
+        self.queued = b''
+        self.sent = 0
+        self.cleared = False
+        self.keys_up = True
+
+    def add_tx_bytes(self, data: bytes) -> None:
+        self.queued += data
+
+    def add_tx(self, text: str) -> None:
+        pass
+
+    def get_tx_data(self) -> bytes:
+        if not self.keys_up:
+            # e.g. a PTT error, Fldigi stays in receive and sends nothing
+            return b''
+        # everything queued so far goes out between polls
+        data, self.sent = self.queued[self.sent:], len(self.queued)
+        return data
+
+    def clear_tx(self) -> None:
+        self.cleared = True
+
+class _FakeMain:
+    def __init__(self, text: _FakeText) -> None:
+        self.text = text
+        self.polls = 0
+        self.aborted = False
+
+    def tx(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        self.aborted = True
+
+    def get_trx_status(self) -> str:
+        self.polls += 1
+        if not self.text.keys_up:
+            return 'rx'
+        return 'tx' if self.polls < 3 or self.text.sent < len(self.text.queued) else 'rx'
+
+class _FakeClient:
+    '''Stands in for the text and main parts of Client that TxStream uses'''
+    def __init__(self) -> None:
+        self.text = _FakeText()
+        self.main = _FakeMain(self.text)
+
+class TestTxStream(BaseTestCase):
+    '''TX streaming tests against a fake client, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.dir = tempfile.mkdtemp()
+
+    def each_cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _chunks(self, stream: TxStream, chunk_bytes: int) -> list:
+        stream.chunk_bytes = chunk_bytes
+        chunks = []
+        while True:
+            chunk = stream._next_chunk()
+            if not chunk:
+                return chunks
+            chunks.append(chunk)
+
+    def test_txstream_text_is_sized_in_encoded_bytes(self):
+        for encoding in ['utf-8', 'utf-16-le', 'latin-1']:
+            text = TEXT.replace('☺', ':)') if encoding == 'latin-1' else TEXT
+            encoded = text.encode(encoding)
+            for source in [text, io.StringIO(text)]:
+                stream = TxStream(source, encoding=encoding, chars_per_sec=10)
+                if isinstance(source, str):
+                    assert stream.total_bytes == len(encoded)
+                chunks = self._chunks(stream, 16)
+                assert b''.join(chunks) == encoded, encoding
+                assert all(len(chunk) == 16 for chunk in chunks[:-1])
+
+    def test_txstream_from_file_closes_the_file(self):
+        path = os.path.join(self.dir, 'bulletin.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(TEXT)
+        stream = TxStream.from_file(path, chars_per_sec=100, poll_interval_secs=.01)
+        stream._client = _FakeClient()
+        assert stream.total_bytes == len(TEXT.encode('utf-8'))
+        stream.start()
+        assert stream.wait(10)
+        assert stream._source.closed
+        assert stream._client.text.queued == TEXT.encode('utf-8')
+        # a stream that is never started is closed by hand, and the caller's own files are left open
+        stream = TxStream.from_file(path)
+        stream.close()
+        assert stream._source.closed
+        with open(path, 'rb') as f:
+            TxStream(f).close()
+            assert not f.closed
+
+    def test_txstream_gives_up_if_fldigi_never_transmits(self):
+        for return_to_rx in [True, False]:
+            stream = TxStream(TEXT, chars_per_sec=100, poll_interval_secs=.01, start_timeout_secs=.2,
+                              return_to_rx=return_to_rx)
+            stream._client = _FakeClient()
+            stream._client.text.keys_up = False
+            start = monotonic()
+            stream.start()
+            assert not stream.wait(5)
+            assert not stream.is_alive()
+            assert .2 <= monotonic() - start < 2
+            assert isinstance(stream.error, TimeoutError)
+            assert not stream.completed and not stream.cancelled
+            # the queued text is not left to go out later
+            assert stream._client.main.aborted and stream._client.text.cleared
@@ -0,0 +1,103 @@
+############################################################################
+#
+#  File: test_txtiming.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+from pyfldm.txtiming import TxTimingModel, parse_timing
+from .base_test_case import BaseTestCase
+
+# seconds per character of each fake modem
+FAKE_MODEMS = {'BPSK31': (1, .2), 'RTTY': (2, .1)}
+
+class _FakeModem:
+    def __init__(self) -> None:
+        self.name = 'BPSK31'
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get_id(self) -> int:
+        return FAKE_MODEMS[self.name][0]
+
+class _FakeMain:
+    def __init__(self, modem: _FakeModem) -> None:
+        self.modem = modem
+
+    def get_char_timing(self, char: str) -> str:
+        return f'{int(FAKE_MODEMS[self.modem.name][1] * 8000)}:8000'
+
+    def get_tx_timing(self, text: str) -> str:
+        secs = FAKE_MODEMS[self.modem.name][1] * len(text)
+        return f'{int(secs * 8000)}:8000:{secs}'
+
+class _FakeClient:
+    '''Stands in for the modem and main parts of Client that TxTimingModel uses'''
+    def __init__(self) -> None:
+        self.modem = _FakeModem()
+        self.main = _FakeMain(self.modem)
+
+class TestTxTiming(BaseTestCase):
+    '''TX timing model tests against a fake client, these need no running Fldigi'''
+    def test_txtiming_parse_timing(self):
+        assert parse_timing('8000:8000') == 1.0
+        assert parse_timing('4000:8000:0.5') == .5
+        try:
+            parse_timing('100:0')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_txtiming_estimate_current_modem(self):
+        model = TxTimingModel(_FakeClient(), charset='abc ', verify_every=0)
+        assert abs(model.estimate('abc abc') - 1.4) < 1e-9
+        # unsampled characters use the average
+        assert abs(model.estimate('xyz') - .6) < 1e-9
+
+    def test_txtiming_explicit_modem_must_be_live(self):
+        client = _FakeClient()
+        client.modem.name = 'RTTY'
+        model = TxTimingModel(client, charset='abc', verify_every=0)
+        try:
+            model.estimate('abc', 'BPSK31', 1)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+        assert ('BPSK31', 1) not in model._cache
+        try:
+            model.estimate('abc', 'RTTY')
+            assert False, "expected a ValueError, modem_id is required with modem_name"
+        except ValueError:
+            pass
+        assert abs(model.estimate('abc', 'RTTY', 2) - .3) < 1e-9
+
+    def test_txtiming_modem_switch_does_not_poison_cache(self):
+        client = _FakeClient()
+        model = TxTimingModel(client, charset='abc', verify_every=1)
+        assert abs(model.estimate('aaaaaaaaaa') - 2.0) < 1e-9
+        # the operator switches modems without calling refresh()
+        client.modem.name = 'RTTY'
+        assert abs(model.estimate('aaaaaaaaaa', 'BPSK31', 1) - 2.0) < 1e-9
+        assert model.drift_events == 0
+        assert abs(model._cache[('BPSK31', 1)].estimate('aaaaaaaaaa') - 2.0) < 1e-9
+        # the default modem follows Fldigi once the old timings are dropped
+        model.invalidate('BPSK31', 1)
+        assert abs(model.estimate('aaaaaaaaaa') - 1.0) < 1e-9
+        assert ('RTTY', 2) in model._cache
+        assert ('BPSK31', 1) not in model._cache
@@ -0,0 +1,239 @@
+############################################################################
+#
+#  File: test_watcher.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+import random
+from pyfldm import watcher as watcher_module
+from pyfldm.watcher import StateWatcher
+from .base_test_case import BaseTestCase
+
+class _Clock:
+    '''A monotonic clock that only moves when the test moves it'''
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class _FakeClient:
+    '''Stands in for the batch call of Client that StateWatcher uses. Each getter returns the next of its scripted
+    values, holding the last one, and every call is recorded with the time on the test clock'''
+    def __init__(self, clock: _Clock, values: dict) -> None:
+        self.clock = clock
+        self.values = values
+        self.calls = []
+
+    def batch(self, calls: list, raise_faults: bool = True) -> list:
+        results = []
+        for method, _ in calls:
+            self.calls.append((self.clock.now, method))
+            script = self.values[method]
+            if isinstance(script, list):
+                results.append(script.pop(0) if len(script) > 1 else script[0])
+            else:
+                results.append(script)
+        return results
+
+    def poll_times(self, method: str) -> list:
+        return [at for at, called in self.calls if called == method]
+
+class TestWatcher(BaseTestCase):
+    '''Change detection and polling tests, these need no running Fldigi. The watcher is driven on a test clock'''
+    def each_setup(self) -> None:
+        self.clock = _Clock()
+        self.monotonic = watcher_module.monotonic
+        watcher_module.monotonic = self.clock
+        self.client = _FakeClient(self.clock, {
+            'modem.get_carrier': 1500,
+            'main.get_frequency': 14070000.0,
+            'modem.get_quality': 50.0,
+            'main.get_trx_status': 'rx',
+            'text.get_rx_length': 0,
+            'modem.get_name': 'CW',
+        })
+        self.events = []
+
+    def each_cleanup(self) -> None:
+        watcher_module.monotonic = self.monotonic
+
+    def _watcher(self, **kwargs) -> StateWatcher:
+        watcher = StateWatcher(**kwargs)
+        watcher._client = self.client
+        return watcher
+
+    def _run(self, watcher: StateWatcher, until: float, step_secs: float = .01) -> None:
+        # runs the watcher's scheduler as its thread would, up to the given time on the test clock
+        while self.clock.now < until:
+            watcher._tick(self.clock.now)
+            self.clock.now = round(self.clock.now + step_secs, 6)
+
+    def _gaps(self, times: list) -> list:
+        return [round(later - earlier, 2) for earlier, later in zip(times, times[1:])]
+    def _feed(self, watcher: StateWatcher, method: str, values: list, interval_secs: float = .5) -> list:
+        # polls each value in turn through the watcher, returning the (poll number, value) of each change its
+        # subscribers receive
+        start = self.clock.now
+        seen = len(self.events)
+        self.client.values[method] = list(values)
+        for _ in values:
+            watcher._tick(self.clock.now)
+            self.clock.now += interval_secs
+        return [(round((at - start) / interval_secs), event.new) for at, event in self.events[seen:]]
+
+    def _watch(self, name: str, method: str, convert, interval_secs: float, deadband=None, debounce_secs=None) -> StateWatcher:
+        watcher = self._watcher()
+        watcher.subscribe(lambda event: self.events.append((self.clock.now, event)))
+        watcher.watch(name, interval_secs, method, convert, deadband, debounce_secs)
+        return watcher
+
+    def test_watcher_reports_change(self):
+        watcher = self._watch('trx_status', 'main.get_trx_status', str, 1)
+        fired = self._feed(watcher, 'main.get_trx_status', ['rx', 'rx', 'tx', 'tx', 'rx'], 1)
+        assert fired == [(2, 'tx'), (4, 'rx')]
+        assert [(event.old, event.new) for _, event in self.events] == [('rx', 'tx'), ('tx', 'rx')]
+        assert watcher.value('trx_status') == 'rx'
+
+    def test_watcher_deadband_ignores_noise(self):
+        watcher = self._watch('quality', 'modem.get_quality', float, 1, deadband=5)
+        fired = self._feed(watcher, 'modem.get_quality', [50, 52, 48, 54.9, 45.1, 50], 1)
+        assert fired == []
+        fired = self._feed(watcher, 'modem.get_quality', [56], 1)
+        assert fired == [(0, 56)]
+
+    def test_watcher_debounce_needs_value_to_hold(self):
+        watcher = self._watch('modem', 'modem.get_name', str, .5, debounce_secs=1)
+        # BPSK31 only holds for half a second, RTTY holds long enough
+        fired = self._feed(watcher, 'modem.get_name', ['CW', 'BPSK31', 'CW', 'RTTY', 'RTTY', 'RTTY', 'RTTY'])
+        assert fired == [(5, 'RTTY')]
+
+    def test_watcher_deadband_debounce_noisy_step(self):
+        random.seed(35)
+        watcher = self._watch('quality', 'modem.get_quality', float, .5, deadband=5, debounce_secs=1)
+        # steps from 10 to 60 half way through, with +/-1 of noise on every poll
+        values = [(10 if i < 20 else 60) + random.uniform(-1, 1) for i in range(40)]
+        fired = self._feed(watcher, 'modem.get_quality', values)
+        assert len(fired) == 1, fired
+        # the step is seen at poll 20 and has held for the 1 sec debounce by poll 22
+        assert fired[0][0] == 22
+        assert abs(fired[0][1] - 60) <= 1
+
+    def test_watcher_noisy_step_that_does_not_hold(self):
+        random.seed(36)
+        watcher = self._watch('quality', 'modem.get_quality', float, .5, deadband=5, debounce_secs=1)
+        # a single poll spike, then back to the original level
+        values = [10 + random.uniform(-1, 1) for _ in range(10)] + [60] + [10 + random.uniform(-1, 1) for _ in range(10)]
+        assert self._feed(watcher, 'modem.get_quality', values) == []
+
+    def test_watcher_rejects_reserved_names(self):
+        watcher = StateWatcher()
+        try:
+            watcher.watch('_trx_status')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+        try:
+            watcher.watch('not_a_field')
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+    def test_watcher_adaptive_backs_off_while_idle(self):
+        watcher = self._watcher()
+        watcher.watch('carrier', interval_secs=.25, max_interval_secs=2)
+        assert set(watcher._watches) == {'carrier', '_trx_status', '_rx_length'}
+        self._run(watcher, 8)
+        gaps = self._gaps(self.client.poll_times('modem.get_carrier'))
+        # doubles after every poll with no change, up to the max interval
+        assert all(abs(gap - expected) <= .03 for gap, expected in zip(gaps, [.5, 1, 2, 2, 2])), gaps
+        assert len(gaps) == 5
+        assert watcher.effective_rates()['carrier'] == .5
+        # the activity checks poll at their own steady rate
+        assert all(abs(gap - .5) <= .03 for gap in self._gaps(self.client.poll_times('main.get_trx_status')))
+
+    def test_watcher_adaptive_resets_on_activity(self):
+        watcher = self._watcher()
+        watcher.watch('carrier', interval_secs=.25, max_interval_secs=4)
+        self._run(watcher, 10)
+        assert watcher._watches['carrier'].interval == 4
+        # keying up is seen by the next activity check, and the carrier is polled at the fastest rate at once
+        self.client.values['main.get_trx_status'] = 'tx'
+        self._run(watcher, 12)
+        assert watcher.active
+        times = [at for at in self.client.poll_times('modem.get_carrier') if at >= 10]
+        assert times[0] <= 10 + .5 + .25 + .03
+        assert all(abs(gap - .25) <= .03 for gap in self._gaps(times)), self._gaps(times)
+        # back to receive with no text, so it backs off again
+        self.client.values['main.get_trx_status'] = 'rx'
+        self._run(watcher, 20)
+        assert not watcher.active
+        assert watcher._watches['carrier'].interval == 4
+        # incoming text counts as activity too
+        self.client.values['text.get_rx_length'] = [10, 20, 30, 40]
+        self._run(watcher, 21)
+        assert watcher._watches['carrier'].interval == .25
+
+    def test_watcher_adaptive_resets_on_change(self):
+        watcher = self._watcher()
+        events = []
+        watcher.subscribe(events.append)
+        watcher.watch('carrier', interval_secs=.25, max_interval_secs=2)
+        self._run(watcher, 6)
+        self.client.values['modem.get_carrier'] = 1600
+        self._run(watcher, 12)
+        assert [(event.name, event.old, event.new) for event in events] == [('carrier', 1500, 1600)]
+        times = [at for at in self.client.poll_times('modem.get_carrier') if at >= 6]
+        # the first poll sees the change, then it backs off from the fastest rate again
+        gaps = self._gaps(times)
+        assert len(gaps) >= 4
+        assert all(abs(gap - expected) <= .03 for gap, expected in zip(gaps, [.25, .5, 1, 2])), gaps
+
+    def test_watcher_stays_within_the_rpc_budget(self):
+        watcher = self._watcher(rpc_budget=5)
+        for name in ['carrier', 'frequency', 'quality']:
+            watcher.watch(name, interval_secs=.1)
+        # 30 polls a second wanted, scaled down to the budget
+        rates = watcher.effective_rates()
+        assert abs(sum(rates.values()) - 5) < 1e-9
+        assert all(abs(rate - 5 / 3) < 1e-9 for rate in rates.values())
+        self._run(watcher, 10)
+        # the budget starts full, so at most one second of burst on top of the steady rate
+        assert 5 * 10 - 5 <= watcher.calls_sent <= 5 * 10 + 5
+        assert watcher.calls_sent == len(self.client.calls)
+        for method in ['modem.get_carrier', 'main.get_frequency', 'modem.get_quality']:
+            assert len(self.client.poll_times(method)) >= 10, method
+        for second in range(10):
+            assert len([at for at, _ in self.client.calls if second <= at < second + 1]) <= 10
+
+    def test_watcher_unwatch_stops_activity_checks(self):
+        watcher = self._watcher()
+        watcher.watch('carrier', interval_secs=.25, max_interval_secs=2)
+        watcher.watch('frequency', interval_secs=1)
+        watcher.unwatch('_trx_status')
+        assert '_trx_status' in watcher._watches
+        self._run(watcher, 2)
+        watcher.unwatch('carrier')
+        assert set(watcher._watches) == {'frequency'}
+        calls = len(self.client.calls)
+        self._run(watcher, 6)
+        assert {method for _, method in self.client.calls[calls:]} == {'main.get_frequency'}
+        # and come back with the next adaptive watch
+        watcher.watch('quality', interval_secs=.5, max_interval_secs=4)
+        assert set(watcher._watches) == {'frequency', 'quality', '_trx_status', '_rx_length'}
@@ -0,0 +1,183 @@
+############################################################################
+#
+#  File: test_wefax_pipeline.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+
+import os
+import queue
+import shutil
+import tempfile
+from time import sleep
+from pyfldm import wefax_pipeline
+from pyfldm.wefax_pipeline import WefaxPipeline, correct_slant, denoise, crop, thumbnail, process_wefax_image
+from .base_test_case import BaseTestCase
+np = wefax_pipeline.np
+Image = wefax_pipeline.Image
+
+class _FakeWefax:
+    def __init__(self, files: list) -> None:
+        self.files = list(files)
+
+    def get_received_file(self, max_delay_secs: int) -> str:
+        if self.files:
+            return self.files.pop(0)
+        # nothing received within the long-poll
+        sleep(.05)
+        return ''
+
+class _FakeClient:
+    '''Stands in for the wefax part of Client that WefaxPipeline uses, returning each file once'''
+    def __init__(self, files: list) -> None:
+        self.wefax = _FakeWefax(files)
+
+class TestWefaxPipeline(BaseTestCase):
+    '''WEFAX image processing tests on synthetic images, these need no running Fldigi but need numpy and Pillow'''
+    def each_setup(self) -> None:
+        self.dir = tempfile.mkdtemp()
+
+    def each_cleanup(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _chart(self, height: int = 120, width: int = 160):
+        # a white page with a border of blank lines and a striped chart in the middle
+        image = np.full((height, width), 255, dtype=np.uint8)
+        image[20:100, 30:130] = np.where(np.arange(100) % 10 < 5, 0, 200)[None, :]
+        return image
+
+    def _save(self, image, name: str) -> str:
+        path = os.path.join(self.dir, name)
+        Image.fromarray(image).save(path)
+        return path
+
+    def test_wefax_pipeline_correct_slant(self):
+        if np is None:
+            return
+        base = np.arange(64, dtype=np.uint8) * 4
+        for slant in [.5, -1.25, 3]:
+            shifts = np.rint(np.arange(40) * slant).astype(int)
+            # each line drifts right by slant pixels more than the one before
+            slanted = np.stack([np.roll(base, shift) for shift in shifts])
+            corrected = correct_slant(slanted, slant)
+            assert corrected.shape == slanted.shape
+            # every line lines up with the first again
+            assert (corrected == base[None, :]).all(), slant
+        image = self._chart()
+        assert (correct_slant(image, 0) == image).all()
+
+    def test_wefax_pipeline_denoise(self):
+        if np is None:
+            return
+        image = self._chart()
+        speckled = image.copy()
+        speckled[5, 5] = 0
+        speckled[60, 60] = 255 if image[60, 60] == 0 else 0
+        speckled[0, 0] = 0
+        denoised = denoise(speckled)
+        assert denoised.dtype == np.uint8 and denoised.shape == image.shape
+        # isolated pixels, including one on the edge, are removed
+        assert denoised[5, 5] == 255 and denoised[0, 0] == 255
+        assert denoised[60, 60] == image[60, 60]
+        # the edges of the chart are kept
+        assert (denoised[10] == 255).all()
+        assert (denoised[50, 31:34] == image[50, 31:34]).all()
+
+    def test_wefax_pipeline_crop(self):
+        if np is None:
+            return
+        cropped = crop(self._chart())
+        assert cropped.shape == (80, 100)
+        assert (cropped == self._chart()[20:100, 30:130]).all()
+        # a blank page is left as it is
+        blank = np.full((50, 60), 255, dtype=np.uint8)
+        assert crop(blank) is blank
+        # min_std decides what counts as blank
+        faint = blank.copy()
+        faint[10:20, 10:20] = 250
+        assert crop(faint).shape == (50, 60)
+        assert crop(faint, min_std=1).shape == (10, 10)
+
+    def test_wefax_pipeline_thumbnail(self):
+        if np is None:
+            return
+        image = np.zeros((600, 1000), dtype=np.uint8)
+        image[:, 500:] = 200
+        thumb = thumbnail(image, 256)
+        # shrunk by a whole factor of 4 to fit
+        assert thumb.shape == (150, 250)
+        assert thumb.dtype == np.uint8
+        assert (thumb[:, :125] == 0).all() and (thumb[:, 125:] == 200).all()
+        block = np.array([[0, 100], [100, 200]], dtype=np.uint8)
+        assert thumbnail(np.tile(block, (2, 2)), 2).tolist() == [[100, 100], [100, 100]]
+        small = self._chart()
+        assert thumbnail(small, 256).shape == small.shape
+
+    def test_wefax_pipeline_process_image(self):
+        if np is None:
+            return
+        path = self._save(self._chart(), 'gale.png')
+        output_dir = os.path.join(self.dir, 'out')
+        os.makedirs(output_dir)
+        result = process_wefax_image(path, output_dir, thumbnail_size=40)
+        assert result['source'] == path
+        assert result['output'] == os.path.join(output_dir, 'gale-processed.png')
+        assert result['thumbnail'] == os.path.join(output_dir, 'gale-thumb.png')
+        assert result['shape'] == (80, 100)
+        with Image.open(result['output']) as image:
+            assert image.size == (100, 80)
+        with Image.open(result['thumbnail']) as image:
+            assert max(image.size) <= 40
+        assert set(result['timings']) == {'load', 'denoise', 'crop', 'save', 'total'}
+        # skipped steps are not timed, and the output goes next to the source by default
+        result = process_wefax_image(path, denoise_image=False, crop_image=False, thumbnail_size=0, slant=.1)
+        assert set(result['timings']) == {'load', 'slant', 'save', 'total'}
+        assert result['shape'] == (120, 160) and result['thumbnail'] is None
+        assert os.path.dirname(result['output']) == self.dir
+
+    def test_wefax_pipeline_receives_and_processes(self):
+        if np is None:
+            return
+        files = [self._save(self._chart(), f'chart-{i}.png') for i in range(3)]
+        missing = os.path.join(self.dir, 'missing.png')
+        output_dir = os.path.join(self.dir, 'out')
+        pipeline = WefaxPipeline(output_dir=output_dir, workers=2, queue_size=2, options={'thumbnail_size': 32})
+        pipeline._client = _FakeClient(files + [missing])
+        results = pipeline.subscribe()
+        pipeline.start()
+        try:
+            received = [results.get(timeout=30) for _ in range(4)]
+        finally:
+            pipeline.stop(10)
+        assert not pipeline.is_alive()
+        assert pipeline.received_count == 4
+        assert pipeline.processed_count == 3 and pipeline.failed_count == 1
+        by_source = {result['source']: result for result in received}
+        assert set(by_source) == set(files + [missing])
+        assert 'error' in by_source[missing]
+        for path in files:
+            result = by_source[path]
+            assert os.path.isfile(result['output']) and os.path.dirname(result['output']) == output_dir
+            assert result['shape'] == (80, 100)
+            assert result['timings']['latency'] >= result['timings']['queue_wait'] >= 0
+        try:
+            results.get_nowait()
+            assert False, "expected no more results"
+        except queue.Empty:
+            pass
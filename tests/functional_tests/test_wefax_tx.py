@@ -0,0 +1,152 @@
+############################################################################
+#
+#  File: test_wefax_tx.py
+#  Copyright(c) 2023, Phillip Hall. All rights reserved.
+#
+#  This library is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU Lesser General Public
+#  License as published by the Free Software Foundation; either
+#  version 2.1 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this library; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#  USA
+#
+############################################################################
+
+
+import threading
+from time import monotonic, sleep
+from pyfldm.wefax_tx import WefaxTxQueue
+from .base_test_case import BaseTestCase
+
+class _FakeWefax:
+    def __init__(self, main: '_FakeMain') -> None:
+        self.main = main
+        self.sent = []
+        self.aborts = 0
+
+    def send_file(self, file_path: str, max_delay_secs: int) -> str:
+        self.sent.append(file_path)
+        self.main.tx_polls = self.main.polls_per_job
+        return ''
+
+    def state_string(self) -> str:
+        return 'transmitting' if self.main.tx_polls else 'idle'
+
+    def set_tx_abort_flag(self) -> str:
+        self.aborts += 1
+        self.main.tx_polls = 0
+        return ''
+
+    def skip_apt(self) -> str:
+        return ''
+
+    def skip_phasing(self) -> str:
+        return ''
+
+class _FakeMain:
+    def __init__(self, polls_per_job: int) -> None:
+        self.polls_per_job = polls_per_job
+        self.tx_polls = 0
+
+    def get_trx_status(self) -> str:
+        # transmits for polls_per_job polls after each send, forever if that is None
+        if self.tx_polls is None:
+            return 'tx'
+        if self.tx_polls:
+            self.tx_polls -= 1
+            return 'tx'
+        return 'rx'
+
+class _FakeClient:
+    '''Stands in for the wefax and main parts of Client that WefaxTxQueue uses'''
+    def __init__(self, polls_per_job: int = 2) -> None:
+        self.main = _FakeMain(polls_per_job)
+        self.wefax = _FakeWefax(self.main)
+
+class TestWefaxTx(BaseTestCase):
+    '''WEFAX transmit queue tests against a fake client, these need no running Fldigi'''
+    def each_setup(self) -> None:
+        self.queue = WefaxTxQueue()
+        self.client = _FakeClient()
+        self.queue._client = self.client
+
+    def each_cleanup(self) -> None:
+        self.client.main.polls_per_job = 0
+        self.client.main.tx_polls = 0
+        self.queue.stop(5)
+
+    def _wait_until_sending(self, job) -> None:
+        deadline = monotonic() + 5
+        while job.started_at is None:
+            assert monotonic() < deadline, "the job never started transmitting"
+            sleep(.01)
+
+    def test_wefax_tx_priority_order(self):
+        jobs = [self.queue.add('low.png', lines=100),
+                self.queue.add('high.png', priority=1, lines=100),
+                self.queue.add('low-later.png', lines=100)]
+        assert [job.file_path for job in self.queue.pending()] == ['high.png', 'low.png', 'low-later.png']
+        self.queue.start()
+        assert all(job.wait(10) for job in jobs)
+        assert self.client.wefax.sent == ['high.png', 'low.png', 'low-later.png']
+        assert list(self.queue.completed_jobs) == [jobs[1], jobs[0], jobs[2]]
+        assert all(job.duration_secs is not None and job.lines_per_minute for job in jobs)
+        assert jobs[1].states[0][1] == 'transmitting'
+
+    def test_wefax_tx_cancel_queued_job(self):
+        first = self.queue.add('first.png', lines=100)
+        second = self.queue.add('second.png', lines=100)
+        assert self.queue.cancel(second)
+        assert not self.queue.cancel(second)
+        assert not second.wait(0)
+        assert second.status == 'cancelled'
+        self.queue.start()
+        assert first.wait(10)
+        assert self.client.wefax.sent == ['first.png']
+
+    def test_wefax_tx_abort_current_job(self):
+        self.client.main.polls_per_job = None
+        job = self.queue.add('endless.png', lines=100)
+        self.queue.start()
+        self._wait_until_sending(job)
+        assert self.queue.cancel(job)
+        assert not job.wait(5)
+        assert job.status == 'cancelled'
+        assert self.client.wefax.aborts == 1
+        # the queue carries on with the next job
+        self.client.main.polls_per_job = 2
+        assert self.queue.add('next.png', lines=100).wait(10)
+
+    def test_wefax_tx_stop_releases_waiters(self):
+        self.client.main.polls_per_job = 5
+        jobs = [self.queue.add(f'chart-{i}.png', lines=100) for i in range(3)]
+        self.queue.start()
+        self._wait_until_sending(jobs[0])
+        # a waiter with no timeout on a queued job returns once the queue is stopped
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(jobs[2].wait()), daemon=True)
+        waiter.start()
+        self.queue.stop(10)
+        waiter.join(5)
+        assert results == [False]
+        assert not self.queue.is_alive()
+        # the job being sent is finished, the rest are cancelled
+        assert [job.status for job in jobs] == ['done', 'cancelled', 'cancelled']
+        assert self.queue.pending() == []
+        late = self.queue.add('late.png', lines=100)
+        assert late.status == 'cancelled' and late._done.is_set()
+
+    def test_wefax_tx_completed_jobs_are_bounded(self):
+        queue = WefaxTxQueue(max_completed_jobs=2)
+        jobs = [queue.add(f'chart-{i}.png', lines=100) for i in range(5)]
+        for job in jobs:
+            queue.cancel(job)
+        assert list(queue.completed_jobs) == jobs[3:]
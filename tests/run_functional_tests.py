@@ -21,13 +21,18 @@
 ############################################################################
 
 from functional_tests import TestingRunner, TestAppMonitor, TestClient, TestClientText,\
-    TestClientFldigi, TestClientIo, TestClientMain, TestClientModem,\
-    TestClientNavtex, TestClientRig, TestClientSpot, TestClientWefax
+    TestClientFldigi, TestClientIo, TestClientLog, TestClientMain, TestClientModem,\
+    TestClientNavtex, TestClientRig, TestClientSpot, TestClientWefax, TestWatcher,\
+    TestTxTiming, TestAdif, TestContest, TestNavtex, TestRxDecoder, TestTelemetry,\
+    TestProfiles, TestTxStream, TestBandPlan, TestMaidenhead, TestJournal,\
+    TestAppMonitorProcess, TestWefaxTx, TestWefaxPipeline, TestScanner, TestHopper,\
+    TestMeterFeed, TestModemCatalogue
 
 test_app_monitor = TestAppMonitor()
 test_client = TestClient()
 test_client_fldigi = TestClientFldigi()
 test_client_io = TestClientIo()
+test_client_log = TestClientLog()
 test_client_main = TestClientMain()
 test_client_modem = TestClientModem()
 test_client_navtex = TestClientNavtex()
@@ -35,19 +40,58 @@ test_client_rig = TestClientRig()
 test_client_spot = TestClientSpot()
 test_client_text = TestClientText()
 test_client_wefax = TestClientWefax()
+test_watcher = TestWatcher()
+test_txtiming = TestTxTiming()
+test_adif = TestAdif()
+test_contest = TestContest()
+test_navtex = TestNavtex()
+test_rxdecoder = TestRxDecoder()
+test_telemetry = TestTelemetry()
+test_profiles = TestProfiles()
+test_txstream = TestTxStream()
+test_bandplan = TestBandPlan()
+test_maidenhead = TestMaidenhead()
+test_journal = TestJournal()
+test_app_monitor_process = TestAppMonitorProcess()
+test_wefax_tx = TestWefaxTx()
+test_wefax_pipeline = TestWefaxPipeline()
+test_scanner = TestScanner()
+test_hopper = TestHopper()
+test_meterfeed = TestMeterFeed()
+test_modem_catalogue = TestModemCatalogue()
 
 tests_to_run = [
     test_app_monitor,
     test_client,
     test_client_fldigi,
     test_client_io,
+    test_client_log,
     test_client_main,
     test_client_modem,
     test_client_navtex,
     test_client_rig,
     test_client_spot,
     test_client_text,
-    test_client_wefax
+    test_client_wefax,
+    test_watcher,
+    test_txtiming,
+    test_adif,
+    test_contest,
+    test_navtex,
+    test_rxdecoder,
+    test_telemetry,
+    test_profiles,
+    test_txstream,
+    test_bandplan,
+    test_maidenhead,
+    test_journal,
+    test_app_monitor_process,
+    test_wefax_tx,
+    test_wefax_pipeline,
+    test_scanner,
+    test_hopper,
+    test_meterfeed,
+    test_modem_catalogue
 ]
 
 tester = TestingRunner(2)